@@ -0,0 +1,51 @@
+# backtest.py
+import argparse
+from pathlib import Path
+from utils.fetch_data import fetch_all_sources
+from utils.backtest import walk_forward, hit_distribution, PREDICTORS
+from utils.simulation import baseline_summary, N_SIMS
+
+METRICS_DIR = Path("metrics")
+METRICS_DIR.mkdir(parents=True, exist_ok=True)
+
+MEGA_URLS = [
+    "https://www.ketquadientoan.com/tat-ca-ky-xo-so-mega-6-45.html",
+    "https://www.minhngoc.net.vn/ket-qua-xo-so/dien-toan-vietlott/mega-6x45.html",
+    "https://www.lotto-8.com/Vietnam/listltoVM45.asp",
+]
+POWER_URLS = [
+    "https://www.ketquadientoan.com/tat-ca-ky-xo-so-power-655.html",
+    "https://www.minhngoc.net.vn/ket-qua-xo-so/dien-toan-vietlott/power-6x55.html",
+    "https://www.lotto-8.com/Vietnam/listltoVM55.asp",
+]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of every predictor")
+    parser.add_argument("--games", nargs="+", choices=["mega", "power"], default=["mega", "power"])
+    parser.add_argument("--predictors", nargs="+", choices=PREDICTORS, default=None)
+    parser.add_argument("--window", type=int, default=50)
+    parser.add_argument("--start", type=int, default=None, help="first evaluated draw index (default 2*window)")
+    parser.add_argument("--refit-every", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--null-sims", type=int, default=N_SIMS, help="random tickets for the chance baseline")
+    parser.add_argument("--limit", type=int, default=400, help="draws to fetch per game")
+    args = parser.parse_args()
+
+    mega_df = fetch_all_sources(MEGA_URLS, limit=args.limit)
+    power_df = fetch_all_sources(POWER_URLS, limit=args.limit)
+    games = {"mega": (mega_df, power_df, 45), "power": (power_df, mega_df, 55)}
+    for name in args.games:
+        df, other, max_num = games[name]
+        print(f"=== Backtest {name} ({len(df)} draws) ===")
+        records = walk_forward(df, max_num, window=args.window, predictors=args.predictors, start=args.start,
+                               refit_every=args.refit_every, workers=args.workers, other_df=other)
+        if records.empty:
+            print("Not enough data for", name)
+            continue
+        summary = hit_distribution(records)
+        # chance baseline: p-values / effect sizes vs uniformly random tickets
+        summary = summary.merge(baseline_summary(records, max_num, n_sims=args.null_sims, workers=args.workers),
+                                on="predictor", how="left")
+        records.to_csv(METRICS_DIR / f"{name}_backtest.csv", index=False)
+        summary.to_csv(METRICS_DIR / f"{name}_backtest_summary.csv", index=False)
+        print(summary.to_string(index=False))
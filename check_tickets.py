@@ -0,0 +1,50 @@
+# check_tickets.py
+import json
+import argparse
+import pandas as pd
+from pathlib import Path
+from utils.fetch_data import fetch_all_sources
+from utils.ticket_check import iter_ticket_chunks, select_draws, check_tickets, MIN_HITS
+
+METRICS_DIR = Path("metrics")
+METRICS_DIR.mkdir(parents=True, exist_ok=True)
+
+MEGA_URLS = [
+    "https://www.ketquadientoan.com/tat-ca-ky-xo-so-mega-6-45.html",
+    "https://www.minhngoc.net.vn/ket-qua-xo-so/dien-toan-vietlott/mega-6x45.html",
+    "https://www.lotto-8.com/Vietnam/listltoVM45.asp",
+]
+POWER_URLS = [
+    "https://www.ketquadientoan.com/tat-ca-ky-xo-so-power-655.html",
+    "https://www.minhngoc.net.vn/ket-qua-xo-so/dien-toan-vietlott/power-6x55.html",
+    "https://www.lotto-8.com/Vietnam/listltoVM55.asp",
+]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check a large ticket file (CSV / NPY) against past draws")
+    parser.add_argument("tickets", help="CSV with n1..n6 (or 6 number columns) or NPY (n x 6)")
+    parser.add_argument("--game", choices=["mega", "power"], default="mega")
+    parser.add_argument("--date", default=None, help="one draw date YYYY-MM-DD")
+    parser.add_argument("--from", dest="start", default=None, help="first draw date of a range")
+    parser.add_argument("--to", dest="end", default=None, help="last draw date of a range")
+    parser.add_argument("--all", action="store_true", help="whole history (default: latest draw)")
+    parser.add_argument("--min-hits", type=int, default=MIN_HITS, help="write rows with at least this many hits")
+    parser.add_argument("--out", default=None, help="winning rows CSV (default metrics/{game}_ticket_hits.csv)")
+    parser.add_argument("--csv", action="store_true", help="read data/*_raw.csv instead of fetching")
+    parser.add_argument("--limit", type=int, default=400, help="draws to fetch per game")
+    args = parser.parse_args()
+
+    games = {"mega": (MEGA_URLS, "data/mega_6_45_raw.csv"), "power": (POWER_URLS, "data/power_6_55_raw.csv")}
+    urls, csv_path = games[args.game]
+    df = pd.read_csv(csv_path) if args.csv else fetch_all_sources(urls, limit=args.limit)
+    if df is None or df.empty:
+        raise SystemExit(f"No data for {args.game}")
+    latest = not (args.all or args.date or args.start or args.end)
+    dates, draws = select_draws(df, date=args.date, start=args.start, end=args.end, latest=latest)
+    print(f"🔹 {args.game}: {len(dates)} draws ({dates[0]} .. {dates[-1]})")
+
+    out = Path(args.out) if args.out else METRICS_DIR / f"{args.game}_ticket_hits.csv"
+    summary = check_tickets(iter_ticket_chunks(args.tickets), dates, draws, args.game, out=out,
+                            min_hits=args.min_hits)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    print(f"✅ {summary['winning_rows']:,} rows with >= {args.min_hits} hits saved at {out}")
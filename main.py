@@ -1,19 +1,24 @@
 # main.py
 import os
+import time
 import pandas as pd
 import numpy as np
 from datetime import datetime
 import utils.debug_wrapper
 from utils.fetch_data import fetch_all_sources
 from utils.stats import frequency_stats, pair_frequency_stats, repeat_stats
-from utils.heuristic import heuristic_predict
-from utils.predict import build_features, train_multioutput_rf, predict_next
-from utils.predict_advanced import load_model, ensemble_predict
+from utils.tiers import tier_context, predict_with_deadline
+from utils.feature_store import load_feature_spec
+from utils.predict_advanced import load_ensemble_weights
+from utils.model_loader import MODEL_KINDS, try_load_models, try_load_tf, load_features, ensemble_features
+from utils.online import update_online, ONLINE_KINDS
 import ssl
 from email.message import EmailMessage
 import smtplib
 
 REPORT_DIR = "./reports"
+# seconds per game for the prediction step (env PREDICT_BUDGET_S overrides)
+PREDICT_BUDGET_S = 60
 os.makedirs(REPORT_DIR, exist_ok=True)
 
 MEGA_URLS = [
@@ -28,20 +33,6 @@ POWER_URLS = [
     "https://www.lotto-8.com/Vietnam/listltoVM55.asp",
 ]
 
-def try_load_models(prefix):
-    models = []
-    for suffix in ["lgb.joblib", "cat.joblib", "mlp.joblib"]:
-        path = f"models/{prefix}_{suffix}"
-        if os.path.exists(path):
-            try:
-                models.append(load_model(path))
-            except Exception as e:
-                print(f"⚠ Failed to load {path}: {e}")
-                models.append(None)
-        else:
-            models.append(None)
-    return models
-
 def send_email_with_attachments(report_path, extra_files=None):
     EMAIL_USER = os.getenv("EMAIL_USER")
     EMAIL_PASS = os.getenv("EMAIL_PASS")
@@ -94,59 +85,30 @@ def main():
     # try load ensemble models
     mega_models = try_load_models("mega")
     power_models = try_load_models("power")
-    mega_feat = None
-    power_feat = None
-    if os.path.exists("models/mega_last_feat.npy"):
-        try:
-            mega_feat = np.load("models/mega_last_feat.npy")
-        except Exception:
-            mega_feat = None
-    if os.path.exists("models/power_last_feat.npy"):
-        try:
-            power_feat = np.load("models/power_last_feat.npy")
-        except Exception:
-            power_feat = None
-
-    mega_ensemble_pred = None
-    power_ensemble_pred = None
-    try:
-        if mega_feat is not None and any(m is not None for m in mega_models):
-            mega_ensemble_pred = ensemble_predict(mega_models, mega_feat, max_num=45)
-    except Exception as e:
-        print("⚠ Ensemble mega failed:", e)
-
-    try:
-        if power_feat is not None and any(m is not None for m in power_models):
-            power_ensemble_pred = ensemble_predict(power_models, power_feat, max_num=55)
-    except Exception as e:
-        print("⚠ Ensemble power failed:", e)
-
-    # fallback: on-the-fly ML
-    mega_pred_ml = None
-    power_pred_ml = None
-    try:
-        Xm, Ym = build_features(mega_df, window=50, max_num=45)
-        if Xm is not None and len(Xm) > 0:
-            m_model = train_multioutput_rf(Xm, Ym)
-            mega_pred_ml = predict_next(m_model, Xm[-1])
-    except Exception as e:
-        print("⚠ On-the-fly ML mega failed:", e)
-
-    try:
-        Xp, Yp = build_features(power_df, window=50, max_num=55)
-        if Xp is not None and len(Xp) > 0:
-            p_model = train_multioutput_rf(Xp, Yp)
-            power_pred_ml = predict_next(p_model, Xp[-1])
-    except Exception as e:
-        print("⚠ On-the-fly ML power failed:", e)
-
-    # heuristic fallback
-    mega_pred_heur = heuristic_predict(m_freq, k=6, max_num=45)
-    power_pred_heur = heuristic_predict(p_freq, k=6, max_num=55)
-
-    # final selection
-    mega_final = mega_ensemble_pred or mega_pred_ml or mega_pred_heur
-    power_final = power_ensemble_pred or power_pred_ml or power_pred_heur
+    # features for current data (served from the feature store when unchanged)
+    Xm, Ym = load_features(mega_df, max_num=45)
+    Xp, Yp = load_features(power_df, max_num=55)
+    mega_feat = ensemble_features(mega_df, "mega", Xm)
+    power_feat = ensemble_features(power_df, "power", Xp)
+    # Keras model via its NumPy export (only trained for Mega)
+    mega_models.append(try_load_tf("mega", load_feature_spec("models/mega_feature_spec.json"), mega_feat))
+    # online Markov / decayed-Dirichlet scorers: updated with the new draws only, ~free
+    # (soft-vote members next to the trained models, never a stand-in for them)
+    mega_online = update_online("mega", mega_df, 45)
+    power_online = update_online("power", power_df, 55)
+
+    # deadline-aware tier selection; slower tiers refresh their caches in the background
+    budget = float(os.getenv("PREDICT_BUDGET_S") or PREDICT_BUDGET_S)
+    # soft-vote weights learned at training time (equal weights if missing)
+    mega_w = load_ensemble_weights("models/mega_ensemble_weights.json", MODEL_KINDS + ["tf"] + ONLINE_KINDS)
+    power_w = load_ensemble_weights("models/power_ensemble_weights.json", MODEL_KINDS + ONLINE_KINDS)
+    mega_ctx = tier_context("mega", mega_df, 45, Xm, Ym, models=mega_models, feat=mega_feat, freq=m_freq, weights=mega_w,
+                            online=mega_online)
+    power_ctx = tier_context("power", power_df, 55, Xp, Yp, models=power_models, feat=power_feat, freq=p_freq,
+                             weights=power_w, online=power_online)
+    mega_final, mega_tier, mega_res, mega_bg = predict_with_deadline(mega_ctx, budget)
+    power_final, power_tier, power_res, power_bg = predict_with_deadline(power_ctx, budget)
+    print(f"🎯 Mega tier: {mega_tier}, Power tier: {power_tier}")
 
     # write excel
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -160,8 +122,8 @@ def main():
         p_pairs.to_excel(writer, sheet_name="Power_Pairs", index=False)
         pd.DataFrame({"Repeated": m_rep}).to_excel(writer, sheet_name="Mega_Repeat", index=False)
         pd.DataFrame({"Repeated": p_rep}).to_excel(writer, sheet_name="Power_Repeat", index=False)
-        pd.DataFrame({"Mega_Ensemble":[mega_ensemble_pred], "Mega_ML":[mega_pred_ml], "Mega_Heur":[mega_pred_heur], "Mega_Final":[mega_final]}).to_excel(writer, sheet_name="Mega_Predictions", index=False)
-        pd.DataFrame({"Power_Ensemble":[power_ensemble_pred], "Power_ML":[power_pred_ml], "Power_Heur":[power_pred_heur], "Power_Final":[power_final]}).to_excel(writer, sheet_name="Power_Predictions", index=False)
+        pd.DataFrame({"Mega_Ensemble":[mega_res.get("retrain") or mega_res.get("cached")], "Mega_ML":[mega_res.get("rf") or mega_res.get("fast")], "Mega_Heur":[mega_res["heuristic"]], "Mega_Final":[mega_final], "Mega_Tier":[mega_tier]}).to_excel(writer, sheet_name="Mega_Predictions", index=False)
+        pd.DataFrame({"Power_Ensemble":[power_res.get("retrain") or power_res.get("cached")], "Power_ML":[power_res.get("rf") or power_res.get("fast")], "Power_Heur":[power_res["heuristic"]], "Power_Final":[power_final], "Power_Tier":[power_tier]}).to_excel(writer, sheet_name="Power_Predictions", index=False)
 
     print("✅ Report saved at", report_path)
 
@@ -181,6 +143,13 @@ def main():
     else:
         print("⚠ Missing email config; skip send")
 
+    # background cache refreshes are daemon threads: wait at most one more budget, then exit
+    wait_until = time.monotonic() + budget
+    for th in (mega_bg, power_bg):
+        if th is not None:
+            th.join(timeout=max(wait_until - time.monotonic(), 0))
+            if th.is_alive():
+                print(f"⚠ {th.name} still running; abandoned at exit")
     print("=== PIPELINE HOÀN THÀNH ===")
 
 if __name__ == "__main__":
@@ -0,0 +1,77 @@
+# rank_combinations.py
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from utils.fetch_data import fetch_all_sources
+from utils.feature_engine import draw_matrix
+from utils.stats import frequency_stats
+from utils.tickets import scores_from_freq
+from utils.predict_advanced import ensemble_scores, load_ensemble_weights
+from utils.combinations import rank_combinations, TOP_K, W_NUM, W_PAIR
+from utils.model_loader import MODEL_KINDS, try_load_models, load_features, ensemble_features
+
+METRICS_DIR = Path("metrics")
+METRICS_DIR.mkdir(parents=True, exist_ok=True)
+
+MEGA_URLS = [
+    "https://www.ketquadientoan.com/tat-ca-ky-xo-so-mega-6-45.html",
+    "https://www.minhngoc.net.vn/ket-qua-xo-so/dien-toan-vietlott/mega-6x45.html",
+    "https://www.lotto-8.com/Vietnam/listltoVM45.asp",
+]
+POWER_URLS = [
+    "https://www.ketquadientoan.com/tat-ca-ky-xo-so-power-655.html",
+    "https://www.minhngoc.net.vn/ket-qua-xo-so/dien-toan-vietlott/power-6x55.html",
+    "https://www.lotto-8.com/Vietnam/listltoVM55.asp",
+]
+
+def number_scores(name, df, max_num, source):
+    """Per-number scores: saved ensemble (soft vote) or all-time frequency."""
+    if source == "ensemble":
+        X, _ = load_features(df, max_num=max_num)
+        feat = ensemble_features(df, name, X)
+        models = try_load_models(name)
+        if feat is not None and any(m is not None for m in models):
+            weights = load_ensemble_weights(f"models/{name}_ensemble_weights.json", MODEL_KINDS)
+            scores = ensemble_scores(models, feat, max_num=max_num, weights=weights)[0]
+            if scores.sum() > 0:
+                return scores
+        print(f"⚠ No ensemble for {name}; using frequency scores")
+    return scores_from_freq(frequency_stats(df), max_num)
+
+def _range(lo, hi):
+    return None if lo is None and hi is None else (lo if lo is not None else -10**9, hi if hi is not None else 10**9)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank every 6-number combination and keep the top-K")
+    parser.add_argument("--games", nargs="+", choices=["mega", "power"], default=["mega", "power"])
+    parser.add_argument("--scores", choices=["ensemble", "freq"], default="ensemble")
+    parser.add_argument("--top", type=int, default=TOP_K)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--w-num", type=float, default=W_NUM)
+    parser.add_argument("--w-pair", type=float, default=W_PAIR)
+    parser.add_argument("--sum-min", type=int, default=None)
+    parser.add_argument("--sum-max", type=int, default=None)
+    parser.add_argument("--odd-min", type=int, default=None)
+    parser.add_argument("--odd-max", type=int, default=None)
+    parser.add_argument("--max-consecutive", type=int, default=None)
+    parser.add_argument("--limit", type=int, default=400, help="draws to fetch per game")
+    args = parser.parse_args()
+
+    games = {"mega": (MEGA_URLS, 45), "power": (POWER_URLS, 55)}
+    for name in args.games:
+        urls, max_num = games[name]
+        df = fetch_all_sources(urls, limit=args.limit)
+        if df is None or df.empty:
+            print("No data for", name)
+            continue
+        draws = draw_matrix(df)
+        draws = draws[~np.isnan(draws).any(axis=1)]
+        rows = rank_combinations(number_scores(name, df, max_num, args.scores), max_num, draws, k=args.top,
+                                 w_num=args.w_num, w_pair=args.w_pair, workers=args.workers,
+                                 sum_range=_range(args.sum_min, args.sum_max),
+                                 odd_range=_range(args.odd_min, args.odd_max),
+                                 max_consecutive=args.max_consecutive)
+        out = METRICS_DIR / f"{name}_top_combinations.csv"
+        pd.DataFrame(rows).to_csv(out, index=False)
+        print(f"✅ {name}: top {len(rows)} combinations saved at {out}")
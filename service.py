@@ -0,0 +1,426 @@
+# service.py
+"""
+Long-lived prediction service.
+
+Loads draws, stats, features and models once and answers from memory:
+
+    GET  /health
+    GET  /predict/<game>?k=6&method=ensemble|heuristic
+    POST /predict            {"requests": [{"game": "mega", "k": 6, "method": "ensemble"}, ...]}
+    GET  /tickets/<game>?n=10&temperature=1&seed=&sum_min=&sum_max=&odd_min=&odd_max=&max_consecutive=&exclude_past=1
+    GET  /stats/<game>?top=20
+    POST /check/<game>       {"tickets": [[1,2,3,4,5,6], ...], "date": "YYYY-MM-DD" (optional, latest draw)}
+    POST /reload
+
+All state lives in one immutable snapshot per game. A background thread (and
+POST /reload) builds a fresh snapshot when the draws or model files change and
+swaps it in with a single assignment, so requests never see a half-loaded
+state. Responses are cached per (data + model version, request); a swap
+invalidates the cache.
+
+Run:  python service.py --port 8000 [--csv] [--reload-interval 600]
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from flask import Flask, jsonify, request
+from utils.fetch_data import fetch_all_sources
+from utils.feature_store import data_fingerprint, load_feature_spec
+from utils.stats import frequency_stats, pair_frequency_stats, repeat_stats
+from utils.heuristic import heuristic_predict
+from utils.incremental import sort_by_date
+from utils.predict_advanced import ensemble_scores, topk_from_scores, load_ensemble_weights
+from utils.feature_engine import draw_matrix
+from utils.tickets import sample_tickets, scores_from_freq
+from utils.ticket_check import tier_table
+from utils.online import update_online, ONLINE_KINDS
+from utils.model_loader import MODEL_KINDS, try_load_models, try_load_tf, load_features, ensemble_features
+
+MEGA_URLS = [
+    "https://www.ketquadientoan.com/tat-ca-ky-xo-so-mega-6-45.html",
+    "https://www.minhngoc.net.vn/ket-qua-xo-so/dien-toan-vietlott/mega-6x45.html",
+    "https://www.lotto-8.com/Vietnam/listltoVM45.asp",
+]
+POWER_URLS = [
+    "https://www.ketquadientoan.com/tat-ca-ky-xo-so-power-655.html",
+    "https://www.minhngoc.net.vn/ket-qua-xo-so/dien-toan-vietlott/power-6x55.html",
+    "https://www.lotto-8.com/Vietnam/listltoVM55.asp",
+]
+
+GAMES = {
+    "mega": {"urls": MEGA_URLS, "max_num": 45, "csv": "data/mega_6_45_raw.csv"},
+    "power": {"urls": POWER_URLS, "max_num": 55, "csv": "data/power_6_55_raw.csv"},
+}
+FETCH_LIMIT = 400
+RELOAD_INTERVAL_S = 600
+CACHE_SIZE = 1024
+MAX_BATCH = 1000
+MAX_TICKETS = 100000
+
+app = Flask(__name__)
+
+
+# ---------------------------
+# Snapshot (immutable per data + model version)
+# ---------------------------
+def _model_files(game, models_dir="models"):
+    """Files whose change means the models changed (joblibs, compiled dirs, registry pointers, weights)."""
+    files = []
+    if os.path.isdir(models_dir):
+        files += [os.path.join(models_dir, f) for f in os.listdir(models_dir) if f.startswith(f"{game}_")]
+    reg = os.path.join(models_dir, "registry", game)
+    if os.path.isdir(reg):
+        files += [os.path.join(reg, m, "CURRENT") for m in os.listdir(reg)]
+    return sorted(f for f in files if os.path.exists(f))
+
+
+def models_stamp(game, models_dir="models"):
+    h = hashlib.sha1()
+    for f in _model_files(game, models_dir):
+        h.update(f"{f}:{os.path.getmtime(f)}".encode("utf-8"))
+    return h.hexdigest()[:12]
+
+
+def load_draws(game, use_csv=False):
+    cfg = GAMES[game]
+    if use_csv:
+        df = pd.read_csv(cfg["csv"])
+        if "date" in df.columns and "draw_date" not in df.columns:
+            df = df.rename(columns={"date": "draw_date"})
+        df["draw_date"] = pd.to_datetime(df["draw_date"], errors="coerce")
+        return df
+    return fetch_all_sources(cfg["urls"], limit=FETCH_LIMIT)
+
+
+def build_snapshot(game, df):
+    """Everything a request needs for one game; built off-line, then swapped in."""
+    max_num = GAMES[game]["max_num"]
+    t0 = time.perf_counter()
+    df = sort_by_date(df)
+    X, Y = load_features(df, max_num=max_num)
+    models = try_load_models(game)
+    feat = ensemble_features(df, game, X)
+    names = list(MODEL_KINDS)
+    if game == "mega":
+        models.append(try_load_tf(game, load_feature_spec(f"models/{game}_feature_spec.json"), feat))
+        names.append("tf")
+    online = update_online(game, df, max_num)
+    latest = df.iloc[-1] if len(df) else None
+    return {
+        "game": game,
+        "max_num": max_num,
+        "version": f"{data_fingerprint(df)}-{models_stamp(game)}",
+        "n_draws": len(df),
+        "draws": df,
+        "latest_date": str(latest["draw_date"])[:10] if latest is not None else None,
+        "freq": frequency_stats(df),
+        "pairs": pair_frequency_stats(df),
+        "repeats": repeat_stats(df),
+        "models": models,
+        "online": online,
+        "model_names": [n for n, m in zip(names, models) if m is not None],
+        # soft-vote weights: trained models, then online scorers
+        "weights": load_ensemble_weights(f"models/{game}_ensemble_weights.json", names + ONLINE_KINDS),
+        "feat": feat,
+        "loaded_at": time.time(),
+        "load_seconds": round(time.perf_counter() - t0, 3),
+    }
+
+
+class ServiceState:
+    """Current snapshots, the data loader settings and the response cache."""
+
+    def __init__(self, use_csv=False):
+        self.use_csv = use_csv
+        self.snapshots = {}
+        self._reload_lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def reload(self, force=False):
+        """Rebuild snapshots whose data or models changed; returns {game: version} of swapped games."""
+        swapped = {}
+        with self._reload_lock:
+            for game in GAMES:
+                try:
+                    df = load_draws(game, self.use_csv)
+                except Exception as e:
+                    print(f"⚠ Reload {game} failed: {e}")
+                    continue
+                if df is None or df.empty:
+                    print(f"⚠ No draws for {game}; keeping the current snapshot")
+                    continue
+                old = self.snapshots.get(game)
+                version = f"{data_fingerprint(sort_by_date(df))}-{models_stamp(game)}"
+                if old is not None and old["version"] == version and not force:
+                    continue
+                snap = build_snapshot(game, df)
+                # whole-dict replacement: readers hold either the old or the new snapshot
+                self.snapshots = {**self.snapshots, game: snap}
+                swapped[game] = snap["version"]
+                print(f"🔄 {game}: snapshot {snap['version']} ({snap['n_draws']} draws, {snap['load_seconds']}s)")
+            if swapped:
+                with self._cache_lock:
+                    self._cache.clear()
+        return swapped
+
+    def cached(self, key, fn):
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+        value = fn()
+        with self._cache_lock:
+            self.misses += 1
+            self._cache[key] = value
+            if len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return value
+
+
+STATE = ServiceState()
+
+
+def watch(interval):
+    """Poll for new draws / models every `interval` seconds (daemon thread)."""
+    def _loop():
+        while True:
+            time.sleep(interval)
+            try:
+                STATE.reload()
+            except Exception as e:
+                print(f"⚠ Background reload failed: {e}")
+    th = threading.Thread(target=_loop, name="service-reload", daemon=True)
+    th.start()
+    return th
+
+
+# ---------------------------
+# Handlers (pure functions of a snapshot)
+# ---------------------------
+def has_ensemble(snap):
+    """True if at least one trained model loaded; the online scorers only join its vote."""
+    return snap["feat"] is not None and any(n in MODEL_KINDS for n in snap["model_names"])
+
+
+def ensemble_scores_of(snap):
+    """Soft vote of the trained models and the online scorers for the next draw."""
+    return ensemble_scores(snap["models"] + snap["online"], snap["feat"], max_num=snap["max_num"],
+                           weights=snap["weights"])[0]
+
+
+def predict_payload(snap, k=6, method="ensemble"):
+    max_num = snap["max_num"]
+    if not 1 <= k <= max_num:
+        raise ValueError(f"k must be in 1..{max_num}")
+    if method == "ensemble" and has_ensemble(snap):
+        scores = ensemble_scores_of(snap)
+        ticket = topk_from_scores(scores, k)[0].tolist()
+        top = np.argsort(-scores, kind="stable")[:max(k, 10)]
+        return {"game": snap["game"], "method": "ensemble", "ticket": ticket,
+                "models": snap["model_names"] + ONLINE_KINDS,
+                "scores": {int(i) + 1: round(float(scores[i]), 4) for i in top}, "version": snap["version"]}
+    return {"game": snap["game"], "method": "heuristic", "version": snap["version"],
+            "ticket": [int(v) for v in heuristic_predict(snap["freq"], k=k, max_num=max_num)]}
+
+
+def number_scores_of(snap):
+    """Soft-vote scores of the loaded models, else all-time frequencies."""
+    if has_ensemble(snap):
+        scores = ensemble_scores_of(snap)
+        if scores.sum() > 0:
+            return scores, "ensemble"
+    return scores_from_freq(snap["freq"], snap["max_num"]), "frequency"
+
+
+def tickets_payload(snap, n=10, temperature=1.0, seed=None, exclude_past=True, **constraints):
+    scores, source = number_scores_of(snap)
+    past = draw_matrix(snap["draws"], sort=False) if exclude_past else None
+    past = past[~np.isnan(past).any(axis=1)] if past is not None else None
+    T = sample_tickets(scores, n, temperature=temperature, exclude_draws=past, seed=seed, **constraints)
+    return {"game": snap["game"], "scores_from": source, "version": snap["version"], "tickets": T.tolist()}
+
+
+def _range(args, name):
+    lo, hi = args.get(f"{name}_min"), args.get(f"{name}_max")
+    if lo is None and hi is None:
+        return None
+    return (int(lo) if lo is not None else -10**9, int(hi) if hi is not None else 10**9)
+
+
+def stats_payload(snap, top=20):
+    return {
+        "game": snap["game"], "version": snap["version"], "n_draws": snap["n_draws"],
+        "latest_date": snap["latest_date"],
+        "frequency": snap["freq"].head(top).astype(int).to_dict(orient="records"),
+        "pairs": snap["pairs"].head(top).astype(int).to_dict(orient="records"),
+        "repeats": [int(v) for v in snap["repeats"]],
+    }
+
+
+def _parse_tickets(tickets, max_num):
+    """(n x 6) int array of the request's tickets; ValueError unless each has 6 distinct numbers in 1..max_num."""
+    if not isinstance(tickets, list):
+        raise ValueError("tickets must be a list of tickets")
+    for t in tickets:
+        if (not isinstance(t, list) or len(t) != 6 or len(set(t)) != 6
+                or not all(type(v) is int and 1 <= v <= max_num for v in t)):
+            raise ValueError(f"each ticket must have 6 distinct integers in 1..{max_num}, got {t!r}")
+    return np.asarray(tickets, dtype=np.int64).reshape(len(tickets), 6)
+
+
+def check_payload(snap, tickets, date=None):
+    """Hits of every ticket against one draw (latest by default)."""
+    T = _parse_tickets(tickets, snap["max_num"])
+    df = snap["draws"]
+    if date:
+        rows = df[df["draw_date"].dt.strftime("%Y-%m-%d") == date]
+        if rows.empty:
+            raise KeyError(f"No {snap['game']} draw on {date}")
+        row = rows.iloc[-1]
+    else:
+        row = df.iloc[-1]
+    draw = sorted(int(row[f"n{i}"]) for i in range(1, 7) if pd.notna(row[f"n{i}"]))
+    drawn = np.zeros(snap["max_num"] + 2, dtype=bool)
+    drawn[draw] = True
+    hits = drawn[T].sum(axis=1) if T.size else np.zeros(0, dtype=int)
+    tiers, _ = tier_table(snap["game"])
+    return {"game": snap["game"], "date": str(row["draw_date"])[:10], "draw": draw, "version": snap["version"],
+            "results": [{"ticket": [int(v) for v in t], "hits": int(h), "tier": tiers[min(int(h), 6)],
+                         "matched": sorted(int(v) for v in t if drawn[v])} for t, h in zip(T, hits)]}
+
+
+def _snapshot(game):
+    snap = STATE.snapshots.get(game)
+    if snap is None:
+        raise KeyError(f"Unknown or unloaded game: {game}")
+    return snap
+
+
+def _error(e, status):
+    return jsonify({"error": str(e)}), status
+
+
+# ---------------------------
+# Routes
+# ---------------------------
+@app.get("/health")
+def health():
+    return jsonify({"status": "ok", "cache": {"size": len(STATE._cache), "hits": STATE.hits, "misses": STATE.misses},
+                    "games": {g: {"version": s["version"], "n_draws": s["n_draws"], "models": s["model_names"],
+                                  "loaded_at": s["loaded_at"]} for g, s in STATE.snapshots.items()}})
+
+
+@app.get("/predict/<game>")
+def predict_one(game):
+    try:
+        snap = _snapshot(game)
+        k = int(request.args.get("k", 6))
+        method = request.args.get("method", "ensemble")
+        return jsonify(STATE.cached((snap["version"], "predict", k, method),
+                                    lambda: predict_payload(snap, k, method)))
+    except KeyError as e:
+        return _error(e, 404)
+    except ValueError as e:
+        return _error(e, 400)
+
+
+@app.post("/predict")
+def predict_batch():
+    reqs = (request.get_json(silent=True) or {}).get("requests", [])
+    if len(reqs) > MAX_BATCH:
+        return _error(f"at most {MAX_BATCH} requests per batch", 400)
+    out = []
+    for r in reqs:
+        try:
+            snap = _snapshot(r.get("game", "mega"))
+            k, method = int(r.get("k", 6)), r.get("method", "ensemble")
+            out.append(STATE.cached((snap["version"], "predict", k, method),
+                                    lambda: predict_payload(snap, k, method)))
+        except (KeyError, ValueError) as e:
+            out.append({"error": str(e)})
+    return jsonify({"results": out})
+
+
+@app.get("/tickets/<game>")
+def tickets(game):
+    try:
+        snap = _snapshot(game)
+        a = request.args
+        n = int(a.get("n", 10))
+        if n < 1:
+            raise ValueError("n must be >= 1")
+        n = min(n, MAX_TICKETS)
+        kw = {"temperature": float(a.get("temperature", 1.0)),
+              "seed": int(a["seed"]) if a.get("seed") is not None else None,
+              "exclude_past": a.get("exclude_past", "1") != "0",
+              "sum_range": _range(a, "sum"), "odd_range": _range(a, "odd"),
+              "max_consecutive": int(a["max_consecutive"]) if a.get("max_consecutive") else None}
+        if kw["seed"] is None:
+            # unseeded draws are random per call: not cached
+            return jsonify(tickets_payload(snap, n, **kw))
+        key = (snap["version"], "tickets", n, json.dumps(kw, sort_keys=True))
+        return jsonify(STATE.cached(key, lambda: tickets_payload(snap, n, **kw)))
+    except KeyError as e:
+        return _error(e, 404)
+    except ValueError as e:
+        return _error(e, 400)
+
+
+@app.get("/stats/<game>")
+def stats(game):
+    try:
+        snap = _snapshot(game)
+        top = int(request.args.get("top", 20))
+        return jsonify(STATE.cached((snap["version"], "stats", top), lambda: stats_payload(snap, top)))
+    except KeyError as e:
+        return _error(e, 404)
+    except ValueError as e:
+        return _error(e, 400)
+
+
+@app.post("/check/<game>")
+def check(game):
+    body = request.get_json(silent=True)
+    body = body if isinstance(body, dict) else {}
+    tickets = body.get("tickets", [])
+    if isinstance(tickets, list) and len(tickets) > MAX_BATCH:
+        return _error(f"at most {MAX_BATCH} tickets per request", 400)
+    try:
+        snap = _snapshot(game)
+        key = (snap["version"], "check", body.get("date"), json.dumps(tickets))
+        return jsonify(STATE.cached(key, lambda: check_payload(snap, tickets, body.get("date"))))
+    except KeyError as e:
+        return _error(e, 404)
+    except (ValueError, TypeError, IndexError) as e:
+        return _error(e, 400)
+
+
+@app.post("/reload")
+def reload():
+    force = bool((request.get_json(silent=True) or {}).get("force"))
+    return jsonify({"swapped": STATE.reload(force=force)})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Mega/Power predictions, stats and ticket checks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--csv", action="store_true", help="read data/*_raw.csv instead of fetching")
+    parser.add_argument("--reload-interval", type=float, default=RELOAD_INTERVAL_S,
+                        help="seconds between checks for new draws / models (0 = only POST /reload)")
+    args = parser.parse_args()
+
+    STATE.use_csv = args.csv
+    STATE.reload(force=True)
+    if args.reload_interval > 0:
+        watch(args.reload_interval)
+    app.run(host=args.host, port=args.port, threaded=True)
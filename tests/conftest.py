@@ -0,0 +1,18 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def _random_draws(n, max_num, seed=0):
+    """Sinh dữ liệu giả lập theo định dạng của fetch_all_sources (mới nhất ở đầu)."""
+    rng = np.random.default_rng(seed)
+    nums = np.sort(np.array([rng.choice(max_num, 6, replace=False) + 1 for _ in range(n)]), axis=1)
+    df = pd.DataFrame(nums, columns=[f"n{i}" for i in range(1, 7)])
+    df.insert(0, "draw_date", pd.date_range("2020-01-01", periods=n, freq="D")[::-1])
+    return df
+
+
+@pytest.fixture
+def random_draws():
+    """random_draws(n, max_num, seed=0): n kỳ quay giả lập, mới nhất ở đầu."""
+    return _random_draws
@@ -0,0 +1,63 @@
+import random
+import numpy as np
+from utils import backtest
+from utils.feature_engine import draw_matrix, onehot_counts
+from utils.incremental import sort_by_date
+
+
+def test_models_only_see_past_draws(random_draws, monkeypatch):
+    window, max_num = 10, 45
+    df = random_draws(60, max_num, seed=1)
+    draws = draw_matrix(sort_by_date(df), sort=False)
+    fits, preds = [], {}
+
+    def fake_fit(name, X_tr, Y_tr, max_num, pern_tr=None, n_jobs=1):
+        fits.append((X_tr.copy(), Y_tr.copy()))
+        return len(fits)
+
+    def fake_predict(name, model, x, max_num, pern_x=None):
+        preds[len(preds)] = np.asarray(x).copy()
+        return [1, 2, 3, 4, 5, 6]
+
+    monkeypatch.setattr(backtest, "_fit", fake_fit)
+    monkeypatch.setattr(backtest, "_predict", fake_predict)
+    out = backtest.walk_forward(df, max_num, window=window, predictors=["rf"], start=30, refit_every=7,
+                                workers=1, folds=2)
+    assert out["step"].tolist() == list(range(30, 60))
+    steps = out["step"].to_numpy()
+    assert len(fits) >= 2
+    for X_tr, Y_tr in fits:
+        # the last training target is a draw before every step it is used for
+        t_fit = window + len(Y_tr)
+        assert (Y_tr == draws[window:t_fit]).all()
+        assert t_fit in steps
+    for i, t in enumerate(steps):
+        assert (preds[i] == onehot_counts(draws[t - window:t], max_num).sum(axis=0)).all()
+
+
+def test_future_draws_do_not_change_tickets(random_draws, monkeypatch):
+    monkeypatch.setitem(backtest.BACKTEST_PARAMS, "rf", {"n_estimators": 10})
+    df = sort_by_date(random_draws(80, 45, seed=2))
+    changed = df.copy()
+    changed.loc[60:, [f"n{i}" for i in range(1, 7)]] = [[1, 2, 3, 4, 5, 6]] * 20
+    kw = {"window": 10, "predictors": ["heuristic", "rf"], "start": 40, "refit_every": 5, "workers": 1, "folds": 2}
+    # predict_next fills duplicate positions with random.choice
+    random.seed(0)
+    a = backtest.walk_forward(df, 45, **kw)
+    random.seed(0)
+    b = backtest.walk_forward(changed, 45, **kw)
+    past_a, past_b = a[a["step"] <= 60], b[b["step"] <= 60]
+    assert len(past_a) == 2 * 21
+    assert past_a["ticket"].tolist() == past_b["ticket"].tolist()
+
+
+def test_failing_predictor_skips_its_fold(random_draws, monkeypatch):
+    def broken_fit(name, *args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(backtest, "_fit", broken_fit)
+    out = backtest.walk_forward(random_draws(60, 45, seed=3), 45, window=10, predictors=["rf", "heuristic"],
+                                start=30, workers=1, folds=2)
+    assert set(out["predictor"]) == {"heuristic"} and len(out) == 30
+    dist = backtest.hit_distribution(out)
+    assert dist["predictor"].tolist() == ["heuristic"] and dist["steps"].tolist() == [30]
@@ -0,0 +1,63 @@
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from utils.calendar_table import (
+    CAL_COLUMNS, ELEMENTS, ELEMENT_MAP, calendar_features, join_calendar, next_draw_date, build_calendar_features,
+    calendar_next_row,
+)
+from utils.feature_store import model_features, next_features
+
+lunardate = pytest.importorskip("lunardate")
+
+
+def _direct(d):
+    """Tính trực tiếp bằng LunarDate cho một ngày (không qua bảng)."""
+    ld = lunardate.LunarDate.fromSolarDate(d.year, d.month, d.day)
+    return [d.weekday(), ld.day, ld.month, ld.year, int(ld.isLeapMonth), ELEMENTS.index(ELEMENT_MAP[ld.year % 10])]
+
+
+@pytest.fixture(autouse=True)
+def _in_tmp(tmp_path, monkeypatch):
+    # data/calendar_table.npz is written relative to the working directory
+    monkeypatch.chdir(tmp_path)
+
+
+def test_table_matches_direct_computation():
+    rng = np.random.default_rng(0)
+    start = datetime.date(2016, 7, 18)
+    days = sorted({start + datetime.timedelta(days=int(i)) for i in rng.integers(0, 365 * 10, 300)})
+    days += [datetime.date(2020, 5, 23), datetime.date(2023, 3, 22)]          # leap lunar months
+    rows = calendar_features([d.isoformat() for d in days])
+    for d, row in zip(days, rows):
+        assert row[:6].tolist() == _direct(d), d
+    tet = calendar_features(["2024-02-10", "2024-02-09", "2024-09-02", "2024-03-05"])[:, CAL_COLUMNS.index("holiday")]
+    assert tet.tolist() == [1, 1, 1, 0]
+    assert (calendar_features(["not a date", None]) == -1).all()
+
+
+def test_join_and_next_draw_date(random_draws):
+    df = random_draws(30, 45)
+    joined = join_calendar(df)
+    assert list(joined.columns[-len(CAL_COLUMNS):]) == CAL_COLUMNS
+    assert (joined["weekday"].to_numpy() == df["draw_date"].dt.weekday.to_numpy()).all()
+    # Mega: thứ 4, thứ 6, chủ nhật
+    dates = pd.Series(pd.date_range("2024-01-03", "2024-03-01", freq="D"))
+    dates = dates[dates.dt.weekday.isin([2, 4, 6])]
+    assert next_draw_date(dates) == pd.Timestamp("2024-03-03")
+    assert next_draw_date(dates[:-1]) == pd.Timestamp("2024-03-01")
+
+
+def test_calendar_feature_set(random_draws, tmp_path):
+    df = random_draws(80, 45, seed=1)
+    X, Y = build_calendar_features(df, window=20, max_num=45)
+    assert X.shape == (60, 45 + len(CAL_COLUMNS)) and X.dtype == np.float32 and Y.shape == (60, 6)
+    spec = {"feature_set": "calendar", "params": {"window": 20, "max_num": 45}}
+    X2, _ = model_features(spec, df, store_dir=tmp_path / "store")
+    assert np.array_equal(X, X2)
+    # the next draw's row matches the row built once that draw is known
+    nxt = next_draw_date(df["draw_date"])
+    newer = pd.concat([random_draws(1, 45, seed=2).assign(draw_date=nxt), df], ignore_index=True)
+    X3, _ = build_calendar_features(newer, window=20, max_num=45)
+    assert np.array_equal(calendar_next_row(df, window=20, max_num=45), X3[-1])
+    assert np.array_equal(next_features(spec, df), X3[-1])
@@ -0,0 +1,46 @@
+from itertools import combinations
+import numpy as np
+from utils.combinations import rank_combinations, combo_rank, pair_zscores
+from utils.tickets import check_constraints
+
+
+def _brute_force(scores, max_num, draws, k, w_num=1.0, w_pair=0.1, **constraints):
+    """Chấm điểm từng tổ hợp một cách trực tiếp (chuẩn để so sánh)."""
+    p = np.clip(scores / scores.sum(), 1e-12, None)
+    u, Z = w_num * np.log(p), w_pair * pair_zscores(draws, max_num)
+    combos = np.array(list(combinations(range(1, max_num + 1), 6)))
+    ok = check_constraints(combos, **constraints)
+    rows = []
+    for c in combos[ok]:
+        s = u[c - 1].sum() + sum(Z[a - 1, b - 1] for a, b in combinations(c, 2))
+        rows.append((s, tuple(int(v) for v in c)))
+    rows.sort(reverse=True)
+    return rows[:k]
+
+
+def _inputs(max_num=16, seed=0):
+    rng = np.random.default_rng(seed)
+    draws = np.sort(np.array([rng.choice(max_num, 6, replace=False) + 1 for _ in range(60)]), axis=1)
+    return rng.random(max_num) + 0.05, draws.astype(float)
+
+
+def test_combo_rank_is_lexicographic():
+    for i, c in enumerate(combinations(range(1, 17), 6)):
+        assert combo_rank(c, 16) == i
+
+
+def test_matches_brute_force():
+    scores, draws = _inputs()
+    rows = rank_combinations(scores, 16, draws, k=25, workers=1, chunk_combos=500)
+    expected = _brute_force(scores, 16, draws, 25)
+    assert [tuple(r[f"n{j}"] for j in range(1, 7)) for r in rows] == [c for _, c in expected]
+    assert np.allclose([r["score"] for r in rows], [s for s, _ in expected], atol=1e-6)
+    assert all(r["lex_rank"] == combo_rank(c, 16) for r, (_, c) in zip(rows, expected))
+
+
+def test_matches_brute_force_with_constraints():
+    scores, draws = _inputs(seed=1)
+    cons = {"sum_range": (40, 60), "odd_range": (2, 4), "max_consecutive": 2}
+    rows = rank_combinations(scores, 16, draws, k=10, workers=1, chunk_combos=300, **cons)
+    expected = _brute_force(scores, 16, draws, 10, **cons)
+    assert [tuple(r[f"n{j}"] for j in range(1, 7)) for r in rows] == [c for _, c in expected]
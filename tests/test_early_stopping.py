@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from sklearn.neural_network import MLPClassifier
+from utils import early_stopping as es
+from utils.predict_advanced import make_estimator
+
+pytest.importorskip("lightgbm")
+
+
+def _noise(n=400, d=10, seed=0):
+    """Nhãn ngẫu nhiên không phụ thuộc X: loss validation chỉ đi ngang rồi tăng."""
+    rng = np.random.default_rng(seed)
+    return rng.random((n, d)).astype(np.float32), rng.integers(0, 2, n)
+
+
+def test_time_split_keeps_latest_rows_for_validation():
+    X, y = np.arange(20).reshape(10, 2), np.arange(10)
+    X_fit, y_fit, X_val, y_val = es.time_split(X, y, 0.3)
+    assert y_fit.tolist() == list(range(7)) and y_val.tolist() == [7, 8, 9]
+
+
+def test_lgb_stops_on_plateau():
+    X, y = _noise()
+    X_fit, y_fit, X_val, y_val = es.time_split(X, y)
+    est, n_iter, max_iter = es.fit_lgb(make_estimator("lgb", n_estimators=500), X_fit, y_fit, X_val, y_val, patience=5)
+    loss = next(iter(est.evals_result_["valid_0"].values()))
+    # patience rounds past the best one, then the booster is cut back to the best round
+    assert max_iter == 500 and len(loss) == n_iter + 5
+    assert n_iter == int(np.argmin(loss)) + 1 == est.best_iteration_ == est.booster_.current_iteration()
+
+
+def test_lgb_without_stop_predicts_with_best_round():
+    X, y = _noise(seed=1)
+    X_fit, y_fit, X_val, y_val = es.time_split(X, y)
+    est, n_iter, _ = es.fit_lgb(make_estimator("lgb", n_estimators=40), X_fit, y_fit, X_val, y_val, patience=1000)
+    loss = next(iter(est.evals_result_["valid_0"].values()))
+    assert est.booster_.current_iteration() == 40
+    assert n_iter == int(np.argmin(loss)) + 1 < 40
+    assert np.allclose(est.predict_proba(X_val)[:, 1], est.booster_.predict(X_val, num_iteration=n_iter))
+
+
+def test_mlp_stops_on_plateau_and_keeps_best_epoch():
+    X, y = _noise(seed=2)
+    X_fit, y_fit, X_val, y_val = es.time_split(X, y)
+    est = MLPClassifier(hidden_layer_sizes=(32,), max_iter=300, random_state=0)
+    est, n_iter, max_iter = es.fit_mlp(est, X_fit, y_fit, X_val, y_val, patience=4)
+    # one partial_fit epoch per pass over X_fit, stopped `patience` epochs after the best one
+    assert max_iter == 300 and est.t_ == (n_iter + 4) * len(X_fit)
+    best = MLPClassifier(hidden_layer_sizes=(32,), random_state=0)
+    for _ in range(n_iter):
+        best.partial_fit(X_fit, y_fit, classes=[0, 1])
+    assert np.allclose(est.predict_proba(X_val), best.predict_proba(X_val))
+
+
+def test_zero_budget_stops_after_first_round():
+    X, y = _noise(seed=3)
+    X_fit, y_fit, X_val, y_val = es.time_split(X, y)
+    est, n_iter, _ = es.fit_lgb(make_estimator("lgb", n_estimators=200), X_fit, y_fit, X_val, y_val, budget_s=0)
+    assert n_iter == 1 and est.booster_.current_iteration() == 1
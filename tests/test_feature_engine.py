@@ -0,0 +1,77 @@
+import numpy as np
+from utils.predict import build_features
+from utils.predict_advanced import build_count_features
+from utils.train_model import build_Xy
+
+
+def _legacy_build_features(df, window, max_num):
+    df = df.sort_values("draw_date").reset_index(drop=True)
+    X, Y = [], []
+    for i in range(window, len(df)):
+        prev = df.iloc[i-window:i]
+        counts = np.zeros(max_num, dtype=int)
+        for c in range(1, 7):
+            for v in prev[f"n{c}"].dropna().astype(int).tolist():
+                if 1 <= v <= max_num:
+                    counts[v-1] += 1
+        X.append(counts)
+        Y.append(df.loc[i, [f"n{j}" for j in range(1, 7)]].astype(int).values)
+    return np.vstack(X), np.vstack(Y)
+
+
+def _legacy_build_Xy(mega_df, power_df, window, max_num):
+    minlen = min(len(mega_df), len(power_df))
+    X, y = [], []
+    for end in range(window, minlen):
+        mw = mega_df.iloc[end-window:end]
+        pw = power_df.iloc[end-window:end]
+        m_counts = [0] * max_num
+        p_counts = [0] * 55
+        for i in range(1, 7):
+            for v in mw[f"n{i}"].dropna().astype(int).tolist():
+                if 1 <= v <= max_num:
+                    m_counts[v-1] += 1
+            for v in pw[f"n{i}"].dropna().astype(int).tolist():
+                if 1 <= v <= 55:
+                    p_counts[v-1] += 1
+        for n in range(1, max_num + 1):
+            pc = p_counts[n-1] if n-1 < len(p_counts) else 0
+            X.append([m_counts[n-1], pc, m_counts[n-1] / (window * 6), pc / (window * 6)])
+        next_draw = {int(mega_df.iloc[end][f"n{i}"]) for i in range(1, 7)}
+        for n in range(1, max_num + 1):
+            y.append(1 if n in next_draw else 0)
+    return np.array(X), np.array(y)
+
+
+def test_window_features_match_legacy(random_draws):
+    for max_num in (45, 55):
+        df = random_draws(90, max_num, seed=max_num)
+        X_old, Y_old = _legacy_build_features(df, 20, max_num)
+        for fn in (build_features, build_count_features):
+            X, Y = fn(df, window=20, max_num=max_num)
+            assert X.dtype == np.uint16 and Y.dtype == Y_old.dtype
+            assert np.array_equal(X, X_old) and np.array_equal(Y, Y_old)
+
+
+def test_pernum_features_match_legacy(random_draws):
+    mega = random_draws(80, 45, seed=1)
+    power = random_draws(70, 55, seed=2)
+    X_old, y_old = _legacy_build_Xy(mega, power, 15, 45)
+    X, y = build_Xy(mega, power, window=15, max_num=45)
+    assert X.dtype == X_old.dtype and y.dtype == y_old.dtype
+    assert np.array_equal(X, X_old) and np.array_equal(y, y_old)
+
+
+def test_not_enough_rows(random_draws):
+    df = random_draws(10, 45)
+    assert build_features(df, window=10, max_num=45) == (None, None)
+
+
+def test_pyramid_matches_single_window(random_draws):
+    from utils.feature_engine import build_pyramid_features, build_window_features
+    df = random_draws(150, 45, seed=3)
+    X, Y = build_pyramid_features(df, windows=(10, 50, None), decays=(0.5,), max_num=45)
+    Xc, Yc = build_window_features(df, window=50, max_num=45)
+    assert X.dtype == np.float32 and X.shape == (100, 4, 45)
+    assert np.array_equal(X[:, 1], Xc) and np.array_equal(Y, Yc)
+    assert np.array_equal(X[:, 2].sum(axis=1), 6 * np.arange(50, 150))
@@ -0,0 +1,70 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from utils.feature_engine import build_window_features
+from utils.feature_store import data_fingerprint, feature_key, cached_features, evict, model_features, next_features
+
+
+def test_fingerprint_changes_with_data(random_draws):
+    df = random_draws(80, 45)
+    fp = data_fingerprint(df)
+    assert data_fingerprint(df.copy()) == fp
+    changed = df.copy()
+    changed.loc[5, "n6"] = 46
+    assert data_fingerprint(changed) != fp
+    assert data_fingerprint(df.iloc[::-1]) != fp
+    assert data_fingerprint(df.iloc[1:]) != fp
+    later = df.assign(draw_date=df["draw_date"] + pd.Timedelta(days=1))
+    assert data_fingerprint(later) != fp
+
+
+def test_feature_key_depends_on_params(random_draws):
+    df = random_draws(80, 45)
+    assert feature_key("counts", [df], window=50, max_num=45)[0] == feature_key("counts", [df], max_num=45, window=50)[0]
+    assert feature_key("counts", [df], window=50, max_num=45)[0] != feature_key("counts", [df], window=40, max_num=45)[0]
+    assert feature_key("counts", [df], window=50)[0] != feature_key("pyramid", [df], window=50)[0]
+
+
+def test_cached_features_hit_and_miss(random_draws, tmp_path):
+    df = random_draws(80, 45, seed=1)
+    X, Y = cached_features("counts", df, store_dir=tmp_path, window=20, max_num=45)
+    X0, Y0 = build_window_features(df, window=20, max_num=45)
+    assert (np.asarray(X) == X0).all() and (np.asarray(Y) == Y0).all()
+    assert isinstance(X, np.memmap) and not X.flags.writeable
+    assert len(os.listdir(tmp_path)) == 1
+    X2, _ = cached_features("counts", df, store_dir=tmp_path, window=20, max_num=45)
+    assert (np.asarray(X2) == X0).all() and len(os.listdir(tmp_path)) == 1
+    cached_features("counts", random_draws(81, 45, seed=1), store_dir=tmp_path, window=20, max_num=45)
+    assert len(os.listdir(tmp_path)) == 2
+    assert cached_features("counts", df.iloc[:10], store_dir=tmp_path, window=20, max_num=45) == (None, None)
+
+
+def test_evict_by_age_and_size(random_draws, tmp_path):
+    keys = []
+    for seed in range(3):
+        df = random_draws(60, 45, seed=seed)
+        cached_features("counts", df, store_dir=tmp_path, window=10, max_num=45)
+        keys.append(feature_key("counts", [df], window=10, max_num=45)[0])
+    now = time.time()
+    for age, key in zip((40, 2, 1), keys):
+        os.utime(tmp_path / key / "meta.json", (now - age * 86400, now - age * 86400))
+    assert [os.path.basename(p) for p in evict(tmp_path, max_age_days=30)] == [keys[0]]
+    size = sum(f.stat().st_size for f in (tmp_path / keys[2]).iterdir())
+    assert [os.path.basename(p) for p in evict(tmp_path, max_bytes=size)] == [keys[1]]
+    assert os.listdir(tmp_path) == [keys[2]]
+    assert evict(tmp_path / "missing") == []
+
+
+def test_next_features_is_the_row_after_the_last_draw(random_draws, tmp_path):
+    df = random_draws(130, 45, seed=4)
+    # one more draw after the newest: its feature row must equal next_features on the older frame
+    newer = pd.concat([random_draws(1, 45, seed=5).assign(draw_date=df["draw_date"].max() + pd.Timedelta(days=1)),
+                       df], ignore_index=True)
+    for spec in ({"feature_set": "counts", "params": {"window": 20, "max_num": 45}},
+                 {"feature_set": "pyramid", "params": {"max_num": 45}},
+                 {"feature_set": "pyramid", "params": {"windows": [3, None], "decays": [0.5], "max_num": 45}}):
+        X, _ = model_features(spec, newer, store_dir=tmp_path)
+        row = next_features(spec, df)
+        assert row.shape == X[-1].shape and np.allclose(row, X[-1])
+        assert not np.allclose(row, model_features(spec, df, store_dir=tmp_path)[0][-1])
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from utils.incremental import (
+    sort_by_date, draw_key, draws_after, save_state, plan_update, refresh_forest, continue_boosting,
+)
+
+
+def test_draws_after_sliding_window(random_draws):
+    df = sort_by_date(random_draws(50, 45))
+    key = draw_key(df, 39)
+    assert key.startswith(str(df["draw_date"].iloc[39])[:10] + ":")
+    assert draws_after(df, key) == 10
+    assert draws_after(df.iloc[15:].reset_index(drop=True), key) == 10
+    assert draws_after(df.iloc[:39], key) is None
+    assert draws_after(df, None) is None
+    assert draws_after(df, draw_key(df, 49)) == 0
+
+
+def test_plan_update(random_draws, tmp_path):
+    mega, power = sort_by_date(random_draws(100, 45, seed=1)), sort_by_date(random_draws(100, 55, seed=2))
+    assert plan_update(mega, power, None)[0] == "full"
+    state = save_state(tmp_path, mega.iloc[:90], power.iloc[:90], 50, 45)
+    assert plan_update(mega.iloc[:90], power.iloc[:90], state) == ("none", "no new draws")
+    assert plan_update(mega, power, state) == ("incremental", "10 new draws")
+    assert plan_update(mega, power, state, window=40)[0] == "full"
+    assert plan_update(random_draws(100, 45, seed=3), power, state)[0] == "full"
+    assert plan_update(mega, power, state, full_every_days=0)[0] == "full"
+
+
+def test_refresh_forest_keeps_size_and_classes():
+    rng = np.random.default_rng(0)
+    X, y = rng.normal(size=(200, 5)), rng.integers(0, 4, 200)
+    forest = RandomForestClassifier(n_estimators=20, random_state=0).fit(X, y)
+    old = forest.estimators_[5:]
+    y2 = y.copy()
+    y2[-30:] = 0                                      # recent rows miss classes 1..3
+    refresh_forest(forest, X, y2, n_new=5, recent=30)
+    assert len(forest.estimators_) == forest.n_estimators == 20
+    assert forest.estimators_[:15] == old
+    assert forest.classes_.tolist() == [0, 1, 2, 3]
+    assert forest.predict_proba(X).shape == (200, 4)
+    last = forest.estimators_[-1]
+    refresh_forest(forest, X, y, n_new=50)              # clamped: one original tree is kept
+    assert len(forest.estimators_) == 20 and forest.estimators_[0] is last
+
+
+def test_continue_boosting_lightgbm():
+    lgb = pytest.importorskip("lightgbm")
+    rng = np.random.default_rng(1)
+    X, y = rng.normal(size=(300, 5)), rng.integers(0, 2, 300)
+    model = lgb.LGBMClassifier(n_estimators=10, verbose=-1).fit(X, y)
+    continue_boosting(model, X, y, 5)
+    assert model.booster_.current_iteration() == 15
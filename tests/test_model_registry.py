@@ -0,0 +1,58 @@
+import os
+import time
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from utils.model_registry import (
+    register_model, current_version, set_current, list_versions, load_current, load_manifest,
+    registry_is_newer, prune, LazyModel,
+)
+
+
+def _forest(seed=0):
+    rng = np.random.default_rng(seed)
+    X, y = rng.normal(size=(100, 4)), rng.integers(0, 3, 100)
+    return RandomForestClassifier(n_estimators=5, random_state=seed).fit(X, y), X
+
+
+def test_register_and_load(tmp_path):
+    model, X = _forest()
+    assert load_current("mega", "rf", registry_dir=tmp_path) is None
+    v = register_model(model, "mega", "rf", fingerprint="abcdef0123456789", metrics={"exact_match": 0.1},
+                       registry_dir=tmp_path)
+    assert v.endswith("-abcdef01") and current_version("mega", "rf", registry_dir=tmp_path) == v
+    lazy = load_current("mega", "rf", registry_dir=tmp_path)
+    assert isinstance(lazy, LazyModel) and repr(lazy).endswith("lazy)")
+    assert (lazy.predict_proba(X) == model.predict_proba(X)).all()
+    assert lazy.meta["mmap"] and lazy.meta["load_seconds"] is not None
+    eager = load_current("mega", "rf", lazy=False, registry_dir=tmp_path)
+    assert (eager.predict(X) == model.predict(X)).all()
+    small = LogisticRegression().fit(X, (X[:, 0] > 0).astype(int))
+    register_model(small, "mega", "lr", registry_dir=tmp_path)
+    manifest = load_manifest(tmp_path)["versions"]
+    assert {(m["model"], m["mmap"]) for m in manifest} == {("rf", True), ("lr", False)}
+
+
+def test_current_pointer_and_prune(tmp_path):
+    model, _ = _forest()
+    versions = [register_model(model, "power", "rf", registry_dir=tmp_path) for _ in range(5)]
+    assert list_versions("power", "rf", registry_dir=tmp_path) == versions
+    set_current("power", "rf", versions[0], registry_dir=tmp_path)
+    removed = prune("power", "rf", keep=2, registry_dir=tmp_path)
+    assert removed == versions[1:3]
+    assert list_versions("power", "rf", registry_dir=tmp_path) == [versions[0]] + versions[3:]
+    assert {m["version"] for m in load_manifest(tmp_path)["versions"]} == {versions[0]} | set(versions[3:])
+    assert current_version("power", "rf", registry_dir=tmp_path) == versions[0]
+
+
+def test_registry_is_newer(tmp_path):
+    model, _ = _forest()
+    path = tmp_path / "mega_rf.joblib"
+    path.write_bytes(b"x")
+    assert not registry_is_newer("mega", "rf", path, registry_dir=tmp_path / "reg")
+    register_model(model, "mega", "rf", registry_dir=tmp_path / "reg")
+    assert registry_is_newer("mega", "rf", path, registry_dir=tmp_path / "reg")
+    future = time.time() + 60
+    os.utime(path, (future, future))
+    assert not registry_is_newer("mega", "rf", path, registry_dir=tmp_path / "reg")
+    assert registry_is_newer("mega", "rf", tmp_path / "missing.joblib", registry_dir=tmp_path / "reg")
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from utils.feature_engine import build_window_features
+from utils.predict_advanced import MultiHotModel, train_multihot, ensemble_predict
+
+
+@pytest.fixture
+def data(random_draws):
+    return build_window_features(random_draws(150, 30, seed=7), window=10, max_num=30)
+
+
+@pytest.mark.parametrize("kind", ["lgb", "hgb", "mlp"])
+def test_predicts_six_unique_numbers(data, kind):
+    if kind == "lgb":
+        pytest.importorskip("lightgbm")
+    X, Y = data
+    model = train_multihot(X, Y, max_num=30, kind=kind, n_estimators=20, max_iter=20)
+    scores = model.predict_scores(X[-5:])
+    assert scores.shape == (5, 30) and ((scores >= 0) & (scores <= 1)).all()
+    pred = model.predict(X[-5:])
+    assert pred.shape == (5, 6)
+    for row, s in zip(pred, scores):
+        assert len(set(row.tolist())) == 6 and row.min() >= 1 and row.max() <= 30
+        assert (np.diff(row) > 0).all()
+        # the six highest-scoring numbers
+        assert set(row.tolist()) == set((np.argsort(-s)[:6] + 1).tolist())
+
+
+def test_update_keeps_the_output_shape(data):
+    pytest.importorskip("lightgbm")
+    X, Y = data
+    model = MultiHotModel(kind="lgb", max_num=30, n_estimators=10).fit(X[:-10], Y[:-10])
+    before = model.model_.booster_.current_iteration()
+    model.update(X[-10:], Y[-10:], n_rounds=5)
+    assert model.model_.booster_.current_iteration() == before + 5
+    assert model.predict(X[-1:]).shape == (1, 6)
+
+
+def test_unknown_kind_raises(data):
+    with pytest.raises(ValueError):
+        MultiHotModel(kind="nope", max_num=30).fit(*data)
+
+
+def test_drops_into_ensemble_predict(data):
+    X, Y = data
+    model = train_multihot(X, Y, max_num=30, kind="mlp", max_iter=10)
+    final = ensemble_predict([model, None], X[-1], max_num=30)
+    assert len(set(final)) == 6 and all(1 <= n <= 30 for n in final)
@@ -0,0 +1,57 @@
+import numpy as np
+from utils.feature_engine import draw_matrix
+from utils.incremental import sort_by_date
+from utils.online import update_online, replay_scores, load_online, online_path, MarkovScorer, DecayedDirichletScorer
+
+
+def _replayed(df, max_num):
+    scorers = [MarkovScorer(max_num), DecayedDirichletScorer(max_num)]
+    for draw in draw_matrix(sort_by_date(df), sort=False):
+        for s in scorers:
+            s.update(draw)
+    return scorers
+
+
+def _assert_same(a, b):
+    for x, y in zip(a, b):
+        assert np.allclose(x.scores(), y.scores())
+        assert np.allclose(x.counts, y.counts)
+
+
+def test_incremental_update_matches_full_replay(random_draws, tmp_path):
+    df = sort_by_date(random_draws(120, 45, seed=1))
+    update_online("mega", df.iloc[:100], 45, models_dir=tmp_path)
+    scorers = update_online("mega", df, 45, models_dir=tmp_path)
+    _assert_same(scorers, _replayed(df, 45))
+    _, n_seen, _ = load_online(online_path("mega", tmp_path), 45)
+    assert n_seen == 120
+    # nothing new: state unchanged
+    _assert_same(update_online("mega", df, 45, models_dir=tmp_path), scorers)
+
+
+def test_sliding_window_keeps_old_draws(random_draws, tmp_path):
+    df = sort_by_date(random_draws(120, 45, seed=2))
+    update_online("mega", df.iloc[:100], 45, models_dir=tmp_path)
+    # the fetch window slid: 20 oldest draws dropped, 20 new ones appended
+    scorers = update_online("mega", df.iloc[20:], 45, models_dir=tmp_path)
+    _assert_same(scorers, _replayed(df, 45))
+
+
+def test_unknown_last_draw_replays_everything(random_draws, tmp_path):
+    old, new = random_draws(60, 45, seed=3), random_draws(80, 45, seed=4)
+    update_online("mega", old, 45, models_dir=tmp_path)
+    _assert_same(update_online("mega", new, 45, models_dir=tmp_path), _replayed(new, 45))
+    assert load_online(online_path("mega", tmp_path), 55) is None
+
+
+def test_replay_scores_are_held_out(random_draws):
+    draws = draw_matrix(sort_by_date(random_draws(40, 45, seed=5)), sort=False)
+    out = replay_scores(draws, 30, 45)
+    scorers = [MarkovScorer(45), DecayedDirichletScorer(45)]
+    for t, draw in enumerate(draws):
+        if t >= 30:
+            for o, s in zip(out, scorers):
+                assert np.allclose(o[t - 30], s.scores())
+        for s in scorers:
+            s.update(draw)
+    assert all(o.shape == (10, 45) and np.allclose(o.sum(axis=1), 1.0) for o in out)
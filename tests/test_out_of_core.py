@@ -0,0 +1,71 @@
+import os
+import numpy as np
+import pytest
+from utils.feature_engine import build_pernum_features
+from utils.out_of_core import (
+    pernum_memmap, iter_blocks, score_blocks, train_lgb_chunked, train_partial_fit, train_pernum_chunked,
+)
+
+
+@pytest.fixture
+def games(random_draws):
+    return random_draws(90, 45, seed=1), random_draws(85, 55, seed=2)
+
+
+def test_memmap_matches_in_memory(games, tmp_path):
+    mega, power = games
+    X, y = pernum_memmap(mega, power, windows=(20,), store_dir=tmp_path, block_steps=7)
+    X_ref, y_ref = build_pernum_features(mega, power, window=20, dtype=np.float32)
+    assert isinstance(X, np.memmap) and X.dtype == np.float32 and y.dtype == np.int8
+    assert np.array_equal(X, X_ref) and np.array_equal(y, y_ref)
+    # a second call maps the stored entry
+    X2, _ = pernum_memmap(mega, power, windows=(20,), store_dir=tmp_path, block_steps=7)
+    assert X2.filename == X.filename
+
+
+def test_memmap_stacks_windows(games, tmp_path):
+    mega, power = games
+    X, y = pernum_memmap(mega, power, windows=(10, 30), store_dir=tmp_path, block_steps=16)
+    X10, _ = build_pernum_features(mega, power, window=10, dtype=np.float32)
+    X30, y30 = build_pernum_features(mega, power, window=30, dtype=np.float32)
+    # rows start at the largest window
+    assert np.array_equal(X, np.hstack([X10[20 * 45:], X30])) and np.array_equal(y, y30)
+    assert pernum_memmap(mega[:30], power, windows=(30,), store_dir=tmp_path) == (None, None)
+
+
+def test_blocks_cover_the_range_once():
+    X, y = np.arange(50, dtype=np.float64).reshape(25, 2), np.arange(25)
+    blocks = list(iter_blocks(X, y, 4, lo=3, hi=22))
+    assert [len(b) for _, b in blocks] == [4, 4, 4, 4, 3]
+    assert np.concatenate([b for _, b in blocks]).tolist() == list(range(3, 22))
+    assert all(Xb.dtype == np.float32 for Xb, _ in blocks)
+
+
+def test_chunked_scores_match_in_memory(games, tmp_path):
+    mega, power = games
+    X, y = pernum_memmap(mega, power, windows=(20,), store_dir=tmp_path)
+    hi = 50 * 45
+    model = train_partial_fit("sgd", X, y, block_rows=hi, hi=hi, epochs=1)
+    p = np.clip(model.predict_proba(np.asarray(X[hi:]))[:, 1], 1e-7, 1 - 1e-7)
+    yv = np.asarray(y[hi:])
+    out = score_blocks(model, X, y, 97, hi, len(X))
+    assert out["acc"] == pytest.approx(np.mean((p >= 0.5) == yv))
+    assert out["logloss"] == pytest.approx(-np.mean(yv * np.log(p) + (1 - yv) * np.log(1 - p)), rel=1e-6)
+
+
+def test_single_block_lgb_matches_in_memory(games, tmp_path):
+    lgb = pytest.importorskip("lightgbm")
+    mega, power = games
+    X, y = pernum_memmap(mega, power, windows=(20,), store_dir=tmp_path)
+    hi = 50 * 45
+    chunked = train_lgb_chunked(X, y, block_rows=hi, hi=hi)
+    full = lgb.LGBMClassifier(n_estimators=20, random_state=42, verbose=-1).fit(np.asarray(X[:hi]), y[:hi])
+    assert np.allclose(chunked.predict_proba(np.asarray(X[hi:])), full.predict_proba(np.asarray(X[hi:])))
+
+
+def test_train_pernum_chunked_saves_models(games, tmp_path):
+    mega, power = games
+    paths, metrics = train_pernum_chunked(mega, power, window=20, save_dir=str(tmp_path / "models"),
+                                          kinds=("sgd", "mlp"), block_steps=16, store_dir=str(tmp_path / "store"))
+    assert set(paths) == {"sgd", "mlp"} and all(os.path.exists(p) for p in paths.values())
+    assert metrics["rows"] == 65 * 45 and 0 <= metrics["acc_sgd"] <= 1
@@ -0,0 +1,59 @@
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.multioutput import MultiOutputClassifier
+from utils.feature_engine import build_window_features
+from utils.predict_advanced import ensemble_scores, learn_ensemble_weights, topk_from_scores, number_scores
+
+
+class _Fixed:
+    """Model giả trả về cùng một vector điểm cho mọi hàng."""
+
+    def __init__(self, scores):
+        self.scores = np.asarray(scores, dtype=np.float64)
+
+    def predict_scores(self, X):
+        return np.tile(self.scores, (len(X), 1))
+
+
+class _Broken:
+    def predict_scores(self, X):
+        raise RuntimeError("boom")
+
+
+def test_ensemble_scores_weights_and_skips():
+    a, b = np.zeros(10), np.zeros(10)
+    a[:6], b[4:] = 1.0, 2.0
+    X = np.zeros((3, 5))
+    out = ensemble_scores([_Fixed(a), None, _Broken(), _Fixed(b)], X, max_num=10)
+    assert out.shape == (3, 10) and np.allclose(out.sum(axis=1), 6.0)
+    assert np.allclose(out[0], (a + b / 2) / 2)
+    weighted = ensemble_scores([_Fixed(a), _Fixed(b)], X, max_num=10, weights=[3.0, 1.0])
+    assert np.allclose(weighted[0], (3 * a + b / 2) / 4)
+    assert np.allclose(ensemble_scores([_Fixed(a), _Fixed(b)], X, max_num=10, weights=[1.0, 0.0]), a)
+    assert topk_from_scores(out).tolist() == [[1, 2, 3, 4, 5, 6]] * 3
+
+
+def test_number_scores_per_position_classifier(random_draws):
+    X, Y = build_window_features(random_draws(120, 20), window=10, max_num=20)
+    model = MultiOutputClassifier(RandomForestClassifier(n_estimators=5, random_state=0)).fit(X, Y)
+    s = number_scores(model, X[:4], max_num=20)
+    assert s.shape == (4, 20) and np.allclose(s.sum(axis=1), 6.0)
+    proba = model.predict_proba(X[:1])
+    expected = np.zeros(20)
+    for est, p in zip(model.estimators_, proba):
+        expected[est.classes_.astype(int) - 1] += p[0]
+    assert np.allclose(s[0], expected)
+
+
+def test_learn_ensemble_weights_prefers_better_model():
+    rng = np.random.default_rng(0)
+    max_num, n = 20, 300
+    Y = np.sort(np.array([rng.choice(max_num, 6, replace=False, p=np.r_[np.full(6, 0.1), np.full(14, 0.4 / 14)]) + 1
+                          for _ in range(n)]), axis=1)
+    X = np.zeros((n, 3))
+    good = np.r_[np.full(6, 0.1), np.full(14, 0.4 / 14)]
+    flat = np.full(max_num, 1.0 / max_num)
+    w = learn_ensemble_weights([_Fixed(flat), None, np.tile(good, (n, 1)), _Broken()], X, Y, max_num=max_num)
+    assert w[1] == 0.0 and w[3] == 0.0
+    assert np.isclose(sum(w), 1.0) and w[2] > 0.5 > w[0]
+    assert learn_ensemble_weights([None, _Broken()], X, Y, max_num=max_num) == [0.0, 0.0]
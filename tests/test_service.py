@@ -0,0 +1,89 @@
+import os
+import sys
+import subprocess
+import pytest
+import service
+
+
+@pytest.fixture
+def draws(random_draws):
+    return {"mega": random_draws(120, 45, seed=1), "power": random_draws(120, 55, seed=2)}
+
+
+@pytest.fixture
+def client(draws, tmp_path, monkeypatch):
+    # relative models/ data/ paths land in tmp_path; draws come from memory, not the network
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(service, "load_draws", lambda game, use_csv=False: draws[game])
+    monkeypatch.setattr(service, "STATE", service.ServiceState())
+    service.STATE.reload()
+    return service.app.test_client()
+
+
+def test_reload_swaps_only_on_change(random_draws, client, draws):
+    state = service.STATE
+    old = state.snapshots["mega"]
+    assert state.reload() == {}
+    assert state.snapshots["mega"] is old
+    draws["mega"] = random_draws(121, 45, seed=3)
+    swapped = state.reload()
+    assert list(swapped) == ["mega"]
+    assert state.snapshots["mega"] is not old and state.snapshots["mega"]["n_draws"] == 121
+    assert state.snapshots["mega"]["version"] == swapped["mega"] != old["version"]
+
+
+def test_cache_invalidated_on_version_change(client):
+    first = client.get("/predict/mega?k=6&method=heuristic").get_json()
+    assert client.get("/predict/mega?k=6&method=heuristic").get_json() == first
+    assert service.STATE.hits == 1 and len(service.STATE._cache) == 1
+    os.makedirs("models", exist_ok=True)
+    with open("models/mega_dummy.joblib", "wb") as f:
+        f.write(b"x")
+    assert "mega" in service.STATE.reload()
+    assert len(service.STATE._cache) == 0
+    again = client.get("/predict/mega?k=6&method=heuristic").get_json()
+    assert again["version"] != first["version"] and again["ticket"] == first["ticket"]
+
+
+@pytest.mark.parametrize("k", [0, -1, 46])
+def test_predict_rejects_bad_k(client, k):
+    r = client.get(f"/predict/mega?k={k}")
+    assert r.status_code == 400 and "k must be" in r.get_json()["error"]
+    out = client.post("/predict", json={"requests": [{"game": "mega", "k": k}]}).get_json()
+    assert "error" in out["results"][0]
+
+
+def test_error_paths(client):
+    assert client.get("/predict/keno").status_code == 404
+    assert client.get("/predict/mega?k=abc").status_code == 400
+    assert client.get("/tickets/mega?n=0").status_code == 400
+    assert client.get("/tickets/mega?n=5&sum_min=400").status_code == 400
+    assert client.get("/tickets/mega?n=5&max_consecutive=0").status_code == 400
+    for bad in ([[1, 2, 3, 4, 5]], [[1, 1, 2, 3, 4, 5]], [[0, 1, 2, 3, 4, 5]], [[1, 2, 3, 4, 5, 46]],
+                [[1, 2, 3, 4, 5, "6"]], [[1, 2, 3, 4, 5, 6.5]], "1,2,3,4,5,6"):
+        assert client.post("/check/mega", json={"tickets": bad}).status_code == 400, bad
+    assert client.post("/check/mega", json={"tickets": [[1, 2, 3, 4, 5, 6]], "date": "1999-01-01"}).status_code == 404
+
+
+def test_check_and_tickets(client):
+    draw = service.STATE.snapshots["mega"]["draws"].iloc[-1]
+    ticket = [int(draw[f"n{i}"]) for i in range(1, 7)]
+    out = client.post("/check/mega", json={"tickets": [ticket]}).get_json()
+    assert out["results"][0]["hits"] == 6 and out["results"][0]["tier"] == "jackpot"
+    T = client.get("/tickets/power?n=20&seed=1&odd_min=2&odd_max=4").get_json()["tickets"]
+    assert len(T) == 20 and len({tuple(t) for t in T}) == 20
+    assert all(2 <= sum(v & 1 for v in t) <= 4 and max(t) <= 55 for t in T)
+
+
+def test_service_does_not_install_debug_dumps():
+    # main.py imports utils.debug_wrapper, which saves every fetched page to data/
+    code = "import sys, service; assert 'utils.debug_wrapper' not in sys.modules and 'main' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(service.__file__)), check=True)
+
+
+def test_online_scorers_alone_fall_back_to_heuristic(client):
+    snap = service.STATE.snapshots["mega"]
+    assert len(snap["online"]) == 2 and not service.has_ensemble(snap)
+    r = client.get("/predict/mega?k=6").get_json()
+    assert r["method"] == "heuristic"
+    assert client.get("/tickets/mega?n=3&seed=1").get_json()["scores_from"] == "frequency"
@@ -0,0 +1,42 @@
+from math import comb
+import numpy as np
+from utils import simulation
+from utils.simulation import null_distribution, majority_null, compare_rate
+
+
+def _hypergeometric(max_num, k=6):
+    return np.array([comb(k, h) * comb(max_num - k, k - h) / comb(max_num, k) for h in range(7)])
+
+
+def test_null_matches_hypergeometric():
+    null = null_distribution(45, n_sims=200_000, workers=1, batch=1 << 16)
+    p = _hypergeometric(45)
+    assert np.allclose(null["hits_p"], p, atol=3e-3)
+    assert abs(null["mean_hits"] - 36 / 45) < 5e-3
+    assert null["exact_match"] == 1 / comb(45, 6)
+    assert null["n_sims"] == 200_000 and null["hits_p"].sum() == 1.0
+
+
+def test_null_does_not_depend_on_workers():
+    a = null_distribution(20, n_sims=30_000, seed=7, workers=1, batch=10_000)
+    assert null_distribution(20, n_sims=30_000, seed=7, workers=1, batch=10_000) is a
+    simulation._CACHE.clear()
+    b = null_distribution(20, n_sims=30_000, seed=7, workers=2, batch=10_000)
+    assert b is not a and (a["hits_p"] == b["hits_p"]).all() and (a["pos_acc"] == b["pos_acc"]).all()
+
+
+def test_majority_null_uses_smoothed_training_modes():
+    Y_train = np.array([[1, 5], [1, 6], [2, 6], [1, 6]])
+    null = {"pos_acc": np.zeros(2), "exact_match": 0.1}
+    out = majority_null(null, Y_train, max_num=6)
+    assert np.allclose(out["pos_acc"], [(3 + 1) / (4 + 6), (3 + 1) / (4 + 6)])
+    assert out["exact_match"] == 0.1 and null["pos_acc"].tolist() == [0.0, 0.0]
+    # never 0, so one hit on a short test split is not "significant"
+    assert (majority_null(null, np.array([[1, 2]]), max_num=45)["pos_acc"] > 0).all()
+
+
+def test_compare_rate():
+    h, p = compare_rate(0.5, 100, 0.1, reps=5000)
+    assert h > 0 and p < 0.01
+    h, p = compare_rate(0.1, 100, 0.1, reps=5000)
+    assert h == 0 and p > 0.3
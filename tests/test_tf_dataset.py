@@ -0,0 +1,46 @@
+import importlib
+import numpy as np
+import pytest
+from utils.feature_engine import build_window_features, multi_hot
+
+tf = pytest.importorskip("tensorflow")
+
+
+@pytest.fixture
+def train_tf_model(tmp_path, monkeypatch):
+    # the script creates models/ and metrics/ on import
+    monkeypatch.chdir(tmp_path)
+    return importlib.import_module("train_tf_model")
+
+
+@pytest.fixture
+def arrays(random_draws, tmp_path):
+    X, Y = build_window_features(random_draws(120, 45, seed=4), window=20, max_num=45)
+    np.save(tmp_path / "X.npy", X)
+    # memory-mapped like a feature store entry
+    return np.load(tmp_path / "X.npy", mmap_mode="r"), multi_hot(Y, 45)
+
+
+def test_batches_shapes_and_dtypes(train_tf_model, arrays):
+    X, Y = arrays
+    ds = train_tf_model.make_dataset(X, Y, batch_size=16, shuffle=False)
+    x_spec, y_spec = ds.element_spec
+    assert x_spec.shape.as_list() == [None, 45] and x_spec.dtype == tf.float32
+    assert y_spec.shape.as_list() == [None, 45] and y_spec.dtype == tf.float32
+    batches = [(x.numpy(), y.numpy()) for x, y in ds]
+    assert [len(x) for x, _ in batches] == [16] * 6 + [4]
+    assert np.array_equal(np.concatenate([x for x, _ in batches]), np.asarray(X, dtype=np.float32))
+    assert np.array_equal(np.concatenate([y for _, y in batches]), Y.astype(np.float32))
+
+
+def test_shuffled_epoch_sees_every_row_once(train_tf_model, arrays):
+    X, Y = arrays
+    X = np.column_stack([np.arange(len(X)), X])
+    ds = train_tf_model.make_dataset(X, Y, batch_size=32, shuffle=True, seed=0)
+    ids = np.concatenate([x.numpy()[:, 0] for x, _ in ds]).astype(np.int64)
+    assert sorted(ids.tolist()) == list(range(len(X)))
+    assert ids.tolist() != list(range(len(X)))
+    # rows and targets stay paired
+    for x, y in ds.take(1):
+        idx = x.numpy()[:, 0].astype(np.int64)
+        assert np.array_equal(y.numpy(), Y[idx].astype(np.float32))
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from utils.tf_export import export_keras, load_numpy_model, matches_features
+
+
+class Dense:
+    """Lớp giả có cùng giao diện get_weights / get_config như keras.layers.Dense."""
+
+    def __init__(self, W, b, activation, name="dense"):
+        self.W, self.b, self.activation, self.name = W, b, activation, name
+
+    def get_weights(self):
+        return [self.W, self.b]
+
+    def get_config(self):
+        return {"activation": self.activation}
+
+
+class Dropout:
+    name = "dropout"
+
+
+class LSTM:
+    name = "lstm"
+
+
+class _Model:
+    def __init__(self, layers):
+        self.layers = layers
+
+
+def test_export_matches_manual_forward_pass(tmp_path):
+    rng = np.random.default_rng(0)
+    W1, b1 = rng.normal(size=(8, 16)).astype(np.float32), rng.normal(size=16).astype(np.float32)
+    W2, b2 = rng.normal(size=(16, 10)).astype(np.float32), rng.normal(size=10).astype(np.float32)
+    spec = {"feature_set": "counts", "params": {"window": 20, "max_num": 10}}
+    path = tmp_path / "tf.npz"
+    assert export_keras(_Model([Dense(W1, b1, "relu"), Dropout(), Dense(W2, b2, "linear")]), path, spec) == 2
+    model = load_numpy_model(path)
+    X = rng.normal(size=(5000, 8)).astype(np.float32)
+    expected = np.maximum(np.maximum(X @ W1 + b1, 0) @ W2 + b2, 0)
+    scores = model.predict_scores(X, batch_size=1000)
+    assert np.allclose(scores, expected, atol=1e-5) and (scores >= 0).all()
+    assert model.predict(X[:3]).shape == (3, 6)
+    assert matches_features(model, spec, 8)
+    assert not matches_features(model, spec, 9)
+    assert not matches_features(model, None, 8)
+
+
+def test_unsupported_layers_raise(tmp_path):
+    W, b = np.ones((4, 4), dtype=np.float32), np.zeros(4, dtype=np.float32)
+    with pytest.raises(ValueError):
+        export_keras(_Model([Dense(W, b, "relu"), LSTM()]), tmp_path / "a.npz")
+    with pytest.raises(ValueError):
+        export_keras(_Model([Dense(W, b, "swish")]), tmp_path / "b.npz")
+
+
+def test_export_matches_keras(tmp_path):
+    tf = pytest.importorskip("tensorflow")
+    from train_tf_model import build_tf_model
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(64, 45)).astype(np.float32)
+    model = build_tf_model(45, output_dim=45)
+    model.fit(X, (rng.random((64, 45)) < 6 / 45).astype(np.float32), epochs=1, verbose=0)
+    export_keras(model, tmp_path / "tf.npz")
+    expected = np.maximum(model.predict(X, verbose=0), 0)
+    assert np.allclose(load_numpy_model(tmp_path / "tf.npz").predict_scores(X), expected, atol=1e-4)
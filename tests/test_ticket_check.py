@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+from utils.bitsets import to_masks
+from utils.ticket_check import check_blocks, check_tickets, iter_ticket_chunks
+
+
+def _random_tickets(n, max_num, seed=0):
+    """Sinh n vé ngẫu nhiên (n x 6, đã sắp xếp)."""
+    rng = np.random.default_rng(seed)
+    return np.sort(np.array([rng.choice(max_num, 6, replace=False) + 1 for _ in range(n)]), axis=1)
+
+
+def _brute_force_hits(T, D):
+    return np.array([[len(set(t) & set(d)) for d in D] for t in T])
+
+
+def test_check_blocks_matches_brute_force():
+    T, D = _random_tickets(500, 20, seed=1), _random_tickets(7, 20, seed=2)
+    hits = _brute_force_hits(T, D)
+    chunks = [(s, to_masks(T[s:s + 128])) for s in range(0, len(T), 128)]
+    for min_hits in (0, 3, 5):
+        hist, won = np.zeros(7, dtype=np.int64), []
+        for t_idx, d_idx, h, block_hist in check_blocks(chunks, to_masks(D), min_hits=min_hits, block_cells=50):
+            hist += block_hist
+            won += list(zip(t_idx.tolist(), d_idx.tolist(), h.tolist()))
+        assert (hist == np.bincount(hits.ravel(), minlength=7)).all()
+        rows, cols = np.nonzero(hits >= min_hits)
+        assert sorted(won) == sorted(zip(rows.tolist(), cols.tolist(), hits[rows, cols].tolist()))
+
+
+def test_check_tickets_summary_and_csv(tmp_path):
+    T, D = _random_tickets(300, 12, seed=3), _random_tickets(4, 12, seed=4)
+    path = tmp_path / "tickets.csv"
+    pd.DataFrame(T, columns=[f"n{i}" for i in range(1, 7)]).to_csv(path, index=False)
+    np.save(tmp_path / "tickets.npy", T)
+    dates = np.array([f"2024-01-0{i + 1}" for i in range(len(D))])
+    out = tmp_path / "hits.csv"
+    hits = _brute_force_hits(T, D)
+    summary = check_tickets(iter_ticket_chunks(path, chunk_rows=64), dates, to_masks(D), "mega", out=out)
+    assert summary["tickets"] == 300 and summary["pairs"] == hits.size
+    assert summary["hits"] == {h: int((hits == h).sum()) for h in range(7)}
+    assert summary["winning_rows"] == int((hits >= 3).sum()) == len(pd.read_csv(out))
+    assert summary["jackpots"] == int((hits == 6).sum())
+    npy = check_tickets(iter_ticket_chunks(tmp_path / "tickets.npy", chunk_rows=64), dates, to_masks(D), "mega")
+    assert npy["hits"] == summary["hits"]
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from utils.bitsets import to_masks, from_masks, match_counts, contains, popcount
+from utils.tickets import sample_tickets, check_constraints, check_feasible, max_run
+
+
+def test_masks_round_trip_and_match_counts():
+    rng = np.random.default_rng(0)
+    T = np.sort(np.array([rng.choice(55, 6, replace=False) + 1 for _ in range(200)]), axis=1)
+    D = np.sort(np.array([rng.choice(55, 6, replace=False) + 1 for _ in range(30)]), axis=1)
+    masks = to_masks(T)
+    assert (popcount(masks) == 6).all()
+    assert (from_masks(masks) == T).all()
+    expected = np.array([[len(set(t) & set(d)) for d in D] for t in T])
+    assert (match_counts(masks, to_masks(D)) == expected).all()
+    assert contains(masks, masks[::2]).tolist() == [i % 2 == 0 for i in range(len(T))]
+    assert not contains(masks, []).any()
+
+
+def test_to_masks_ignores_nan_and_out_of_range():
+    assert to_masks([[1, 2, np.nan, 0, 64, 3]])[0] == (1 << 1) | (1 << 2) | (1 << 3)
+    with pytest.raises(ValueError):
+        from_masks(to_masks([[1, 2, 3, 4, 5, 5]]))
+
+
+def test_sample_tickets_meets_constraints():
+    scores = np.linspace(1.0, 2.0, 45)
+    exclude = np.array([[1, 2, 3, 4, 5, 6], [10, 11, 12, 13, 14, 15]])
+    cons = {"sum_range": (100, 160), "odd_range": (2, 4), "max_consecutive": 2}
+    T = sample_tickets(scores, 2000, exclude_draws=exclude, seed=1, **cons)
+    assert T.shape == (2000, 6)
+    assert (np.diff(T.astype(int), axis=1) > 0).all() and T.min() >= 1 and T.max() <= 45
+    assert check_constraints(T, exclude_masks=to_masks(exclude), **cons).all()
+    assert len(np.unique(to_masks(T))) == len(T)
+    assert (max_run(T) <= 2).all()
+    assert (sample_tickets(scores, 50, seed=3) == sample_tickets(scores, 50, seed=3)).all()
+
+
+def test_sample_tickets_uses_only_positive_scores():
+    scores = np.zeros(45)
+    scores[[0, 4, 9, 19, 29, 39, 44]] = 1.0
+    T = sample_tickets(scores, 7, seed=0)
+    assert len(T) == 7 and set(np.unique(T)) <= {1, 5, 10, 20, 30, 40, 45}
+
+
+def test_max_run():
+    assert max_run([[1, 2, 3, 7, 8, 20], [1, 3, 5, 7, 9, 11], [40, 41, 42, 43, 44, 45]]).tolist() == [3, 1, 6]
+
+
+@pytest.mark.parametrize("cons", [{"sum_range": (300, 400)}, {"sum_range": (50, 40)}, {"odd_range": (0, 0)},
+                                  {"max_consecutive": 0}])
+def test_infeasible_constraints_raise(cons):
+    scores = np.zeros(45)
+    scores[0:45:2] = 1.0                              # only odd numbers
+    with pytest.raises(ValueError):
+        check_feasible(scores, **cons)
+    with pytest.raises(ValueError):
+        sample_tickets(scores, 10, seed=0, **cons)
+
+
+def test_sample_tickets_rejects_bad_arguments():
+    with pytest.raises(ValueError):
+        sample_tickets(np.ones(45), 10, foo=(1, 2))
+    with pytest.raises(ValueError):
+        sample_tickets(np.ones(45), 10, temperature=0)
+    with pytest.raises(ValueError):
+        sample_tickets(np.r_[np.ones(5), np.zeros(40)], 10)
@@ -0,0 +1,87 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from utils import tiers
+from utils.feature_engine import build_window_features, draw_matrix, onehot_counts
+from utils.model_loader import MODEL_KINDS
+from utils.online import update_online
+
+
+@pytest.fixture
+def ctx(random_draws, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("PREDICT_RETRAIN", raising=False)
+    df = random_draws(120, 45)
+    X, Y = build_window_features(df, window=20, max_num=45)
+    freq = pd.DataFrame({"number": [3, 9, 12, 20, 33, 41, 7], "frequency": [9, 8, 7, 6, 5, 4, 3]})
+    return tiers.tier_context("mega", df, 45, X, Y, freq=freq, models_dir=str(tmp_path / "models"), window=20)
+
+
+def test_available_tiers(ctx, monkeypatch):
+    assert tiers.available_tiers(ctx) == ["heuristic", "fast", "rf"]
+    assert tiers.available_tiers({**ctx, "models": [None, object()], "feat": np.zeros(45)})[-1] == "cached"
+    assert tiers.available_tiers({**ctx, "X": None}) == ["heuristic"]
+    # online scorers or a lone Keras export do not make a cached ensemble
+    online = update_online("mega", ctx["df"], 45, save=False)
+    no_trained = {**ctx, "models": [None] * len(MODEL_KINDS) + [object()], "online": online, "feat": np.zeros(45)}
+    assert "cached" not in tiers.available_tiers(no_trained)
+    assert "retrain" in tiers.available_tiers({**ctx, "allow_retrain": True})
+    monkeypatch.setenv("PREDICT_RETRAIN", "1")
+    assert tiers.tier_context("mega", None, 45, ctx["X"], ctx["Y"])["allow_retrain"]
+    monkeypatch.setenv("PREDICT_RETRAIN", "0")
+    assert not tiers.tier_context("mega", None, 45, ctx["X"], ctx["Y"])["allow_retrain"]
+
+
+def test_select_tier_by_budget(ctx):
+    costs = {"mega": {"fast": {"fit": 0.5, "predict": 0.1, "runs": 1}, "rf": {"fit": 20.0, "predict": 1.0, "runs": 1}}}
+    assert tiers.select_tier(ctx, 0.001, costs) == "heuristic"
+    assert tiers.select_tier(ctx, 1.0, costs) == "fast"
+    assert tiers.select_tier(ctx, 21.0, costs) == "rf"
+    # default costs for unmeasured tiers; retrain only when allowed
+    assert tiers.select_tier({**ctx, "allow_retrain": True}, 1000.0, {}) == "retrain"
+    assert tiers.select_tier(ctx, 1000.0, {}) == "rf"
+
+
+def test_record_cost_ema(tmp_path):
+    path = str(tmp_path / "costs.json")
+    tiers.record_cost("mega", "fast", 1.0, 0.5, path=path)
+    tiers.record_cost("mega", "fast", 2.0, 0.5, path=path)
+    cur = json.load(open(path, encoding="utf-8"))["mega"]["fast"]
+    assert cur["runs"] == 2 and cur["fit"] == pytest.approx(1.0 + tiers.EMA_ALPHA)
+    assert tiers.estimate_cost(tiers.load_costs(path), "mega", "fast") == pytest.approx(1.5 + tiers.EMA_ALPHA)
+    assert tiers.estimate_cost({}, "mega", "rf") == tiers.DEFAULT_COSTS["rf"]
+
+
+def test_predict_with_deadline_runs_heuristic_first(ctx):
+    ticket, tier, results, thread = tiers.predict_with_deadline(ctx, 0.001, background=False)
+    assert tier == "heuristic" and thread is None
+    assert ticket == results["heuristic"] == [3, 9, 12, 20, 33, 41]
+    assert "heuristic" in tiers.load_costs()["mega"]
+
+
+def test_predict_with_deadline_fast_tier(ctx):
+    costs = {"mega": {"fast": {"fit": 0.1, "predict": 0.1, "runs": 1}, "rf": {"fit": 100.0, "predict": 1.0, "runs": 1}}}
+    os.makedirs("models", exist_ok=True)
+    with open(tiers.COST_PATH, "w", encoding="utf-8") as f:
+        json.dump(costs, f)
+    ticket, tier, results, _ = tiers.predict_with_deadline(ctx, 60.0, background=False)
+    assert tier == "fast" and set(results) == {"heuristic", "fast"}
+    assert len(ticket) == 6 and len(set(ticket)) == 6 and all(1 <= v <= 45 for v in ticket)
+
+
+def test_fast_and_rf_tiers_predict_the_next_draw(ctx, monkeypatch):
+    from utils import predict
+    from utils.predict_advanced import MultiHotModel
+    draws = draw_matrix(ctx["df"])
+    expected = onehot_counts(draws[-20:], 45).sum(axis=0)
+    assert (tiers._next_counts(ctx) == expected).all()
+    assert not (np.asarray(ctx["X"][-1]) == expected).all()
+    seen = []
+    monkeypatch.setattr(predict, "predict_next", lambda model, x: seen.append(np.asarray(x).copy()) or [1, 2, 3, 4, 5, 6])
+    monkeypatch.setattr(MultiHotModel, "predict", lambda self, X, k=6: seen.append(np.asarray(X)[0].copy())
+                        or np.array([[1, 2, 3, 4, 5, 6]]))
+    assert tiers.run_tier("rf", ctx) == [1, 2, 3, 4, 5, 6]
+    assert tiers.run_tier("fast", ctx) == [1, 2, 3, 4, 5, 6]
+    assert len(seen) == 2 and all((x == expected).all() for x in seen)
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from concurrent.futures import Future
+from utils import train_scheduler as ts
+from utils.predict_advanced import make_estimator
+
+pytest.importorskip("lightgbm")
+
+
+def _data(n=120, d=8, n_out=3, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.integers(0, 6, size=(n, d)).astype(np.float32)
+    Y = np.column_stack([(X[:, j] + rng.integers(0, 2, n)) % (3 + j) for j in range(n_out)]).astype(np.int64)
+    return X, Y
+
+
+class _InlinePool:
+    """Executor giả: chạy job ngay trong tiến trình, ghi lại thứ tự submit."""
+    submitted = []
+
+    def __init__(self, max_workers, mp_context, initializer, initargs):
+        initializer(*initargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, job):
+        _InlinePool.submitted.append(job[:3])
+        fut = Future()
+        try:
+            fut.set_result(fn(job))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+
+@pytest.fixture
+def inline(monkeypatch):
+    _InlinePool.submitted = []
+    monkeypatch.setattr(ts, "ProcessPoolExecutor", _InlinePool)
+    monkeypatch.setattr(ts, "_ATTACHED", {})
+    # finish the jobs in reverse submission order
+    monkeypatch.setattr(ts, "as_completed", lambda futures: list(futures)[::-1])
+    return _InlinePool
+
+
+def test_longest_jobs_first_and_positions_reassembled(inline):
+    datasets = {"mega": _data(seed=1), "power": _data(seed=2)}
+    models, timings = ts.run_training_jobs(datasets, ["mlp", "lgb"], model_params={"mlp": {"max_iter": 20}},
+                                           threads_total=2)
+    kinds = [kind for _, kind, _ in inline.submitted]
+    assert kinds == ["lgb"] * 6 + ["mlp"] * 6
+    assert set(models) == {(g, k) for g in datasets for k in ("lgb", "mlp")} and len(timings) == 12
+    for (game, kind), model in models.items():
+        X, Y = datasets[game]
+        params = {"max_iter": 20} if kind == "mlp" else {}
+        expected = np.column_stack([make_estimator(kind, threads=1, **params).fit(X, Y[:, p]).predict(X)
+                                    for p in range(Y.shape[1])])
+        assert np.array_equal(model.predict(X), expected)
+
+
+def test_failed_job_drops_its_model(inline):
+    X, Y = _data()
+    models, _ = ts.run_training_jobs({"mega": (X, Y)}, ["lgb", "nope"], threads_total=1)
+    assert list(models) == [("mega", "lgb")]
+
+
+def test_process_pool_matches_serial():
+    X, Y = _data(seed=3)
+    models, timings = ts.run_training_jobs({"mega": (X, Y)}, ["lgb"], threads_total=2)
+    expected = np.column_stack([make_estimator("lgb", threads=1).fit(X, Y[:, p]).predict(X) for p in range(Y.shape[1])])
+    assert np.array_equal(models[("mega", "lgb")].predict(X), expected)
+    assert sorted(t["output"] for t in timings) == ["n1", "n2", "n3"]
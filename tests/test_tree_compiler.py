@@ -0,0 +1,67 @@
+import os
+import time
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.multioutput import MultiOutputClassifier
+from utils.tree_compiler import compile_model, compile_and_save, load_compiled, load_fresh_compiled, compiled_path
+
+
+def _data(n=300, d=12, n_out=3, seed=0):
+    """Đặc trưng đếm giả lập (có cả NaN) và nhãn nhiều lớp cho từng vị trí."""
+    rng = np.random.default_rng(seed)
+    X = rng.integers(0, 8, size=(n, d)).astype(np.float64)
+    X[rng.random(X.shape) < 0.02] = np.nan
+    Y = np.column_stack([(np.nan_to_num(X[:, j]) + rng.integers(0, 3, n)) % (4 + j) for j in range(n_out)])
+    return X, Y.astype(np.int64)
+
+
+def _assert_same(model, X):
+    cm = compile_model(model)
+    for p, q in zip(model.predict_proba(X), cm.predict_proba(X)):
+        assert np.allclose(p, q, atol=1e-6)
+    # CatBoost positions predict (n, 1) columns, so MultiOutputClassifier adds an axis
+    expected = np.asarray(model.predict(X)).reshape(len(X), -1)
+    assert np.array_equal(expected, np.asarray(cm.predict(X)).reshape(len(X), -1))
+    return cm
+
+
+def test_random_forest_matches():
+    X, Y = _data()
+    X = np.nan_to_num(X)
+    rf = MultiOutputClassifier(RandomForestClassifier(n_estimators=20, max_depth=6, random_state=0)).fit(X, Y)
+    _assert_same(rf, X)
+
+
+def test_lightgbm_matches():
+    lgb = pytest.importorskip("lightgbm")
+    X, Y = _data(seed=1)
+    multi = MultiOutputClassifier(lgb.LGBMClassifier(n_estimators=30, num_leaves=7, verbose=-1)).fit(X, Y)
+    _assert_same(multi, X)
+    binary = lgb.LGBMClassifier(n_estimators=30, num_leaves=7, verbose=-1).fit(X, Y[:, 0] % 2)
+    _assert_same(binary, X)
+
+
+def test_catboost_matches():
+    cb = pytest.importorskip("catboost")
+    X, Y = _data(seed=2)
+    X = np.nan_to_num(X)
+    est = cb.CatBoostClassifier(iterations=30, depth=4, verbose=0, allow_writing_files=False, random_seed=0)
+    _assert_same(MultiOutputClassifier(est).fit(X, Y), X)
+
+
+def test_save_load_and_freshness(tmp_path):
+    X, Y = _data(seed=3)
+    X = np.nan_to_num(X)
+    rf = MultiOutputClassifier(RandomForestClassifier(n_estimators=10, random_state=0)).fit(X, Y)
+    path = str(tmp_path / "mega_rf.joblib")
+    open(path, "wb").close()
+    assert compile_and_save(rf, path) == compiled_path(path)
+    loaded = load_compiled(compiled_path(path))
+    assert isinstance(loaded.forests[0].arrays["feature"], np.memmap)
+    assert np.array_equal(loaded.predict(X), rf.predict(X))
+    assert load_fresh_compiled(path) is not None
+    # a joblib written after the compiled copy makes it stale
+    later = time.time() + 10
+    os.utime(path, (later, later))
+    assert load_fresh_compiled(path) is None
@@ -0,0 +1,52 @@
+import numpy as np
+from utils.predict_advanced import make_estimator
+from utils.tuning import sample_candidates, hit_score, save_best_config, load_best_config, tuned_params
+
+
+def _row(model, window, fraction, score, **params):
+    return {"model": model, "window": window, "fraction": fraction, "score": score, "params": params}
+
+
+RESULTS = [
+    _row("lgb", 50, 1.0, 0.9, n_estimators=100, num_leaves=15, learning_rate=0.05),
+    _row("lgb", 25, 1.0, 0.8, n_estimators=50, num_leaves=7, learning_rate=0.1),
+    _row("mlp", 50, 1.0, 0.7, hidden_layer_sizes=(128, 64), alpha=1e-3, max_iter=100),
+    _row("mlp", 50, 1 / 3, 1.2, hidden_layer_sizes=(64,), alpha=1e-4, max_iter=200),
+    _row("cat", 100, 1.0, 1.5, iterations=50, depth=4),
+    _row("cat", 100, 1 / 9, 2.0, iterations=200, depth=6),
+]
+
+
+def test_best_config_round_trip(tmp_path):
+    path = str(tmp_path / "models" / "best_config.json")
+    assert load_best_config("mega", path=path) is None
+    saved = save_best_config("mega", RESULTS, path=path)
+    save_best_config("power", RESULTS[:1], path=path)
+    conf = load_best_config("mega", path=path)
+    # cat scores best on the full fraction; the other kinds were not tuned at its window
+    assert conf["best"]["model"] == "cat" and conf["best"]["window"] == 100
+    assert conf == saved
+    assert tuned_params(conf, "cat") == {"iterations": 50, "depth": 4}
+    assert tuned_params(conf, "lgb") == {} and tuned_params(conf, "mlp") == {}
+    assert load_best_config("power", path=path)["best"]["model"] == "lgb"
+
+
+def test_tuned_params_at_shared_window(tmp_path):
+    path = str(tmp_path / "best_config.json")
+    save_best_config("mega", RESULTS[:4], path=path)
+    conf = load_best_config("mega", path=path)
+    assert conf["best"]["window"] == 50
+    assert tuned_params(conf, "lgb") == {"n_estimators": 100, "num_leaves": 15, "learning_rate": 0.05}
+    # the full-fraction MLP row wins over the higher score on a third of the draws; JSON lists back to tuples
+    mlp = tuned_params(conf, "mlp")
+    assert mlp == {"hidden_layer_sizes": (128, 64), "alpha": 1e-3, "max_iter": 100}
+    assert make_estimator("mlp", **mlp).get_params()["hidden_layer_sizes"] == (128, 64)
+    assert tuned_params(conf, "cat") == {} and tuned_params(None, "lgb") == {}
+
+
+def test_candidates_and_score():
+    cands = sample_candidates(10, kinds=["lgb", "mlp"], seed=0)
+    assert len(cands) == 10 and len({repr(c) for c in cands}) == 10
+    assert {c["model"] for c in cands} <= {"lgb", "mlp"}
+    assert hit_score(np.array([[1, 2, 3, 4, 5, 6], [7, 8, 9, 10, 11, 12]]),
+                     np.array([[1, 2, 3, 40, 41, 42], [7, 8, 9, 10, 11, 12]])) == 4.5
@@ -0,0 +1,32 @@
+from itertools import combinations
+import numpy as np
+from utils.wheeling import build_wheel, verify_wheel
+
+
+def _brute_force_missed(tickets, pool, t, m):
+    """Đếm trực tiếp các bộ m số của pool không có vé nào trùng >= t số."""
+    return sum(1 for s in combinations(pool, m) if not any(len(set(s) & set(tk)) >= t for tk in tickets))
+
+
+def test_verify_wheel_matches_brute_force():
+    pool = list(range(3, 15))
+    rng = np.random.default_rng(0)
+    for _ in range(5):
+        tickets = [sorted(rng.choice(pool, 6, replace=False).tolist()) for _ in range(rng.integers(1, 8))]
+        for t, m in ((2, 3), (3, 4), (3, 6)):
+            assert verify_wheel(tickets, pool, t=t, m=m) == _brute_force_missed(tickets, pool, t, m)
+
+
+def test_verify_wheel_full_pool_and_single_ticket():
+    pool = list(range(1, 10))
+    assert verify_wheel([pool[:6]], pool, t=3, m=6) == 0
+    # the only 4-subset without 3 numbers among 1..6 needs 2+ of 7..9
+    assert verify_wheel([pool[:6]], pool, t=3, m=4) == _brute_force_missed([pool[:6]], pool, 3, 4) > 0
+
+
+def test_build_wheel_guarantee_holds():
+    pool = [2, 5, 7, 11, 13, 17, 19, 23, 29, 31]
+    tickets, info = build_wheel(pool, t=3, m=4, restarts=2, workers=1, budget_s=0.5, seed=1)
+    assert verify_wheel(tickets, pool, t=3, m=4) == 0
+    assert info["tickets"] == len(tickets) <= info["greedy_tickets"]
+    assert all(len(tk) == 6 and set(tk) <= set(pool) for tk in tickets)
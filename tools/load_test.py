@@ -0,0 +1,89 @@
+# tools/load_test.py
+"""
+Load test for service.py: N concurrent clients hit a mix of endpoints for a
+fixed number of requests (or seconds) and the script reports requests/s and
+p50 / p95 / p99 latency per endpoint.
+
+    python tools/load_test.py --url http://127.0.0.1:8000 --concurrency 16 --requests 2000
+"""
+import time
+import random
+import argparse
+import threading
+import numpy as np
+import requests
+
+# (method, path, json body) - weighted towards the hot prediction path
+SCENARIOS = {
+    "predict": ("GET", "/predict/mega", None),
+    "predict_power": ("GET", "/predict/power", None),
+    "predict_batch": ("POST", "/predict", {"requests": [{"game": "mega"}, {"game": "power"}, {"game": "mega", "k": 10}]}),
+    "stats": ("GET", "/stats/mega?top=20", None),
+    "check": ("POST", "/check/mega", {"tickets": [[1, 7, 13, 22, 35, 41], [3, 12, 18, 22, 33, 41]]}),
+}
+WEIGHTS = {"predict": 5, "predict_power": 2, "predict_batch": 1, "stats": 1, "check": 1}
+
+
+def run(url, concurrency=8, n_requests=1000, duration=None, seed=0):
+    """Returns {scenario: [latency seconds, ...]}, error count and wall seconds."""
+    names = list(WEIGHTS)
+    p = np.array([WEIGHTS[n] for n in names], dtype=float)
+    lock = threading.Lock()
+    lat = {n: [] for n in names}
+    state = {"sent": 0, "errors": 0}
+    deadline = time.monotonic() + duration if duration else None
+
+    def _client(i):
+        rng = random.Random(seed + i)
+        session = requests.Session()
+        while True:
+            with lock:
+                if (deadline is None and state["sent"] >= n_requests) or (deadline and time.monotonic() >= deadline):
+                    return
+                state["sent"] += 1
+            name = rng.choices(names, weights=p)[0]
+            method, path, body = SCENARIOS[name]
+            t0 = time.perf_counter()
+            try:
+                r = session.request(method, url + path, json=body, timeout=30)
+                ok = r.status_code == 200
+            except requests.RequestException:
+                ok = False
+            dt = time.perf_counter() - t0
+            with lock:
+                if ok:
+                    lat[name].append(dt)
+                else:
+                    state["errors"] += 1
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=_client, args=(i,)) for i in range(concurrency)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    return lat, state["errors"], time.perf_counter() - t0
+
+
+def report(lat, errors, wall):
+    total = sum(len(v) for v in lat.values())
+    print(f"{total} ok, {errors} errors in {wall:.2f}s -> {total / wall:.1f} req/s")
+    print(f"{'endpoint':<15}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    rows = list(lat.items()) + [("all", [x for v in lat.values() for x in v])]
+    for name, v in rows:
+        if not v:
+            continue
+        q = np.percentile(np.asarray(v) * 1000, [50, 95, 99])
+        print(f"{name:<15}{len(v):>7}{q[0]:>10.2f}{q[1]:>10.2f}{q[2]:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the prediction service")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=None, help="run for N seconds instead of --requests")
+    args = parser.parse_args()
+
+    requests.get(args.url + "/health", timeout=30).raise_for_status()
+    report(*run(args.url, args.concurrency, args.requests, args.duration))
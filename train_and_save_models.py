@@ -1,10 +1,23 @@
 # train_and_save_models.py
 import os
+import json
+import argparse
 import numpy as np
 import pandas as pd
 from pathlib import Path
 from utils.fetch_data import fetch_all_sources
-from utils.predict_advanced import build_count_features, train_lightgbm, train_catboost, train_mlp, save_model
+from utils.feature_store import model_features, save_feature_spec, data_fingerprint
+from utils.predict_advanced import (
+    HAS_LGB, train_early_stopping, train_multihot, save_model, learn_ensemble_weights, save_ensemble_weights,
+)
+from utils.early_stopping import TIME_BUDGET_S
+from utils.train_scheduler import run_training_jobs
+from utils.tuning import load_best_config, tuned_params
+from utils.tree_compiler import compile_and_save
+from utils.model_registry import register_model, prune
+from utils.simulation import null_distribution, baseline_columns, majority_null
+from utils.tf_export import load_numpy_model, matches_features
+from utils.online import replay_scores, ONLINE_KINDS
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
 
@@ -14,68 +27,253 @@ MODEL_DIR.mkdir(parents=True, exist_ok=True)
 METRICS_DIR.mkdir(parents=True, exist_ok=True)
 
 def evaluate_model(m, X_test, Y_test):
-    preds = m.predict(X_test)
+    # CatBoost members return (n, 1) columns, so MultiOutputClassifier can add an axis
+    preds = np.asarray(m.predict(X_test)).reshape(len(X_test), -1)
     res = {}
     for i in range(6):
         res[f"acc_pos{i+1}"] = float(accuracy_score(Y_test[:,i], preds[:,i]))
     res["exact_match"] = float((preds == Y_test).all(axis=1).mean())
     return res
 
-def train_and_eval(name, urls, max_num, use_lgb=True, use_cat=True, use_mlp=True):
-    print(f"=== Train for {name} ===")
+DEFAULT_PARAMS = {
+    "lgb": {"n_estimators": 100},
+    "cat": {"iterations": 100},
+    "mlp": {"hidden_layer_sizes": (128,64), "max_iter": 200},
+    "multihot": {"n_estimators": 100},
+}
+
+def model_params(name):
+    """Hyperparameters per model kind: defaults overridden by models/best_config.json if present."""
+    params = {k: dict(v) for k, v in DEFAULT_PARAMS.items()}
+    best = load_best_config(name)
+    if best:
+        # only params tuned at the window the features are built with
+        for kind in best["per_model"]:
+            params.setdefault(kind, {}).update(tuned_params(best, kind))
+    return params
+
+MODEL_NAMES = {"lgb": "LightGBM", "cat": "CatBoost", "mlp": "MLP"}
+
+FEATURE_SPECS = {
+    "counts": {"window": 50},
+    # multi-scale pyramid: 5/10/25/50/100/all-time counts + decayed counts
+    "pyramid": {},
+    # window counts + calendar / lunar row of the predicted draw (utils.calendar_table)
+    "calendar": {"window": 50},
+}
+
+def prepare_dataset(name, urls, max_num, feature_set="counts"):
+    """Fetch draws and build the train/test split; returns None if there is not enough data."""
     df = fetch_all_sources(urls, limit=400)
     if df is None or len(df) < 60:
         print("Not enough data for", name)
-        return
+        return None
 
-    X, Y = build_count_features(df, window=50, max_num=max_num)
+    params = dict(FEATURE_SPECS[feature_set])
+    best = load_best_config(name)
+    if best and feature_set == "counts":
+        # window chosen by tune_models.py
+        params["window"] = best["best"]["window"]
+    spec = {"feature_set": feature_set, "params": {**params, "max_num": max_num}, "data": data_fingerprint(df)}
+    X, Y = model_features(spec, df)
     if X is None:
         print("No features for", name)
-        return
+        return None
 
-    X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=0.2, random_state=42)
-    metrics_rows = []
+    # time-ordered split: test = most recent draws, early stopping validates on the tail of train
+    X_train, X_test, Y_train, Y_test = train_test_split(X, Y, test_size=0.2, shuffle=False)
+    return spec, X_train, X_test, Y_train, Y_test
 
-    if use_lgb:
+def save_results(name, spec, metrics_rows, Y_train=None, Y_test=None, null_workers=1):
+    # ensemble prediction in main.py rebuilds features from this spec
+    save_feature_spec(str(MODEL_DIR / f"{name}_feature_spec.json"), spec["feature_set"], **spec["params"])
+
+    if metrics_rows and Y_test is not None and len(Y_test):
+        # baseline per metric, effect size, p-value: acc_pos* vs the per-position majority of
+        # Y_train, exact_match vs a random ticket; in-process so it never competes with training
         try:
-            print("Training LightGBM...")
-            m_lgb = train_lightgbm(X_train, Y_train, n_estimators=100)
-            save_model(m_lgb, str(MODEL_DIR / f"{name}_lgb.joblib"))
-            metrics_rows.append({"model":"lgb", **evaluate_model(m_lgb, X_test, Y_test)})
-            print("LightGBM saved.")
+            null = null_distribution(spec["params"]["max_num"], workers=null_workers)
+            if Y_train is not None and len(Y_train):
+                null = majority_null(null, Y_train, spec["params"]["max_num"])
+            metrics_rows = [baseline_columns(row, len(Y_test), null) for row in metrics_rows]
         except Exception as e:
-            print("LightGBM failed:", e)
+            print("⚠ Baseline failed:", e)
+    if metrics_rows:
+        pd.DataFrame(metrics_rows).to_csv(METRICS_DIR / f"{name}_metrics.csv", index=False)
+        print("Metrics saved at", METRICS_DIR / f"{name}_metrics.csv")
+    else:
+        print("No metrics produced.")
+
+def save_compiled_model(m, name, kind):
+    """Flat-array copy of tree models (LGB/Cat) for fast batch inference; failures are non-fatal."""
+    try:
+        if compile_and_save(m, str(MODEL_DIR / f"{name}_{kind}.joblib")):
+            print(f"{kind} compiled for {name}.")
+    except Exception as e:
+        print(f"⚠ Compile {kind} for {name} failed:", e)
+
+def register_version(m, name, kind, spec, row=None):
+    """New registry version (becomes current); keeps the last few versions."""
+    try:
+        metrics = {k: v for k, v in (row or {}).items() if k != "model"}
+        version = register_model(m, name, kind, fingerprint=spec.get("data"),
+                                 feature_spec={"feature_set": spec["feature_set"], "params": spec["params"]},
+                                 metrics=metrics)
+        prune(name, kind)
+        print(f"{kind} registered for {name} as {version}.")
+    except Exception as e:
+        print(f"⚠ Register {kind} for {name} failed:", e)
+
+def train_multihot_model(name, max_num, X_train, X_test, Y_train, Y_test, params=None, spec=None,
+                         budget_s=TIME_BUDGET_S):
+    """Single multi-hot LightGBM (falls back to sklearn HGB); returns (metrics row, model) or (None, None)."""
+    try:
+        print("Training multi-hot model...")
+        kind = "lgb" if HAS_LGB else "hgb"
+        m = train_multihot(X_train, Y_train, max_num=max_num, kind=kind, budget_s=budget_s,
+                           **(params or DEFAULT_PARAMS["multihot"]))
+        save_model(m, str(MODEL_DIR / f"{name}_multihot.joblib"))
+        print(f"Multi-hot model saved ({m.n_iter_:.0f}/{m.max_iter_} iterations).")
+        row = {"model": f"multihot_{kind}", **evaluate_model(m, X_test, Y_test),
+               "n_iter": m.n_iter_, "max_iter": m.max_iter_}
+        if spec is not None:
+            register_version(m, name, "multihot", spec, row)
+        return row, m
+    except Exception as e:
+        print("Multi-hot model failed:", e)
+        return None, None
+
+def save_soft_vote_weights(name, trained, X_test, Y_test, max_num, Y_train=None, spec=None):
+    """Soft-vote weights learned on the held-out (most recent) rows -> models/{name}_ensemble_weights.json.
 
-    if use_cat:
+    Covers every member main.py votes with: the trained kinds, the NumPy export of
+    the Keras model when it was trained on the same features, and the online
+    scorers replayed over the draws (Y_train then Y_test).
+    """
+    members = dict(trained)
+    tf_path = MODEL_DIR / f"{name}_tf_model.npz"
+    if spec is not None and tf_path.exists():
         try:
-            print("Training CatBoost...")
-            m_cat = train_catboost(X_train, Y_train, iterations=100, verbose=False)
-            save_model(m_cat, str(MODEL_DIR / f"{name}_cat.joblib"))
-            metrics_rows.append({"model":"cat", **evaluate_model(m_cat, X_test, Y_test)})
-            print("CatBoost saved.")
+            tf = load_numpy_model(str(tf_path))
+            # same JSON form as the spec saved next to the export
+            feat_spec = json.loads(json.dumps({"feature_set": spec["feature_set"], "params": spec["params"]}))
+            if matches_features(tf, feat_spec, np.shape(X_test)[-1]):
+                members["tf"] = tf
         except Exception as e:
-            print("CatBoost failed:", e)
+            print("⚠ TF export not used for ensemble weights:", e)
+    if Y_train is not None and len(Y_test):
+        replayed = replay_scores(np.vstack([Y_train, Y_test]), len(Y_train), max_num)
+        members.update(zip(ONLINE_KINDS, replayed))
+    if len(members) < 2:
+        return
+    try:
+        kinds = list(members)
+        weights = learn_ensemble_weights([members[k] for k in kinds], X_test, Y_test, max_num=max_num)
+        save_ensemble_weights(str(MODEL_DIR / f"{name}_ensemble_weights.json"), kinds, weights)
+        print("Ensemble weights:", {k: round(w, 3) for k, w in zip(kinds, weights)})
+    except Exception as e:
+        print("⚠ Ensemble weights failed:", e)
 
-    if use_mlp:
+def train_and_eval(name, urls, max_num, use_lgb=True, use_cat=True, use_mlp=True, feature_set="counts", use_multihot=False,
+                   budget_s=TIME_BUDGET_S):
+    print(f"=== Train for {name} ===")
+    data = prepare_dataset(name, urls, max_num, feature_set=feature_set)
+    if data is None:
+        return
+    spec, X_train, X_test, Y_train, Y_test = data
+    params = model_params(name)
+    metrics_rows, trained = [], {}
+
+    kinds = [k for k, on in (("lgb", use_lgb), ("cat", use_cat), ("mlp", use_mlp)) if on]
+    for kind in kinds:
         try:
-            print("Training MLP...")
-            m_mlp = train_mlp(X_train, Y_train, hidden_layer_sizes=(128,64), max_iter=200)
-            save_model(m_mlp, str(MODEL_DIR / f"{name}_mlp.joblib"))
-            metrics_rows.append({"model":"mlp", **evaluate_model(m_mlp, X_test, Y_test)})
-            print("MLP saved.")
+            print(f"Training {MODEL_NAMES[kind]}...")
+            m, n_iter, max_iter = train_early_stopping(kind, X_train, Y_train, budget_s=budget_s, **params[kind])
+            save_model(m, str(MODEL_DIR / f"{name}_{kind}.joblib"))
+            save_compiled_model(m, name, kind)
+            metrics_rows.append({"model": kind, **evaluate_model(m, X_test, Y_test),
+                                 "n_iter": round(n_iter, 1), "max_iter": max_iter})
+            register_version(m, name, kind, spec, metrics_rows[-1])
+            trained[kind] = m
+            print(f"{MODEL_NAMES[kind]} saved ({n_iter:.0f}/{max_iter} iterations).")
         except Exception as e:
-            print("MLP failed:", e)
+            print(f"{MODEL_NAMES[kind]} failed:", e)
 
-    # save last feature for quick ensemble prediction
-    np.save(MODEL_DIR / f"{name}_last_feat.npy", X[-1])
+    if use_multihot:
+        row, m = train_multihot_model(name, max_num, X_train, X_test, Y_train, Y_test, params["multihot"], spec=spec,
+                                      budget_s=budget_s)
+        if row:
+            metrics_rows.append(row)
+            trained["multihot"] = m
 
-    if metrics_rows:
-        pd.DataFrame(metrics_rows).to_csv(METRICS_DIR / f"{name}_metrics.csv", index=False)
-        print("Metrics saved at", METRICS_DIR / f"{name}_metrics.csv")
-    else:
-        print("No metrics produced.")
+    save_soft_vote_weights(name, trained, X_test, Y_test, max_num, Y_train, spec)
+    save_results(name, spec, metrics_rows, Y_train, Y_test)
+
+def train_all_parallel(games, kinds=("lgb", "cat", "mlp"), feature_set="counts", threads=None, threads_per_job=1,
+                       use_multihot=False, budget_s=TIME_BUDGET_S):
+    """Train every (game x model x output) job on one process pool under a shared thread budget.
+
+    games: list of (name, urls, max_num)
+    """
+    datasets, splits = {}, {}
+    for name, urls, max_num in games:
+        print(f"=== Prepare data for {name} ===")
+        data = prepare_dataset(name, urls, max_num, feature_set=feature_set)
+        if data is None:
+            continue
+        splits[name] = data
+        datasets[name] = (data[1], data[3])
+    if not datasets:
+        return
+
+    params = {(name, kind): model_params(name)[kind] for name in datasets for kind in kinds}
+    models, timings = run_training_jobs(datasets, list(kinds), model_params=params,
+                                        threads_total=threads, threads_per_job=threads_per_job,
+                                        early_stopping={"budget_s": budget_s})
+
+    for name, (spec, X_train, X_test, Y_train, Y_test) in splits.items():
+        metrics_rows, trained = [], {}
+        for kind in kinds:
+            m = models.get((name, kind))
+            if m is None:
+                print(f"{kind} failed for {name}")
+                continue
+            save_model(m, str(MODEL_DIR / f"{name}_{kind}.joblib"))
+            save_compiled_model(m, name, kind)
+            jobs = [t for t in timings if t["game"] == name and t["model"] == kind]
+            metrics_rows.append({"model": kind, **evaluate_model(m, X_test, Y_test),
+                                 "n_iter": round(float(np.mean([t["n_iter"] for t in jobs])), 1),
+                                 "max_iter": jobs[0]["max_iter"],
+                                 "train_seconds": round(sum(t["seconds"] for t in jobs), 3)})
+            register_version(m, name, kind, spec, metrics_rows[-1])
+            trained[kind] = m
+        if use_multihot:
+            row, m = train_multihot_model(name, spec["params"]["max_num"], X_train, X_test, Y_train, Y_test,
+                                          model_params(name)["multihot"], spec=spec, budget_s=budget_s)
+            if row:
+                metrics_rows.append(row)
+                trained["multihot"] = m
+        save_soft_vote_weights(name, trained, X_test, Y_test, spec["params"]["max_num"], Y_train, spec)
+        save_results(name, spec, metrics_rows, Y_train, Y_test)
+
+    if timings:
+        pd.DataFrame(timings).to_csv(METRICS_DIR / "train_jobs.csv", index=False)
+        print("Job timings saved at", METRICS_DIR / "train_jobs.csv")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train LGB/Cat/MLP models for Mega and Power")
+    parser.add_argument("--features", choices=sorted(FEATURE_SPECS), default="counts",
+                        help="feature set: single 50-draw window or multi-scale pyramid")
+    parser.add_argument("--parallel", action="store_true",
+                        help="train all (game x model x output) jobs on a process pool")
+    parser.add_argument("--multihot", action="store_true",
+                        help="also train one multi-hot per-number model instead of 6 x 55-class positions")
+    parser.add_argument("--threads", type=int, default=None, help="global CPU thread budget (default: all cores)")
+    parser.add_argument("--threads-per-job", type=int, default=1)
+    parser.add_argument("--budget", type=float, default=TIME_BUDGET_S,
+                        help="wall-clock seconds per model; early stopping keeps the best iteration")
+    args = parser.parse_args()
+
     mega_urls = [
         "https://www.ketquadientoan.com/tat-ca-ky-xo-so-mega-6-45.html",
         "https://www.minhngoc.net.vn/ket-qua-xo-so/dien-toan-vietlott/mega-6x45.html",
@@ -86,5 +284,10 @@ if __name__ == "__main__":
         "https://www.minhngoc.net.vn/ket-qua-xo-so/dien-toan-vietlott/power-6x55.html",
         "https://www.lotto-8.com/Vietnam/listltoVM55.asp",
     ]
-    train_and_eval("mega", mega_urls, max_num=45, use_lgb=True, use_cat=True, use_mlp=True)
-    train_and_eval("power", power_urls, max_num=55, use_lgb=True, use_cat=True, use_mlp=True)
+    if args.parallel:
+        train_all_parallel([("mega", mega_urls, 45), ("power", power_urls, 55)], feature_set=args.features,
+                           threads=args.threads, threads_per_job=args.threads_per_job, use_multihot=args.multihot,
+                           budget_s=args.budget)
+    else:
+        train_and_eval("mega", mega_urls, max_num=45, use_lgb=True, use_cat=True, use_mlp=True, feature_set=args.features, use_multihot=args.multihot, budget_s=args.budget)
+        train_and_eval("power", power_urls, max_num=55, use_lgb=True, use_cat=True, use_mlp=True, feature_set=args.features, use_multihot=args.multihot, budget_s=args.budget)
@@ -1,37 +1,67 @@
 # train_tf_model.py
 import os
+import argparse
 import numpy as np
 import pandas as pd
 from pathlib import Path
 from utils.fetch_data import fetch_all_sources
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense, Dropout
-from tensorflow.keras.optimizers import Adam
-from sklearn.model_selection import train_test_split
+from utils.feature_engine import build_window_features, multi_hot
+from utils.feature_store import model_features
+from utils.early_stopping import keras_callbacks, TIME_BUDGET_S
+from utils.tf_export import export_keras
+from utils.simulation import null_distribution, baseline_columns
+# TensorFlow is imported lazily (configure_tf / build_tf_model / make_dataset) so that
+# importing this module, e.g. from utils.backtest, does not pay the TF startup cost.
 
 MODEL_DIR = Path("models")
 METRICS_DIR = Path("metrics")
 MODEL_DIR.mkdir(parents=True, exist_ok=True)
 METRICS_DIR.mkdir(parents=True, exist_ok=True)
+BACKUP_DIR = MODEL_DIR / "tf_backup"
 
 def build_features(df, window=50, max_num=45):
-    df = df.sort_values("draw_date").reset_index(drop=True)
-    if len(df) <= window:
+    X, Y = build_window_features(df, window=window, max_num=max_num)
+    if X is None:
         return None, None
-    X, Y = [], []
-    for i in range(window, len(df)):
-        prev = df.iloc[i-window:i]
-        counts = np.zeros(max_num)
-        for c in range(1,7):
-            for v in prev[f"n{c}"].dropna().astype(int).tolist():
-                counts[v-1] += 1
-        X.append(counts)
-        Y.append(df.loc[i, [f"n{j}" for j in range(1,7)]].astype(int).values)
-    return np.array(X), np.array(Y)
+    return X.astype(np.float64), Y
+
+def configure_tf(intra_threads=None, inter_threads=None, cpu_only=False):
+    """Thread pools / device visibility; must run before TF executes any op."""
+    import tensorflow as tf
+    if cpu_only:
+        tf.config.set_visible_devices([], "GPU")
+    if intra_threads:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_threads)
+    if inter_threads:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_threads)
+    return tf
+
+def make_dataset(X, Y_multi, batch_size=32, shuffle=True, seed=42):
+    """Batches gathered from (possibly memory-mapped) arrays through a prefetching tf.data pipeline.
+
+    Only row indices go through the pipeline; each batch is read from X / Y_multi
+    in a `numpy_function`, so the feature store arrays are never copied whole.
+    """
+    import tensorflow as tf
+    n_feat, n_out = X.shape[1], Y_multi.shape[1]
+
+    def _gather(idx):
+        idx = np.sort(idx)
+        return np.asarray(X[idx], dtype=np.float32), np.asarray(Y_multi[idx], dtype=np.float32)
+
+    ds = tf.data.Dataset.range(len(X))
+    if shuffle:
+        ds = ds.shuffle(len(X), seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size)
+    ds = ds.map(lambda i: tf.numpy_function(_gather, [i], (tf.float32, tf.float32)),
+                num_parallel_calls=tf.data.AUTOTUNE)
+    ds = ds.map(lambda x, y: (tf.ensure_shape(x, [None, n_feat]), tf.ensure_shape(y, [None, n_out])))
+    return ds.prefetch(tf.data.AUTOTUNE)
 
 def build_tf_model(input_dim, output_dim=45):
     from tensorflow.keras import Sequential
     from tensorflow.keras.layers import Dense, Dropout
+    from tensorflow.keras.optimizers import Adam
     model = Sequential([
         Dense(256, activation="relu", input_shape=(input_dim,)),
         Dropout(0.2),
@@ -43,41 +73,69 @@ def build_tf_model(input_dim, output_dim=45):
     return model
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the Keras multi-hot model for Mega")
+    parser.add_argument("--features", choices=["counts", "pyramid"], default="counts",
+                        help="feature set: single 50-draw window or multi-scale pyramid")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--patience", type=int, default=10)
+    parser.add_argument("--budget", type=float, default=TIME_BUDGET_S, help="wall-clock seconds for training")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--in-memory", action="store_true", help="pass NumPy arrays instead of the tf.data pipeline")
+    parser.add_argument("--cpu", action="store_true", help="hide GPUs (CPU-only runners)")
+    parser.add_argument("--intra-threads", type=int, default=None, help="TF intra-op threads (default: TF decides)")
+    parser.add_argument("--inter-threads", type=int, default=None, help="TF inter-op threads")
+    parser.add_argument("--backup-dir", default=str(BACKUP_DIR), help="BackupAndRestore dir for resuming")
+    args = parser.parse_args()
+
     urls = [
         "https://www.ketquadientoan.com/tat-ca-ky-xo-so-mega-6-45.html",
         "https://www.minhngoc.net.vn/ket-qua-xo-so/dien-toan-vietlott/mega-6x45.html",
         "https://www.lotto-8.com/Vietnam/listltoVM45.asp",
     ]
     df = fetch_all_sources(urls, limit=400)
-    X, Y = build_features(df, window=50, max_num=45)
+    params = {"window": 50} if args.features == "counts" else {}
+    X, Y = model_features({"feature_set": args.features, "params": {**params, "max_num": 45}}, df)
     if X is None:
         print("Not enough data")
         exit(1)
 
-    # multi-hot target
-    Y_multi = np.zeros((Y.shape[0], 45), dtype=int)
-    for i in range(Y.shape[0]):
-        for v in Y[i]:
-            Y_multi[i, int(v)-1] = 1
+    if args.cpu or args.intra_threads or args.inter_threads:
+        configure_tf(args.intra_threads, args.inter_threads, cpu_only=args.cpu)
+    from tensorflow.keras.callbacks import BackupAndRestore
 
-    X_train, X_val, Y_train, Y_val = train_test_split(X, Y_multi, test_size=0.2, random_state=42)
+    # multi-hot target (vectorized)
+    Y_multi = multi_hot(Y, 45, dtype=np.float32)
+
+    # time-ordered split: validate on the most recent draws; slicing keeps memmaps lazy
+    n_val = int(np.ceil(len(X) * 0.2))
+    X_train, X_val, Y_train, Y_val = X[:-n_val], X[-n_val:], Y_multi[:-n_val], Y_multi[-n_val:]
 
     model = build_tf_model(X.shape[1], output_dim=45)
-    model.fit(X_train, Y_train, epochs=50, batch_size=32, validation_data=(X_val, Y_val))
+    callbacks = keras_callbacks(patience=args.patience, budget_s=args.budget)
+    # resumes from the last finished epoch if a previous run was interrupted
+    callbacks.insert(0, BackupAndRestore(backup_dir=str(args.backup_dir)))
+    if args.in_memory:
+        model.fit(np.asarray(X_train, dtype=np.float32), Y_train, epochs=args.epochs, batch_size=args.batch_size,
+                  validation_data=(np.asarray(X_val, dtype=np.float32), Y_val), callbacks=callbacks)
+    else:
+        model.fit(make_dataset(X_train, Y_train, batch_size=args.batch_size), epochs=args.epochs,
+                  validation_data=make_dataset(X_val, Y_val, batch_size=args.batch_size, shuffle=False),
+                  callbacks=callbacks)
+    # best epoch restored by the time-budget callback
+    n_iter = getattr(callbacks[-1], "best_epoch", callbacks[-1].epochs)
 
     # predict top-6
-    preds = model.predict(X_val)
-    top_preds = []
-    for row in preds:
-        idxs = np.argsort(row)[::-1][:6] + 1
-        top_preds.append(sorted(idxs.tolist()))
-
-    truth = []
-    for row in Y_val:
-        idxs = np.where(row==1)[0] + 1
-        truth.append(sorted(idxs.tolist()))
+    preds = model.predict(np.asarray(X_val, dtype=np.float32), batch_size=256)
+    top = np.argpartition(-preds, 5, axis=1)[:, :6]
+    top_preds = [set(row.tolist()) for row in top]
+    truth = [set(np.nonzero(row)[0].tolist()) for row in Y_val]
 
     exact = float(np.mean([set(a)==set(b) for a,b in zip(top_preds, truth)]))
-    pd.DataFrame([{"exact_match": exact}]).to_csv(METRICS_DIR / "tf_mega_metrics.csv", index=False)
+    row = baseline_columns({"exact_match": exact, "n_iter": n_iter, "max_iter": args.epochs}, len(Y_val),
+                           null_distribution(45, workers=1))
+    pd.DataFrame([row]).to_csv(METRICS_DIR / "tf_mega_metrics.csv", index=False)
     model.save(MODEL_DIR / "mega_tf_model.h5")
-    print("TF model saved and metrics written.")
+    # TF-free inference copy used by main.py's ensemble
+    spec = {"feature_set": args.features, "params": {**params, "max_num": 45}}
+    export_keras(model, MODEL_DIR / "mega_tf_model.npz", feature_spec=spec)
+    print("TF model saved (+ NumPy export) and metrics written.")
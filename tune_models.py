@@ -0,0 +1,49 @@
+# tune_models.py
+import argparse
+import pandas as pd
+from pathlib import Path
+from utils.fetch_data import fetch_all_sources
+from utils.tuning import successive_halving, save_best_config, SEARCH_SPACE, BEST_CONFIG_PATH
+
+METRICS_DIR = Path("metrics")
+METRICS_DIR.mkdir(parents=True, exist_ok=True)
+
+MEGA_URLS = [
+    "https://www.ketquadientoan.com/tat-ca-ky-xo-so-mega-6-45.html",
+    "https://www.minhngoc.net.vn/ket-qua-xo-so/dien-toan-vietlott/mega-6x45.html",
+    "https://www.lotto-8.com/Vietnam/listltoVM45.asp",
+]
+POWER_URLS = [
+    "https://www.ketquadientoan.com/tat-ca-ky-xo-so-power-655.html",
+    "https://www.minhngoc.net.vn/ket-qua-xo-so/dien-toan-vietlott/power-6x55.html",
+    "https://www.lotto-8.com/Vietnam/listltoVM55.asp",
+]
+
+def tune_game(name, urls, max_num, args):
+    print(f"=== Tune {name} ===")
+    df = fetch_all_sources(urls, limit=400)
+    if df is None or len(df) < 60:
+        print("Not enough data for", name)
+        return
+    results = successive_halving(df, max_num, n_candidates=args.candidates, eta=args.eta,
+                                 budget_s=args.budget / 2, workers=args.workers, kinds=args.models)
+    if not results:
+        print("No tuning results for", name)
+        return
+    pd.DataFrame(results).to_csv(METRICS_DIR / f"{name}_tuning.csv", index=False)
+    conf = save_best_config(name, results)
+    print(f"Best {name}: {conf['best']['model']} window={conf['best']['window']} "
+          f"params={conf['best']['params']} score={conf['best']['score']:.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Successive-halving search over model x window x hyperparameters")
+    parser.add_argument("--budget", type=float, default=1200, help="total wall-clock budget in seconds (both games)")
+    parser.add_argument("--candidates", type=int, default=27)
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--models", nargs="+", choices=sorted(SEARCH_SPACE), default=None)
+    args = parser.parse_args()
+
+    tune_game("mega", MEGA_URLS, 45, args)
+    tune_game("power", POWER_URLS, 55, args)
+    print("Best configuration written to", BEST_CONFIG_PATH)
@@ -0,0 +1,218 @@
+# utils/backtest.py
+"""
+Walk-forward backtesting.
+
+For every historical draw t (from `start` on) each predictor is trained or
+updated on draws before t only and its ticket for draw t is recorded, so there
+is no look-ahead leakage like the shuffled `train_test_split` evaluation has.
+
+Predictors:
+  heuristic  top-6 all-time frequency before t (utils.heuristic)
+  rf         on-the-fly MultiOutput RandomForest (utils.predict)
+  ensemble   LightGBM / CatBoost / MLP soft vote (utils.predict_advanced.ensemble_scores)
+  multihot   single multi-hot model (utils.predict_advanced.MultiHotModel)
+  pernum     per-number RF (+ XGBoost if installed) on build_pernum_features
+  tf         Keras multi-hot network (train_tf_model), if TensorFlow is installed
+
+Features are computed once for the whole history (prefix sums); step t only
+slices rows. The test range is cut into contiguous folds that run in parallel;
+inside a fold models are refitted every `refit_every` steps.
+"""
+import os
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from utils.logger import log
+from utils.feature_engine import draw_matrix, prefix_counts, window_counts, build_pernum_features
+from utils.incremental import sort_by_date
+
+PREDICTORS = ["heuristic", "rf", "ensemble", "multihot", "pernum", "tf"]
+
+# smaller than production defaults so thousands of steps finish in minutes
+BACKTEST_PARAMS = {
+    "rf": {"n_estimators": 100},
+    "lgb": {"n_estimators": 50},
+    "cat": {"iterations": 50},
+    "mlp": {"hidden_layer_sizes": (128, 64), "max_iter": 200},
+    "multihot": {"n_estimators": 100},
+    "pernum": {"n_estimators": 100},
+    "tf": {"epochs": 10},
+}
+
+
+def topk_numbers(scores, k=6):
+    """Sorted 1-based numbers of the `k` largest scores."""
+    idx = np.argpartition(-np.asarray(scores), k - 1)[:k]
+    return sorted(int(i) + 1 for i in idx)
+
+
+def _fit(name, X_tr, Y_tr, max_num, pern_tr=None, n_jobs=1):
+    from utils.predict_advanced import make_estimator, MultiHotModel, HAS_LGB, HAS_CAT
+    from sklearn.multioutput import MultiOutputClassifier
+    p = BACKTEST_PARAMS
+    if name == "rf":
+        from utils.predict import train_multioutput_rf
+        return train_multioutput_rf(X_tr, Y_tr, n_jobs=n_jobs, **p["rf"])
+    if name == "ensemble":
+        kinds = [k for k, ok in (("lgb", HAS_LGB), ("cat", HAS_CAT), ("mlp", True)) if ok]
+        return [MultiOutputClassifier(make_estimator(k, threads=1, **p[k])).fit(X_tr, Y_tr) for k in kinds]
+    if name == "multihot":
+        return MultiHotModel(kind="lgb" if HAS_LGB else "hgb", max_num=max_num, threads=1, **p["multihot"]).fit(X_tr, Y_tr)
+    if name == "pernum":
+        from sklearn.ensemble import RandomForestClassifier
+        Xp, yp = pern_tr
+        models = [RandomForestClassifier(n_estimators=p["pernum"]["n_estimators"], max_depth=10,
+                                         random_state=42, n_jobs=1).fit(Xp, yp)]
+        try:
+            from xgboost import XGBClassifier
+            models.append(XGBClassifier(n_estimators=p["pernum"]["n_estimators"], eval_metric="logloss",
+                                        verbosity=0, random_state=42, n_jobs=1).fit(Xp, yp))
+        except ImportError:
+            pass
+        return models
+    if name == "tf":
+        from train_tf_model import build_tf_model
+        from utils.feature_engine import multi_hot
+        model = build_tf_model(X_tr.shape[1], output_dim=max_num)
+        model.fit(np.asarray(X_tr, dtype=np.float32), multi_hot(Y_tr, max_num, dtype=np.float32),
+                  epochs=p["tf"]["epochs"], batch_size=32, verbose=0)
+        return model
+    raise ValueError(f"Unknown predictor: {name}")
+
+
+def _predict(name, model, x, max_num, pern_x=None):
+    if name == "rf":
+        from utils.predict import predict_next
+        return predict_next(model, np.asarray(x))
+    if name == "ensemble":
+        from utils.predict_advanced import soft_vote_predict
+        return soft_vote_predict(model, np.asarray(x), max_num=max_num)
+    if name == "multihot":
+        return model.predict(np.asarray(x).reshape(1, -1))[0].tolist()
+    if name == "pernum":
+        scores = np.mean([m.predict_proba(pern_x)[:, 1] for m in model], axis=0)
+        return topk_numbers(scores)
+    if name == "tf":
+        return topk_numbers(model.predict(np.asarray(x, dtype=np.float32).reshape(1, -1), verbose=0)[0])
+    raise ValueError(f"Unknown predictor: {name}")
+
+
+def _predict_batch(models, X_rows, max_num):
+    """Soft-vote tickets for many feature rows of the same fitted ensemble."""
+    from utils.predict_advanced import ensemble_scores, topk_from_scores
+    return topk_from_scores(ensemble_scores(models, X_rows, max_num=max_num)).tolist()
+
+
+def _heuristic(prefix_row, max_num):
+    from utils.heuristic import heuristic_predict
+    counts = np.asarray(prefix_row)
+    order = np.argsort(-counts, kind="stable")
+    order = order[counts[order] > 0]
+    freq = pd.DataFrame({"number": order + 1, "frequency": counts[order]})
+    return heuristic_predict(freq, k=6, max_num=max_num)
+
+
+def _run_fold(task):
+    """Walk forward over steps [lo, hi) for each predictor; returns a list of records."""
+    from utils.train_scheduler import limit_threads
+    limit_threads(1)
+    (draws, X, Y, pern, window, max_num, predictors, lo, hi, refit_every, n_jobs) = task
+    prefix = prefix_counts(draws, max_num)
+    records = []
+    for name in predictors:
+        model, fitted_at, batch = None, None, {}
+        t0 = time.perf_counter()
+        for t in range(lo, hi):
+            truth = set(int(v) for v in draws[t] if not np.isnan(v))
+            try:
+                if name == "heuristic":
+                    ticket = _heuristic(prefix[t], max_num)
+                else:
+                    row = t - window                   # feature row predicting draw t
+                    if row < 1:
+                        continue
+                    if model is None or t - fitted_at >= refit_every:
+                        pern_tr = None
+                        if name == "pernum":
+                            if pern is None or (row + 1) * max_num > len(pern[0]):
+                                continue
+                            pern_tr = (pern[0][:row * max_num], pern[1][:row * max_num])
+                        model, fitted_at = _fit(name, X[:row], Y[:row], max_num, pern_tr, n_jobs), t
+                        if name == "ensemble":
+                            # score every row until the next refit in one batched call
+                            stop = min(t + refit_every, hi) - window
+                            batch = dict(zip(range(row, stop), _predict_batch(model, X[row:stop], max_num)))
+                    pern_x = pern[0][row * max_num:(row + 1) * max_num] if name == "pernum" else None
+                    ticket = batch[row] if row in batch else _predict(name, model, X[row], max_num, pern_x)
+            except ImportError as e:
+                log(f"⚠ Backtest predictor {name} unavailable: {e}")
+                break
+            except Exception as e:
+                # one failing predictor must not take the other predictors / folds down
+                log(f"⚠ Backtest predictor {name} failed at step {t} of fold [{lo}, {hi}): {e!r}; skipping the fold")
+                break
+            records.append({"predictor": name, "step": t, "ticket": list(map(int, ticket)),
+                            "hits": len(truth & set(int(v) for v in ticket))})
+        log(f"    -> fold [{lo}, {hi}) {name}: {time.perf_counter() - t0:.1f}s")
+    return records
+
+
+def walk_forward(df, max_num, window=50, predictors=None, start=None, refit_every=50, workers=None,
+                 other_df=None, folds=None):
+    """Run the walk-forward backtest; returns a DataFrame of one record per (predictor, step).
+
+    df: draws of the game (any order; sorted by date internally)
+    other_df: second game for the per-number model features (defaults to df)
+    start: first evaluated draw index (defaults to 2 * window)
+    """
+    predictors = predictors or PREDICTORS
+    df = sort_by_date(df)
+    draws = draw_matrix(df, sort=False)
+    n = len(draws)
+    start = start if start is not None else 2 * window
+    if n <= start:
+        return pd.DataFrame(columns=["predictor", "step", "ticket", "hits"])
+
+    X = window_counts(prefix_counts(draws, max_num), window)
+    Y = np.where(np.isnan(draws), 0, draws)[window:].astype(np.int64)
+    pern = None
+    if "pernum" in predictors:
+        other = sort_by_date(other_df) if other_df is not None else df
+        Xp, yp = build_pernum_features(df, other, window=window, max_num=max_num)
+        pern = (Xp.astype(np.float32), yp) if Xp is not None else None
+
+    workers = workers or os.cpu_count() or 1
+    folds = folds or workers
+    bounds = np.linspace(start, n, min(folds, n - start) + 1).astype(int)
+    # folds in parallel: one thread per forest, or the pool oversubscribes the cores
+    n_jobs = 1 if workers > 1 else -1
+    tasks = [(draws, X, Y, pern, window, max_num, predictors, int(lo), int(hi), refit_every, n_jobs)
+             for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+    log(f"🔹 Walk-forward: steps [{start}, {n}), {len(tasks)} folds, {workers} workers")
+
+    records = []
+    if workers == 1:
+        for task in tasks:
+            records += _run_fold(task)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+            for recs in pool.map(_run_fold, tasks):
+                records += recs
+    out = pd.DataFrame(records, columns=["predictor", "step", "ticket", "hits"])
+    date_col = "draw_date" if "draw_date" in df.columns else ("date" if "date" in df.columns else None)
+    if date_col and len(out):
+        out["draw_date"] = df[date_col].to_numpy()[out["step"].to_numpy()]
+    return out.sort_values(["predictor", "step"]).reset_index(drop=True)
+
+
+def hit_distribution(records):
+    """Per predictor: count of tickets with 0..6 hits, mean hits and number of steps."""
+    if records is None or len(records) == 0:
+        return pd.DataFrame()
+    dist = pd.crosstab(records["predictor"], records["hits"]).reindex(columns=range(7), fill_value=0)
+    dist.columns = [f"hits_{c}" for c in dist.columns]
+    dist["mean_hits"] = records.groupby("predictor")["hits"].mean()
+    dist["steps"] = records.groupby("predictor")["hits"].size()
+    return dist.reset_index()
@@ -0,0 +1,64 @@
+# utils/bitsets.py
+"""
+Tickets and draws as 64-bit masks.
+
+Number n (1..63) is bit n, so a 6-number ticket of Mega 6/45 or Power 6/55 is
+one uint64 and "numbers in common" is popcount(a & b). Everything here works
+on whole arrays: tickets (n x k) -> masks (n,), pairwise match counts with
+broadcasting, and membership of masks in a set of past draws.
+"""
+import numpy as np
+
+MAX_NUMBER = 63
+_ONE = np.uint64(1)
+
+if hasattr(np, "bitwise_count"):
+    def popcount(x):
+        """Number of set bits of every uint64 (NumPy >= 2.0 native)."""
+        return np.bitwise_count(np.asarray(x, dtype=np.uint64)).astype(np.uint8)
+else:
+    def popcount(x):
+        """Number of set bits of every uint64 (SWAR fallback for NumPy < 2.0)."""
+        x = np.asarray(x, dtype=np.uint64)
+        x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+        x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+        x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+        return ((x * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.uint8)
+
+
+def to_masks(tickets):
+    """(n x k) numbers in 1..63 -> (n,) uint64 masks; NaN / 0 / out-of-range entries are ignored."""
+    T = np.asarray(tickets, dtype=np.float64)
+    T = T.reshape(-1, T.shape[-1]) if T.ndim else T.reshape(1, 1)
+    valid = ~np.isnan(T)
+    vals = np.where(valid, T, 0).astype(np.int64)
+    valid &= (vals >= 1) & (vals <= MAX_NUMBER)
+    bits = np.where(valid, _ONE << np.where(valid, vals, 0).astype(np.uint64), np.uint64(0))
+    return np.bitwise_or.reduce(bits, axis=1)
+
+
+def from_masks(masks, k=6):
+    """(n,) masks with exactly `k` bits set -> (n x k) sorted numbers (uint8)."""
+    masks = np.asarray(masks, dtype=np.uint64).reshape(-1)
+    bits = ((masks[:, None] >> np.arange(MAX_NUMBER + 1, dtype=np.uint64)) & _ONE).astype(bool)
+    rows, nums = np.nonzero(bits)
+    if len(rows) != len(masks) * k:
+        raise ValueError(f"every mask must have exactly {k} bits set")
+    return nums.reshape(len(masks), k).astype(np.uint8)
+
+
+def match_counts(ticket_masks, draw_masks):
+    """(n_tickets x n_draws) numbers in common."""
+    t = np.asarray(ticket_masks, dtype=np.uint64).reshape(-1, 1)
+    d = np.asarray(draw_masks, dtype=np.uint64).reshape(1, -1)
+    return popcount(t & d)
+
+
+def contains(masks, pool):
+    """Boolean (n,): whether each mask occurs in `pool` (e.g. past draws); binary search in the sorted pool."""
+    masks = np.asarray(masks, dtype=np.uint64)
+    pool = np.sort(np.asarray(pool, dtype=np.uint64).reshape(-1))
+    if not len(pool):
+        return np.zeros(masks.shape, dtype=bool)
+    pos = np.minimum(np.searchsorted(pool, masks), len(pool) - 1)
+    return pool[pos] == masks
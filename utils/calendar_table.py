@@ -0,0 +1,170 @@
+# utils/calendar_table.py
+"""
+Precomputed calendar table (dương lịch / âm lịch).
+
+One int16 row per day, indexed by day number (days since 1970-01-01 minus the
+table origin), from the first draw date through several years ahead:
+
+    weekday, lunar_day, lunar_month, lunar_year, lunar_leap, element, holiday
+
+The table is built once with `LunarDate`, persisted to `data/calendar_table.npz`
+and looked up for draw dates with a single array gather (calendar_features).
+join_calendar adds the columns to a draws frame; build_calendar_features feeds
+them to the models as the "calendar" feature set (window counts of the
+previous draws + the calendar row of the draw being predicted, whose date is
+known in advance from the weekly draw schedule, see next_draw_date).
+"""
+import os
+import datetime
+import numpy as np
+import pandas as pd
+from utils.logger import log
+from utils.feature_engine import draw_matrix, prefix_counts, window_counts, last_window_counts, targets
+
+HAS_LUNAR = False
+try:
+    from lunardate import LunarDate
+    HAS_LUNAR = True
+except Exception:
+    HAS_LUNAR = False
+
+CAL_PATH = "data/calendar_table.npz"
+# Mega 6/45 bắt đầu quay từ 18/07/2016
+FIRST_DRAW_DATE = datetime.date(2016, 7, 18)
+YEARS_AHEAD = 5
+
+CAL_COLUMNS = ["weekday", "lunar_day", "lunar_month", "lunar_year", "lunar_leap", "element", "holiday"]
+
+# map last digit of lunar year to five elements (simplified mapping)
+ELEMENT_MAP = {0:"Kim",1:"Mộc",2:"Hoả",3:"Thổ",4:"Thuỷ",5:"Kim",6:"Mộc",7:"Hoả",8:"Thổ",9:"Kim"}
+ELEMENTS = ["Kim", "Mộc", "Hoả", "Thổ", "Thuỷ"]
+
+# draws looked at to infer the weekly schedule (Mega: T4/T6/CN, Power: T3/T5/T7)
+SCHEDULE_LOOKBACK = 30
+
+# ngày lễ dương lịch (tháng, ngày) và âm lịch (tháng, ngày)
+SOLAR_HOLIDAYS = {(1, 1), (4, 30), (5, 1), (9, 2)}
+LUNAR_HOLIDAYS = {(1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (3, 10)}
+
+_EPOCH = datetime.date(1970, 1, 1)
+_tables = {}  # path -> (origin day number, int16 table)
+
+
+def day_number(d):
+    return (d - _EPOCH).days
+
+
+def build_calendar_table(start=FIRST_DRAW_DATE, end=None):
+    """Build the table for every day in [start, end]; returns (origin, int16 array)."""
+    if not HAS_LUNAR:
+        raise RuntimeError("lunardate not available")
+    end = end or datetime.date(datetime.date.today().year + YEARS_AHEAD, 12, 31)
+    n_days = (end - start).days + 1
+    days = [start + datetime.timedelta(days=i) for i in range(n_days + 1)]
+    lunar = [LunarDate.fromSolarDate(d.year, d.month, d.day) for d in days]
+    table = np.zeros((n_days, len(CAL_COLUMNS)), dtype=np.int16)
+    for i in range(n_days):
+        d, ld, nxt = days[i], lunar[i], lunar[i + 1]
+        holiday = (d.month, d.day) in SOLAR_HOLIDAYS or (not ld.isLeapMonth and (ld.month, ld.day) in LUNAR_HOLIDAYS)
+        # đêm giao thừa: ngày liền trước mùng 1 Tết
+        holiday = holiday or (nxt.month == 1 and nxt.day == 1 and not nxt.isLeapMonth)
+        table[i] = (d.weekday(), ld.day, ld.month, ld.year, int(ld.isLeapMonth),
+                    ELEMENTS.index(ELEMENT_MAP[ld.year % 10]), int(holiday))
+    return day_number(start), table
+
+
+def load_calendar_table(path=CAL_PATH, start=FIRST_DRAW_DATE, end=None):
+    """Return (origin, table) covering [start, end], building and persisting it if needed."""
+    end = end or datetime.date.today() + datetime.timedelta(days=365)
+    lo, hi = day_number(start), day_number(end)
+
+    def covers(t):
+        return t is not None and t[0] <= lo and t[0] + len(t[1]) > hi
+
+    if covers(_tables.get(path)):
+        return _tables[path]
+    if os.path.exists(path):
+        try:
+            with np.load(path) as z:
+                loaded = (int(z["origin"]), z["table"])
+            if covers(loaded):
+                _tables[path] = loaded
+                return loaded
+        except Exception as e:
+            log(f"⚠ Không đọc được calendar table {path}: {e}")
+
+    log("🔹 Building calendar table...")
+    far_end = max(end, datetime.date(datetime.date.today().year + YEARS_AHEAD, 12, 31))
+    origin, table = build_calendar_table(min(start, FIRST_DRAW_DATE), far_end)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.savez(path, origin=origin, table=table)
+    _tables[path] = (origin, table)
+    return _tables[path]
+
+
+def calendar_features(dates, path=CAL_PATH):
+    """Gather calendar rows for `dates` (anything `pd.to_datetime` accepts).
+
+    Returns an int16 array (len(dates) x len(CAL_COLUMNS)); rows for missing or
+    out-of-range dates are -1.
+    """
+    days = pd.to_datetime(pd.Series(dates), errors="coerce").to_numpy(dtype="datetime64[D]")
+    valid = ~np.isnat(days)
+    out = np.full((len(days), len(CAL_COLUMNS)), -1, dtype=np.int16)
+    if not valid.any():
+        return out
+    day_nums = days[valid].astype(np.int64)
+    lo = _EPOCH + datetime.timedelta(days=int(day_nums.min()))
+    hi = _EPOCH + datetime.timedelta(days=int(day_nums.max()))
+    origin, table = load_calendar_table(path, start=min(lo, FIRST_DRAW_DATE), end=hi)
+    idx = day_nums - origin
+    ok = (idx >= 0) & (idx < len(table))
+    rows = np.full((len(idx), len(CAL_COLUMNS)), -1, dtype=np.int16)
+    rows[ok] = table[idx[ok]]
+    out[valid] = rows
+    return out
+
+
+def _date_col(df):
+    return "draw_date" if "draw_date" in df.columns else "date"
+
+
+def join_calendar(df, date_col=None, path=CAL_PATH):
+    """Return a copy of `df` with the calendar columns joined on its date column."""
+    date_col = date_col or _date_col(df)
+    feats = calendar_features(df[date_col].to_numpy(), path=path)
+    out = df.copy()
+    for j, c in enumerate(CAL_COLUMNS):
+        out[c] = feats[:, j]
+    return out
+
+
+def next_draw_date(dates, lookback=SCHEDULE_LOOKBACK):
+    """First day after the latest date whose weekday occurs among the last `lookback` draws."""
+    dates = pd.to_datetime(pd.Series(dates), errors="coerce").dropna().sort_values()
+    if dates.empty:
+        raise ValueError("no valid draw dates")
+    weekdays = set(dates.tail(lookback).dt.weekday)
+    d = dates.iloc[-1].normalize() + pd.Timedelta(days=1)
+    while d.weekday() not in weekdays:
+        d += pd.Timedelta(days=1)
+    return d
+
+
+def build_calendar_features(df, window=50, max_num=55, path=CAL_PATH):
+    """X (n_samples x (max_num + len(CAL_COLUMNS)), float32): window counts of draws [i-window, i)
+    next to the calendar row of draw i, and Y (n_samples x 6); (None, None) if too few draws."""
+    df = df.sort_values(_date_col(df)).reset_index(drop=True)
+    draws = draw_matrix(df, sort=False)
+    if len(draws) <= window:
+        return None, None
+    counts = window_counts(prefix_counts(draws, max_num), window)
+    cal = calendar_features(df[_date_col(df)].to_numpy()[window:], path=path)
+    return np.hstack([counts, cal]).astype(np.float32), targets(draws, window)
+
+
+def calendar_next_row(df, window=50, max_num=55, path=CAL_PATH):
+    """build_calendar_features row for the next scheduled draw after the last one in `df`."""
+    draws = draw_matrix(df)
+    cal = calendar_features([next_draw_date(df[_date_col(df)])], path=path)[0]
+    return np.concatenate([last_window_counts(draws, window, max_num), cal]).astype(np.float32)
@@ -0,0 +1,159 @@
+# utils/combinations.py
+"""
+Exhaustive ranking of whole tickets.
+
+Scores every one of the C(45,6) = 8,145,060 Mega or C(55,6) = 28,989,675 Power
+combinations and keeps the global top-K:
+
+    score = w_num  * sum_i log p_i                  (per-number probabilities)
+          + w_pair * sum_{i<j} z_ij                 (pair co-occurrence, standardized)
+    subject to sum_range / odd_range / max_consecutive (utils.tickets constraints)
+
+Combinations are enumerated in lexicographic rank order. A chunk is a run of
+consecutive (a, b) prefixes; the remaining 4 numbers of prefix (a, b) are a
+contiguous suffix of one precomputed table of 4-combinations, so per-number
+and within-suffix pair sums are computed once and a chunk only adds the
+prefix terms. Chunks run on a process pool; each returns its own top-K and the
+parent merges them through a bounded heap, so memory does not grow with the
+number of combinations.
+"""
+import os
+import heapq
+import time
+import multiprocessing as mp
+from math import comb
+from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from utils.logger import log
+from utils.feature_engine import onehot_counts
+from utils.tickets import check_constraints, DEFAULT_CONSTRAINTS
+
+TOP_K = 100
+# combinations per task (~ tens of MB of temporaries per worker)
+CHUNK_COMBOS = 1 << 20
+W_NUM = 1.0
+W_PAIR = 0.1
+_W = {}
+
+
+def pair_zscores(draws, max_num):
+    """(max_num x max_num) standardized pair co-occurrence counts of past draws (diagonal 0)."""
+    oh = onehot_counts(draws, max_num, dtype=np.float64)
+    C = oh.T @ oh
+    off = ~np.eye(max_num, dtype=bool)
+    std = C[off].std()
+    Z = (C - C[off].mean()) / (std if std > 0 else 1.0)
+    Z[~off] = 0.0
+    return Z
+
+
+def combo_rank(combo, max_num):
+    """Lexicographic rank of a sorted 1-based combination among all C(max_num, len(combo))."""
+    k, rank, prev = len(combo), 0, 0
+    for i, c in enumerate(combo):
+        for j in range(prev + 1, int(c)):
+            rank += comb(max_num - j, k - i - 1)
+        prev = int(c)
+    return rank
+
+
+def _table4(max_num):
+    """All 4-combinations of 0..max_num-1 in lexicographic order (m x 4, uint8)."""
+    flat = np.fromiter((v for c in combinations(range(max_num), 4) for v in c), dtype=np.uint8,
+                       count=comb(max_num, 4) * 4)
+    return flat.reshape(-1, 4)
+
+
+def _init_worker(u, Z, max_num, k, cons):
+    T4 = _table4(max_num)
+    idx = T4.astype(np.intp)
+    pair4 = sum(Z[idx[:, i], idx[:, j]] for i in range(4) for j in range(i + 1, 4))
+    # first row of the suffix that starts with number c (0-based)
+    starts = np.searchsorted(T4[:, 0], np.arange(max_num + 1))
+    _W.update(u=u, Z=Z, max_num=max_num, k=k, cons=cons, T4=T4, idx=idx,
+              base4=u[idx].sum(axis=1) + pair4, starts=starts)
+
+
+def _score_prefixes(prefixes):
+    """Top-k of all combinations with the given (a, b) prefixes: [(score, lex_rank, combo), ...]."""
+    W = _W
+    u, Z, T4, idx, max_num, k = W["u"], W["Z"], W["T4"], W["idx"], W["max_num"], W["k"]
+    cons = {c: v for c, v in W["cons"].items() if v is not None}
+    best = []
+    for a, b in prefixes:
+        s0 = W["starts"][b + 1]
+        rest = idx[s0:]
+        score = W["base4"][s0:] + (u[a] + u[b] + Z[a, b]) + Z[a][rest].sum(axis=1) + Z[b][rest].sum(axis=1)
+        if cons:
+            T = np.column_stack([np.full(len(rest), a + 1), np.full(len(rest), b + 1), T4[s0:] + 1]).astype(np.int16)
+            score = np.where(check_constraints(T, **cons), score, -np.inf)
+        top = np.argpartition(-score, min(k, len(score)) - 1)[:k] if len(score) > k else np.arange(len(score))
+        top = top[np.isfinite(score[top])]
+        if not len(top):
+            continue
+        r0 = combo_rank([a + 1, b + 1, *(T4[s0] + 1)], max_num)
+        best += [(float(score[i]), r0 + int(i), (a + 1, b + 1, *(int(v) + 1 for v in T4[s0 + i]))) for i in top]
+    return heapq.nlargest(k, best)
+
+
+def _tasks(max_num, chunk_combos=CHUNK_COMBOS):
+    """Consecutive (a, b) prefixes grouped into tasks of about `chunk_combos` combinations."""
+    tasks, cur, size = [], [], 0
+    for a in range(max_num - 5):
+        for b in range(a + 1, max_num - 4):
+            cur.append((a, b))
+            size += comb(max_num - b - 1, 4)
+            if size >= chunk_combos:
+                tasks.append(cur)
+                cur, size = [], 0
+    if cur:
+        tasks.append(cur)
+    return tasks
+
+
+def rank_combinations(scores, max_num, draws=None, k=TOP_K, w_num=W_NUM, w_pair=W_PAIR, workers=None,
+                      chunk_combos=CHUNK_COMBOS, **constraints):
+    """Global top-`k` of all 6-number combinations; returns rows (rank, lex_rank, n1..n6, score).
+
+    scores: per-number scores (max_num,), e.g. ensemble or frequency scores
+    draws: past draws (n x 6) for the pair term (omitted -> no pair term)
+    constraints: sum_range, odd_range, max_consecutive (hard filters)
+    """
+    cons = {**DEFAULT_CONSTRAINTS, **constraints}
+    unknown = set(cons) - set(DEFAULT_CONSTRAINTS)
+    if unknown:
+        raise ValueError(f"Unknown constraints: {sorted(unknown)}")
+    p = np.asarray(scores, dtype=np.float64)[:max_num]
+    p = np.clip(p / p.sum(), 1e-12, None)
+    u = w_num * np.log(p)
+    Z = w_pair * pair_zscores(draws, max_num) if draws is not None and w_pair else np.zeros((max_num, max_num))
+
+    tasks = _tasks(max_num, chunk_combos)
+    workers = workers or os.cpu_count() or 1
+    log(f"🔹 Ranking C({max_num},6) = {comb(max_num, 6):,} combinations: {len(tasks)} chunks, {workers} workers")
+    t0 = time.perf_counter()
+    heap = []
+
+    def _merge(part):
+        for item in part:
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heappushpop(heap, item)
+
+    if workers == 1:
+        _init_worker(u, Z, max_num, k, cons)
+        for task in tasks:
+            _merge(_score_prefixes(task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(u, Z, max_num, k, cons)) as pool:
+            for part in pool.map(_score_prefixes, tasks):
+                _merge(part)
+    log(f"    -> ranked in {time.perf_counter() - t0:.1f}s")
+    rows = []
+    for i, (score, lex, combo) in enumerate(sorted(heap, reverse=True)):
+        rows.append({"rank": i + 1, "lex_rank": lex, **{f"n{j + 1}": v for j, v in enumerate(combo)},
+                     "score": round(score, 6)})
+    return rows
@@ -0,0 +1,209 @@
+# utils/early_stopping.py
+"""
+Early stopping and wall-clock budgets.
+
+Every trainer monitors a time-ordered validation slice (the most recent
+training draws) and stops after `patience` rounds without improvement or when
+its wall-clock budget runs out, whichever comes first; the best iteration seen
+so far is kept:
+  - LightGBM: one callback that tracks the best validation loss and raises
+    EarlyStopException (best_iteration is then used for prediction);
+  - CatBoost: early_stopping_rounds + use_best_model and an after_iteration
+    time check;
+  - XGBoost: early_stopping_rounds + a TrainingCallback time check;
+  - sklearn HistGradientBoosting: warm_start growth in steps of HGB_STEP
+    iterations, stopped on validation log-loss or time;
+  - sklearn MLP: a manual `partial_fit` loop that keeps the best coefs_
+    (also for multi-hot targets, scored by mean binary log-loss);
+  - Keras: EarlyStopping + a callback that stops on time and restores the
+    best weights.
+Each fit returns (estimator, n_iter used, max_iter).
+"""
+import copy
+import time
+import numpy as np
+
+VAL_FRACTION = 0.15
+PATIENCE = 20
+# seconds per model (all output positions together)
+TIME_BUDGET_S = 120
+# HGB iterations added per warm-start step
+HGB_STEP = 10
+
+
+def time_split(X, Y, fraction=VAL_FRACTION):
+    """Split oldest-first rows into (X_fit, Y_fit, X_val, Y_val); the validation slice is the last `fraction`."""
+    n_val = max(int(len(X) * fraction), 1)
+    return X[:-n_val], Y[:-n_val], X[-n_val:], Y[-n_val:]
+
+
+def _seen(y_fit, X_val, y_val):
+    """Drop validation rows whose class never occurs in the fit slice (multiclass evals reject them)."""
+    keep = np.isin(y_val, np.unique(y_fit))
+    return X_val[keep], y_val[keep]
+
+
+def _lgb_budget(patience, deadline):
+    from lightgbm.callback import EarlyStopException
+    best = {"iter": 0, "score": None, "results": None}
+
+    def _callback(env):
+        if not env.evaluation_result_list:
+            return
+        res = env.evaluation_result_list[0]
+        score = -res[2] if res[3] else res[2]
+        if best["score"] is None or score < best["score"]:
+            best.update(iter=env.iteration, score=score, results=env.evaluation_result_list)
+        if env.iteration - best["iter"] >= patience or time.monotonic() >= deadline:
+            raise EarlyStopException(best["iter"], best["results"])
+    _callback.order = 30
+    _callback.best = best
+    return _callback
+
+
+class _CatBudget:
+    def __init__(self, deadline):
+        self.deadline = deadline
+
+    def after_iteration(self, info):
+        return time.monotonic() < self.deadline
+
+
+def _keras_budget(deadline):
+    from tensorflow.keras.callbacks import Callback
+
+    class TimeBudget(Callback):
+        """Stop when the deadline passes; restore the weights of the best val_loss epoch."""
+
+        def on_train_begin(self, logs=None):
+            self.best, self.best_weights, self.epochs = np.inf, None, 0
+
+        def on_epoch_end(self, epoch, logs=None):
+            self.epochs = epoch + 1
+            loss = (logs or {}).get("val_loss", np.inf)
+            if loss < self.best:
+                self.best, self.best_epoch, self.best_weights = loss, epoch + 1, self.model.get_weights()
+            if time.monotonic() >= deadline:
+                self.model.stop_training = True
+
+        def on_train_end(self, logs=None):
+            if self.best_weights is not None:
+                self.model.set_weights(self.best_weights)
+    return TimeBudget()
+
+
+def fit_lgb(est, X, y, X_val, y_val, budget_s=TIME_BUDGET_S, patience=PATIENCE):
+    X_val, y_val = _seen(y, X_val, y_val)
+    max_iter = est.get_params()["n_estimators"]
+    if len(y_val) == 0:
+        return est.fit(X, y), max_iter, max_iter
+    callback = _lgb_budget(patience, time.monotonic() + budget_s)
+    est.fit(X, y, eval_set=[(X_val, y_val)], callbacks=[callback])
+    if not est.best_iteration_ and callback.best["score"] is not None:
+        # ran all n_estimators without a stop: predict (and compile) with the best round, not every tree
+        est.booster_.best_iteration = est._best_iteration = callback.best["iter"] + 1
+    n_iter = est.best_iteration_ or est.booster_.current_iteration()
+    return est, int(n_iter), max_iter
+
+
+def fit_cat(est, X, y, X_val, y_val, budget_s=TIME_BUDGET_S, patience=PATIENCE):
+    X_val, y_val = _seen(y, X_val, y_val)
+    max_iter = est.get_params()["iterations"]
+    # no catboost_info/ training logs in the working directory
+    est.set_params(allow_writing_files=False)
+    if len(y_val) == 0:
+        return est.fit(X, y), max_iter, max_iter
+    est.fit(X, y, eval_set=(X_val, y_val), early_stopping_rounds=patience, use_best_model=True,
+            callbacks=[_CatBudget(time.monotonic() + budget_s)])
+    return est, int(est.tree_count_), max_iter
+
+
+def fit_xgb(est, X, y, X_val, y_val, budget_s=TIME_BUDGET_S, patience=PATIENCE):
+    """Binary/multiclass XGBClassifier; early-stopping params are cleared afterwards so that
+    later `fit(..., xgb_model=...)` continuation (utils.incremental) works without an eval set."""
+    from xgboost.callback import TrainingCallback
+
+    class TimeBudget(TrainingCallback):
+        def __init__(self, deadline):
+            super().__init__()
+            self.deadline = deadline
+
+        def after_iteration(self, model, epoch, evals_log):
+            return time.monotonic() >= self.deadline
+
+    max_iter = est.get_params()["n_estimators"]
+    est.set_params(early_stopping_rounds=patience, callbacks=[TimeBudget(time.monotonic() + budget_s)])
+    est.fit(X, y, eval_set=[(X_val, y_val)], verbose=False)
+    n_iter = getattr(est, "best_iteration", None)
+    est.set_params(early_stopping_rounds=None, callbacks=None)
+    return est, int(n_iter + 1 if n_iter is not None else max_iter), max_iter
+
+
+def fit_hgb(est, X, y, X_val, y_val, budget_s=TIME_BUDGET_S, patience=PATIENCE, step=HGB_STEP):
+    """HistGradientBoostingClassifier grown `step` iterations at a time (warm_start).
+
+    HGB cannot drop trees, so it stops at most `patience` iterations past the best one.
+    """
+    from sklearn.metrics import log_loss
+    X_val, y_val = _seen(y, X_val, y_val)
+    max_iter = est.get_params()["max_iter"]
+    deadline = time.monotonic() + budget_s
+    # its own early stopping would validate on a random (not time-ordered) split
+    est.set_params(warm_start=True, early_stopping=False)
+    best, best_iter, n = np.inf, 0, 0
+    while n < max_iter:
+        n = min(n + step, max_iter)
+        est.set_params(max_iter=n)
+        est.fit(X, y)
+        loss = log_loss(y_val, est.predict_proba(X_val), labels=est.classes_) if len(y_val) else -n
+        if loss < best:
+            best, best_iter = loss, n
+        if n - best_iter >= patience or time.monotonic() >= deadline:
+            break
+    return est, best_iter, max_iter
+
+
+def _binary_log_loss(Y, P):
+    P = np.clip(P, 1e-7, 1 - 1e-7)
+    return float(-np.mean(Y * np.log(P) + (1 - Y) * np.log(1 - P)))
+
+
+def fit_mlp(est, X, y, X_val, y_val, budget_s=TIME_BUDGET_S, patience=PATIENCE, classes=None):
+    """One `partial_fit` epoch at a time; keeps the coefficients of the best validation log-loss.
+
+    A 2-D `y` is a multi-hot target (one output per column).
+    """
+    from sklearn.metrics import log_loss
+    multilabel = np.ndim(y) == 2
+    if not multilabel:
+        X_val, y_val = _seen(y, X_val, y_val)
+    max_iter = est.get_params()["max_iter"]
+    if classes is None:
+        classes = np.arange(np.shape(y)[1]) if multilabel else np.unique(y)
+    deadline = time.monotonic() + budget_s
+    best, best_epoch, best_state = np.inf, 0, None
+    for epoch in range(max_iter):
+        est.partial_fit(X, y, classes=classes)
+        if len(y_val) and multilabel:
+            loss = _binary_log_loss(y_val, est.predict_proba(X_val))
+        elif len(y_val):
+            loss = log_loss(y_val, est.predict_proba(X_val), labels=est.classes_)
+        else:
+            loss = est.loss_
+        if loss < best:
+            best, best_epoch = loss, epoch + 1
+            best_state = (copy.deepcopy(est.coefs_), copy.deepcopy(est.intercepts_))
+        if epoch + 1 - best_epoch >= patience or time.monotonic() >= deadline:
+            break
+    if best_state is not None:
+        est.coefs_, est.intercepts_ = best_state
+    return est, best_epoch, max_iter
+
+
+FITTERS = {"lgb": fit_lgb, "cat": fit_cat, "xgb": fit_xgb, "mlp": fit_mlp, "hgb": fit_hgb}
+
+
+def keras_callbacks(patience=10, budget_s=TIME_BUDGET_S):
+    """EarlyStopping on val_loss plus the time budget / best-weights callback (last in the list)."""
+    from tensorflow.keras.callbacks import EarlyStopping
+    return [EarlyStopping(monitor="val_loss", patience=patience), _keras_budget(time.monotonic() + budget_s)]
@@ -2,12 +2,13 @@
 error_analysis.py
 - compare last_prediction.json with latest real results
 - compute match count and accuracy, log daily
-- if accuracy < threshold then retrain using train_models_and_save (auto-retrain)
+- if accuracy < threshold then update models: warm-start on new draws, full
+  train_models_and_save only on schedule / drift (see utils.incremental)
 """
 import os, json
 import pandas as pd
 from datetime import datetime
-from utils.train_model import train_models_and_save
+from utils.incremental import update_or_retrain, FULL_RETRAIN_DAYS
 
 def _read_last_pred(path):
     try:
@@ -50,11 +51,13 @@ def check_and_retrain_if_needed(save_dir="data", models_dir="models", config=Non
         try:
             mega_df = pd.read_csv(os.path.join(save_dir, "mega_6_45_raw.csv"))
             power_df = pd.read_csv(os.path.join(save_dir, "power_6_55_raw.csv"))
-            rf_p, gb_p, metrics = train_models_and_save(mega_df, power_df, window=config.get("window",50), save_dir=save_dir, models_dir=models_dir)
-            retrain_taken = True
-            retrain_details = {"rf_path": rf_p, "gb_path": gb_p, "metrics": metrics}
+            config = config or {}
+            model_p, boost_p, metrics = update_or_retrain(mega_df, power_df, window=config.get("window",50), models_dir=models_dir,
+                                                          full_every_days=config.get("full_retrain_days", FULL_RETRAIN_DAYS))
+            retrain_taken = metrics.get("mode") != "none"
+            retrain_details = {"model_path": model_p, "boost_path": boost_p, "metrics": metrics}
             with open(logfile, "a", encoding="utf-8") as f:
-                f.write(f"[{datetime.now().isoformat()}] Auto retrain done. metrics: {metrics}\n")
+                f.write(f"[{datetime.now().isoformat()}] Auto retrain done ({metrics.get('mode')}). metrics: {metrics}\n")
         except Exception as e:
             with open(logfile, "a", encoding="utf-8") as f:
                 f.write(f"[{datetime.now().isoformat()}] Auto retrain FAILED: {e}\n")
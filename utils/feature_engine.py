@@ -0,0 +1,183 @@
+# utils/feature_engine.py
+"""
+Shared sliding-window feature engine.
+
+Every window-count builder in the repo reduces to "how often did each number
+appear in the previous `window` draws". Instead of slicing `df.iloc[i-window:i]`
+per step, we one-hot the draws once, take a cumulative sum along time and read
+every window as a difference of two prefix rows:
+
+    counts[i] = prefix[i] - prefix[i - window]
+
+which costs O(n * max_num) NumPy ops regardless of the window size.
+"""
+import numpy as np
+
+NUM_COLS = [f"n{i}" for i in range(1, 7)]
+
+# default scales of the multi-scale pyramid; None means all-time counts
+PYRAMID_WINDOWS = (5, 10, 25, 50, 100, None)
+PYRAMID_DECAYS = (0.9, 0.97)
+
+
+def draw_matrix(df, sort=True):
+    """Return draws as float64 array (n x 6), NaN where a number is missing.
+
+    With `sort=True` rows are ordered by `draw_date` (oldest first), matching the
+    legacy builders (saved CSVs use `date` instead); otherwise the DataFrame
+    order is kept.
+    """
+    if sort:
+        df = df.sort_values("draw_date" if "draw_date" in df.columns else "date").reset_index(drop=True)
+    cols = [c for c in NUM_COLS if c in df.columns]
+    out = np.full((len(df), 6), np.nan)
+    for j, c in enumerate(NUM_COLS):
+        if c in cols:
+            out[:, j] = df[c].to_numpy(dtype=float, na_value=np.nan)
+    return out
+
+
+def onehot_counts(draws, max_num, dtype=np.uint8):
+    """Per-draw occurrence counts (n x max_num); NaN / out-of-range values are ignored."""
+    n = draws.shape[0]
+    valid = ~np.isnan(draws)
+    vals = np.where(valid, draws, 0).astype(np.int64)
+    valid &= (vals >= 1) & (vals <= max_num)
+    rows = np.nonzero(valid)[0]
+    flat = rows * max_num + (vals[valid] - 1)
+    counts = np.bincount(flat, minlength=n * max_num).reshape(n, max_num)
+    return counts.astype(dtype, copy=False)
+
+
+def prefix_counts(draws, max_num):
+    """Cumulative counts (n+1 x max_num): row i holds the counts of draws[:i]."""
+    oh = onehot_counts(draws, max_num, dtype=np.int32)
+    prefix = np.zeros((oh.shape[0] + 1, max_num), dtype=np.int32)
+    np.cumsum(oh, axis=0, out=prefix[1:])
+    return prefix
+
+
+def window_counts(prefix, window, start=None, dtype=np.uint16):
+    """Window counts for every step i in [start, n): counts of draws[i-window:i].
+
+    `start` defaults to `window` (first step with a full window).
+    """
+    n = prefix.shape[0] - 1
+    start = window if start is None else start
+    idx = np.arange(start, n)
+    return (prefix[idx] - prefix[np.maximum(idx - window, 0)]).astype(dtype, copy=False)
+
+
+def decayed_counts(draws, max_num, decay):
+    """Exponentially decayed counts (n+1 x max_num): row i = sum_j<i decay**(i-1-j) * onehot[j]."""
+    from scipy.signal import lfilter
+    oh = onehot_counts(draws, max_num, dtype=np.float64)
+    out = np.zeros((oh.shape[0] + 1, max_num))
+    if len(oh):
+        out[1:] = lfilter([1.0], [1.0, -decay], oh, axis=0)
+    return out
+
+
+def last_window_counts(draws, window, max_num, dtype=np.uint16):
+    """Counts of the last `window` draws: the feature row for predicting the next draw."""
+    return onehot_counts(draws[-window:], max_num, dtype=np.int32).sum(axis=0).astype(dtype)
+
+
+def multi_hot(Y, max_num, dtype=np.uint8):
+    """Convert (n x 6) drawn numbers to an (n x max_num) multi-hot matrix."""
+    return np.minimum(onehot_counts(np.asarray(Y, dtype=float), max_num, dtype=np.uint8), 1).astype(dtype, copy=False)
+
+
+def targets(draws, start):
+    """Integer targets (n1..n6) for steps [start, n); raises on missing numbers like the legacy builders."""
+    Y = draws[start:]
+    if np.isnan(Y).any():
+        raise ValueError("Cannot convert NaN draw numbers to integer targets")
+    return Y.astype(np.int64)
+
+
+def build_window_features(df, window=50, max_num=55, dtype=np.uint16):
+    """Return X (n_samples x max_num) window counts and Y (n_samples x 6) or (None, None).
+
+    Step i uses draws [i-window, i) as features and draw i as target, with rows
+    sorted by `draw_date`.
+    """
+    draws = draw_matrix(df)
+    if len(draws) <= window:
+        return None, None
+    X = window_counts(prefix_counts(draws, max_num), window, dtype=dtype)
+    return X, targets(draws, window)
+
+
+def build_pernum_features(mega_df, power_df, window=50, max_num=45, dtype=np.float64):
+    """Per-number rows for the per-number model (see `utils.train_model.build_Xy`).
+
+    For each step `end` and each number n, the row is
+    [mega_count, power_count, mega_count/(window*6), power_count/(window*6)]
+    and the label is 1 if n appears in mega draw `end`. DataFrame order is kept.
+    Returns (X, y) or (None, None) if there are not enough rows.
+    """
+    minlen = min(len(mega_df), len(power_df))
+    if minlen <= window:
+        return None, None
+    m_draws = draw_matrix(mega_df, sort=False)[:minlen]
+    p_draws = draw_matrix(power_df, sort=False)[:minlen]
+
+    m_counts = window_counts(prefix_counts(m_draws, max_num), window, dtype=np.int64)
+    p_full = window_counts(prefix_counts(p_draws, 55), window, dtype=np.int64)
+    p_counts = np.zeros_like(m_counts)
+    k = min(max_num, 55)
+    p_counts[:, :k] = p_full[:, :k]
+
+    denom = window * 6
+    X = np.stack([m_counts, p_counts, m_counts / denom, p_counts / denom], axis=2)
+    X = X.reshape(-1, 4).astype(dtype, copy=False)
+
+    # label rows with any missing number count as an empty draw
+    nxt = m_draws[window:minlen]
+    complete = ~np.isnan(nxt).any(axis=1)
+    y = multi_hot(np.where(complete[:, None], nxt, np.nan), max_num, dtype=np.int64)
+    return X, y.reshape(-1)
+
+
+def pyramid_rows(draws, steps, windows=PYRAMID_WINDOWS, decays=PYRAMID_DECAYS, max_num=55):
+    """(len(steps) x n_scales x max_num) float32 pyramid features; step i sees draws [0, i).
+
+    Step len(draws) is the row for the next, not yet drawn, draw.
+    """
+    steps = np.asarray(steps)
+    prefix = prefix_counts(draws, max_num)
+    X = np.empty((len(steps), len(windows) + len(decays), max_num), dtype=np.float32)
+    for s, w in enumerate(windows):
+        X[:, s] = prefix[steps] if w is None else prefix[steps] - prefix[np.maximum(steps - w, 0)]
+    for s, d in enumerate(decays, start=len(windows)):
+        X[:, s] = decayed_counts(draws, max_num, d)[steps]
+    return X
+
+
+def build_pyramid_features(df, windows=PYRAMID_WINDOWS, decays=PYRAMID_DECAYS, max_num=55):
+    """Multi-scale features from one prefix-sum pass.
+
+    Returns X (n_samples x n_scales x max_num, float32) stacking the window
+    counts for each entry of `windows` (None = all-time) followed by the decayed
+    counts for each entry of `decays`, and Y (n_samples x 6). The first sample is
+    the first step where the largest finite window is full.
+    """
+    draws = draw_matrix(df)
+    finite = [w for w in windows if w is not None]
+    start = max(finite) if finite else 1
+    if len(draws) <= start:
+        return None, None
+    X = pyramid_rows(draws, np.arange(start, len(draws)), windows, decays, max_num)
+    return X, targets(draws, start)
+
+
+def pyramid_next_row(df, windows=PYRAMID_WINDOWS, decays=PYRAMID_DECAYS, max_num=55):
+    """Pyramid features (n_scales x max_num) for predicting the draw after the last one in `df`."""
+    draws = draw_matrix(df)
+    return pyramid_rows(draws, [len(draws)], windows, decays, max_num)[0]
+
+
+def flatten_features(X):
+    """Flatten stacked (n x scales x max_num) features to the 2-D layout models expect."""
+    return np.asarray(X).reshape(len(X), -1)
@@ -0,0 +1,177 @@
+# utils/feature_store.py
+"""
+Persistent feature store.
+
+Feature matrices are saved once per (data fingerprint, feature spec) under
+
+    <store_dir>/<key>/X.npy, Y.npy, meta.json
+
+and served back as read-only memory maps, so a run on unchanged data does no
+feature computation at all. Any change to the draws (new row, corrected number,
+different order) changes the fingerprint and therefore the key. Old entries are
+evicted by age and total size.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+from utils.logger import log
+from utils.calendar_table import build_calendar_features, calendar_next_row
+from utils.feature_engine import (
+    draw_matrix, build_window_features, build_pernum_features, build_pyramid_features, flatten_features,
+    last_window_counts, pyramid_next_row,
+)
+
+STORE_DIR = "data/feature_store"
+# bump when a builder changes its output so old entries are not served
+FEATURE_VERSION = 1
+MAX_AGE_DAYS = 30
+MAX_BYTES = 512 * 1024 * 1024
+
+# feature set name -> builder(dfs, **params) returning (X, Y) or (None, None)
+FEATURE_SETS = {
+    "counts": lambda dfs, window=50, max_num=55: build_window_features(dfs[0], window=window, max_num=max_num),
+    "pyramid": lambda dfs, max_num=55, **kw: build_pyramid_features(dfs[0], max_num=max_num, **kw),
+    "pernum": lambda dfs, window=50, max_num=45: build_pernum_features(dfs[0], dfs[1], window=window, max_num=max_num),
+    "calendar": lambda dfs, window=50, max_num=55: build_calendar_features(dfs[0], window=window, max_num=max_num),
+}
+# feature set name -> next_row(dfs, **params): the row for the draw after the last one in dfs
+NEXT_ROWS = {
+    "counts": lambda dfs, window=50, max_num=55: last_window_counts(draw_matrix(dfs[0]), window, max_num),
+    "pyramid": lambda dfs, max_num=55, **kw: pyramid_next_row(dfs[0], max_num=max_num, **kw),
+    "calendar": lambda dfs, window=50, max_num=55: calendar_next_row(dfs[0], window=window, max_num=max_num),
+}
+
+
+def data_fingerprint(df):
+    """Short hash of the draw numbers and dates, in DataFrame order."""
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(draw_matrix(df, sort=False)).tobytes())
+    for col in ("draw_date", "date"):
+        if col in df.columns:
+            dates = pd.to_datetime(df[col], errors="coerce").to_numpy(dtype="datetime64[ns]")
+            h.update(dates.astype(np.int64).tobytes())
+            break
+    return h.hexdigest()[:16]
+
+
+def feature_key(feature_set, dfs, **params):
+    spec = {"feature_set": feature_set, "version": FEATURE_VERSION, "params": params,
+            "data": [data_fingerprint(df) for df in dfs]}
+    blob = json.dumps(spec, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(blob).hexdigest()[:20], spec
+
+
+def _load_entry(path):
+    X = np.load(os.path.join(path, "X.npy"), mmap_mode="r")
+    Y = np.load(os.path.join(path, "Y.npy"), mmap_mode="r")
+    # mark as recently used for LRU eviction
+    os.utime(os.path.join(path, "meta.json"))
+    return X, Y
+
+
+def _write_entry(path, X, Y, spec):
+    tmp = f"{path}.tmp-{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+    np.save(os.path.join(tmp, "X.npy"), np.ascontiguousarray(X))
+    np.save(os.path.join(tmp, "Y.npy"), np.ascontiguousarray(Y))
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({**spec, "created": time.time(), "X_shape": list(X.shape), "Y_shape": list(Y.shape)}, f, default=str)
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        # another process stored the same key first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def cached_features(feature_set, *dfs, store_dir=STORE_DIR, **params):
+    """Return (X, Y) for `feature_set` on `dfs`, from the store when possible.
+
+    Hits are memory-mapped read-only arrays; misses are built, persisted and
+    then served from the store as well. Returns (None, None) when the builder
+    has not enough data.
+    """
+    if feature_set not in FEATURE_SETS:
+        raise ValueError(f"Unknown feature set: {feature_set}")
+    key, spec = feature_key(feature_set, dfs, **params)
+    path = os.path.join(store_dir, key)
+    if os.path.exists(os.path.join(path, "meta.json")):
+        try:
+            return _load_entry(path)
+        except Exception as e:
+            log(f"⚠ Feature store entry {key} unreadable, rebuilding: {e}")
+            shutil.rmtree(path, ignore_errors=True)
+
+    X, Y = FEATURE_SETS[feature_set](dfs, **params)
+    if X is None:
+        return None, None
+    try:
+        os.makedirs(store_dir, exist_ok=True)
+        _write_entry(path, X, Y, spec)
+        evict(store_dir)
+        return _load_entry(path)
+    except Exception as e:
+        log(f"⚠ Không thể lưu feature store {key}: {e}")
+        return X, Y
+
+
+def evict(store_dir=STORE_DIR, max_age_days=MAX_AGE_DAYS, max_bytes=MAX_BYTES):
+    """Remove entries unused for `max_age_days`, then least recently used ones above `max_bytes`."""
+    if not os.path.isdir(store_dir):
+        return []
+    entries = []
+    for name in os.listdir(store_dir):
+        path = os.path.join(store_dir, name)
+        meta = os.path.join(path, "meta.json")
+        if not os.path.isfile(meta):
+            continue
+        size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+        entries.append((os.path.getmtime(meta), size, path))
+    entries.sort()
+
+    removed = []
+    now = time.time()
+    total = sum(e[1] for e in entries)
+    for used, size, path in entries:
+        if now - used > max_age_days * 86400 or total > max_bytes:
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed.append(path)
+    return removed
+
+
+def save_feature_spec(path, feature_set, **params):
+    """Record which features a model was trained on, so predictions rebuild the same ones."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"feature_set": feature_set, "params": params}, f)
+
+
+def load_feature_spec(path, default=None):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+
+def model_features(spec, *dfs, store_dir=STORE_DIR):
+    """2-D (X, Y) for a saved feature spec; stacked feature sets are flattened."""
+    X, Y = cached_features(spec["feature_set"], *dfs, store_dir=store_dir, **spec.get("params", {}))
+    if X is not None and X.ndim > 2:
+        X = flatten_features(X)
+    return X, Y
+
+
+def next_features(spec, *dfs):
+    """1-D feature row of a saved spec for the next draw, i.e. built from every draw in `dfs`.
+
+    The last row of `model_features` predicts the last known draw, so it is one
+    draw behind; this row is what a model trained on `spec` needs next.
+    """
+    if spec["feature_set"] not in NEXT_ROWS:
+        raise ValueError(f"No next-draw row for feature set: {spec['feature_set']}")
+    return np.asarray(NEXT_ROWS[spec["feature_set"]](dfs, **spec.get("params", {}))).reshape(-1)
@@ -2,23 +2,24 @@
 features.py
 - create window-based frequency features for each number
 - add lunar (âm lịch) and ngũ hành features as optional reference features
+  (looked up in the precomputed table of utils.calendar_table)
 """
 import pandas as pd, numpy as np, os
 from collections import Counter
-from lunardate import LunarDate
-
-# map last digit or year to five elements (simplified mapping)
-ELEMENT_MAP = {0:"Kim",1:"Mộc",2:"Hoả",3:"Thổ",4:"Thuỷ",5:"Kim",6:"Mộc",7:"Hoả",8:"Thổ",9:"Kim"}
+from utils.calendar_table import ELEMENTS, CAL_COLUMNS, calendar_features
 
 def lunar_element_from_date(date_str):
     try:
-        y,m,d = map(int, date_str.split("-"))
-        ld = LunarDate.fromSolarDate(y,m,d)
-        # simplistic: use lunar year mod 10 to get element
-        return ELEMENT_MAP.get(ld.year % 10, "")
+        # simplistic: element of the lunar year (see calendar_table.ELEMENT_MAP)
+        code = calendar_features([date_str])[0, CAL_COLUMNS.index("element")]
+        return ELEMENTS[code] if code >= 0 else ""
     except:
         return ""
 
+def _date_col(df):
+    # fetch_all_sources produces `draw_date`; preprocessed CSVs use `date`
+    return "draw_date" if "draw_date" in df.columns else "date"
+
 def compute_window_counts(df, window=50, max_num=45):
     """
     Compute frequency counts for each number across sliding window (last `window` draws)
@@ -41,7 +42,7 @@ def build_features_for_all(mega_df, power_df, window=50, save_dir="data"):
     dfm["freq_mega"] = dfm["num"].map(m_counts).fillna(0).astype(int)
     dfm["freq_power_mapped"] = dfm["num"].map(p_counts_for_m).fillna(0).astype(int)
     # add lunar element for last date for reference: not per-number but overall
-    last_date = mega_df["date"].dropna().iloc[-1] if not mega_df.empty else None
+    last_date = mega_df[_date_col(mega_df)].dropna().iloc[-1] if not mega_df.empty else None
     dfm["last_lunar_element"] = lunar_element_from_date(last_date) if last_date else ""
     dfm.to_csv(os.path.join(save_dir, "mega_features.csv"), index=False)
 
@@ -51,7 +52,7 @@ def build_features_for_all(mega_df, power_df, window=50, save_dir="data"):
     dfp = pd.DataFrame({"num": list(range(1,56))})
     dfp["freq_power"] = dfp["num"].map(pc).fillna(0).astype(int)
     dfp["freq_mega_mapped"] = dfp["num"].map(pmapped).fillna(0).astype(int)
-    last_date_p = power_df["date"].dropna().iloc[-1] if not power_df.empty else None
+    last_date_p = power_df[_date_col(power_df)].dropna().iloc[-1] if not power_df.empty else None
     dfp["last_lunar_element"] = lunar_element_from_date(last_date_p) if last_date_p else ""
     dfp.to_csv(os.path.join(save_dir, "power_features.csv"), index=False)
 
@@ -0,0 +1,261 @@
+# utils/incremental.py
+"""
+Warm-start incremental retraining.
+
+Routine updates train only on the draws appended since the last fit:
+  - RandomForest (per-number): `warm_start` adds a few trees fitted on the most
+    recent rows and drops the same number of oldest trees;
+  - XGBoost (per-number): continues boosting from the saved booster;
+  - multi-hot models (utils.predict_advanced.MultiHotModel): LightGBM
+    continues from its booster, the MLP takes `partial_fit` passes.
+A full rebuild (utils.train_model.train_models_and_save) only happens when no
+state exists, when the last trained draw is no longer in the frame, on the
+FULL_RETRAIN_DAYS schedule or when the recent number frequencies drift away
+from the training reference. New draws are found by locating the last trained
+draw (date + numbers, `draw_key`) in the date-sorted frame, so a fetch window
+that slides (limit=400 drops the oldest draw) still updates incrementally.
+"""
+import os
+import json
+from datetime import datetime
+import joblib
+import numpy as np
+from utils.logger import log
+from utils.feature_store import data_fingerprint, cached_features, load_feature_spec, model_features
+from utils.feature_engine import draw_matrix, onehot_counts
+
+STATE_FILE = "pernum_state.json"
+FULL_RETRAIN_DAYS = 7
+# draws (not rows) the new trees of a warm-started forest are fitted on
+RECENT_STEPS = 60
+NEW_TREES_PER_DRAW = 5
+BOOST_ROUNDS_PER_DRAW = 5
+DRIFT_WINDOW = 50
+DRIFT_PVALUE = 0.001
+
+
+def sort_by_date(df):
+    """Oldest draw first, so new draws are appended at the end."""
+    col = "draw_date" if "draw_date" in df.columns else ("date" if "date" in df.columns else None)
+    if col is None:
+        return df.reset_index(drop=True)
+    return df.sort_values(col, kind="stable").reset_index(drop=True)
+
+
+def draw_key(df, i):
+    """'YYYY-MM-DD:n1,...,n6' of row `i`; identifies a draw across fetches."""
+    col = "draw_date" if "draw_date" in df.columns else ("date" if "date" in df.columns else None)
+    nums = draw_matrix(df.iloc[[i]], sort=False)[0]
+    return (str(df[col].iloc[i])[:10] if col else str(i)) + ":" + ",".join(str(int(v)) for v in nums if v == v)
+
+
+def draws_after(df, key):
+    """Number of rows of date-sorted `df` after the draw `key`, or None if it is not in the frame.
+
+    Searched from the end, so the cost is O(new draws).
+    """
+    if not key:
+        return None
+    for i in range(len(df) - 1, -1, -1):
+        if draw_key(df, i) == key:
+            return len(df) - 1 - i
+    return None
+
+
+def _state_path(models_dir):
+    return os.path.join(models_dir, STATE_FILE)
+
+
+def load_state(models_dir):
+    try:
+        with open(_state_path(models_dir), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def save_state(models_dir, mega_df, power_df, window, max_num, full=True, prev=None):
+    mega_df, power_df = sort_by_date(mega_df), sort_by_date(power_df)
+    state = {
+        "window": window,
+        "max_num": max_num,
+        "n_mega": len(mega_df),
+        "n_power": len(power_df),
+        "fp_mega": data_fingerprint(mega_df),
+        "fp_power": data_fingerprint(power_df),
+        "last_mega": draw_key(mega_df, len(mega_df) - 1) if len(mega_df) else None,
+        "last_power": draw_key(power_df, len(power_df) - 1) if len(power_df) else None,
+        "last_full": datetime.now().isoformat() if full or not prev else prev["last_full"],
+        "ref_freq": (number_frequencies(mega_df, max_num).tolist() if full or not prev else prev["ref_freq"]),
+    }
+    os.makedirs(models_dir, exist_ok=True)
+    tmp = _state_path(models_dir) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, _state_path(models_dir))
+    return state
+
+
+def number_frequencies(df, max_num, last=None):
+    draws = draw_matrix(df, sort=False)
+    if last:
+        draws = draws[-last:]
+    counts = onehot_counts(draws, max_num, dtype=np.int64).sum(axis=0)
+    return counts / max(counts.sum(), 1)
+
+
+def detect_drift(mega_df, state, window=DRIFT_WINDOW, pvalue=DRIFT_PVALUE):
+    """Chi-square test of the last `window` draws against the training reference frequencies."""
+    from scipy.stats import chisquare
+    max_num = state["max_num"]
+    draws = draw_matrix(mega_df, sort=False)[-window:]
+    observed = onehot_counts(draws, max_num, dtype=np.int64).sum(axis=0).astype(float)
+    ref = np.asarray(state["ref_freq"], dtype=float) + 1e-3
+    expected = ref / ref.sum() * observed.sum()
+    if observed.sum() == 0:
+        return False
+    return bool(chisquare(observed, expected).pvalue < pvalue)
+
+
+def plan_update(mega_df, power_df, state, window=50, max_num=45, full_every_days=FULL_RETRAIN_DAYS):
+    """Return ("full" | "incremental" | "none", reason)."""
+    if not state or state.get("window") != window or state.get("max_num") != max_num:
+        return "full", "no compatible state"
+    mega_df, power_df = sort_by_date(mega_df), sort_by_date(power_df)
+    new_mega, new_power = draws_after(mega_df, state.get("last_mega")), draws_after(power_df, state.get("last_power"))
+    if new_mega is None or new_power is None:
+        return "full", "last trained draw not in the data"
+    age = (datetime.now() - datetime.fromisoformat(state["last_full"])).total_seconds() / 86400
+    if age >= full_every_days:
+        return "full", f"scheduled ({age:.1f} days since full retrain)"
+    if detect_drift(mega_df, state):
+        return "full", "frequency drift detected"
+    if new_mega == 0 and new_power == 0:
+        return "none", "no new draws"
+    return "incremental", f"{new_mega} new draws"
+
+
+def refresh_forest(forest, X, y, n_new, recent=None):
+    """Add `n_new` trees with warm_start and drop the `n_new` oldest ones.
+
+    The new trees only learn from the last `recent` rows (all rows if None):
+    older rows get sample weight 0 instead of being sliced off, so the forest's
+    class set stays that of `y`. n_new is clamped below n_estimators, so at
+    least one original tree is kept.
+    """
+    n_keep = forest.n_estimators
+    n_new = int(min(n_new, n_keep - 1))
+    if n_new <= 0:
+        return forest
+    weight = None
+    if recent is not None and recent < len(y):
+        weight = np.zeros(len(y))
+        weight[-recent:] = 1.0
+    forest.set_params(warm_start=True, n_estimators=n_keep + n_new)
+    forest.fit(X, y, sample_weight=weight)
+    forest.estimators_ = forest.estimators_[n_new:]
+    forest.set_params(n_estimators=len(forest.estimators_), warm_start=False)
+    return forest
+
+
+def continue_boosting(model, X, y, n_rounds):
+    """Continue an XGBoost / LightGBM sklearn model from its current booster."""
+    if hasattr(model, "get_booster"):
+        booster = model.get_booster()
+        model.set_params(n_estimators=n_rounds)
+        model.fit(X, y, xgb_model=booster)
+    else:
+        booster = model.booster_
+        model.set_params(n_estimators=n_rounds)
+        model.fit(X, y, init_model=booster)
+    return model
+
+
+def incremental_update(mega_df, power_df, state, models_dir="models", new_steps=None):
+    """Update the saved per-number RF/XGB on draws appended since `state`; returns metrics.
+
+    new_steps: Mega draws appended since the state (default: located by its last draw key).
+    """
+    window, max_num = state["window"], state["max_num"]
+    mega_df, power_df = sort_by_date(mega_df), sort_by_date(power_df)
+    X, y = cached_features("pernum", mega_df, power_df, window=window, max_num=max_num)
+    if new_steps is None:
+        new_steps = draws_after(mega_df, state.get("last_mega")) or 0
+    new_steps = min(int(new_steps), len(X) // max_num if X is not None else 0)
+    metrics = {"mode": "incremental", "new_draws": int(new_steps)}
+    if new_steps <= 0:
+        return None, None, metrics
+
+    recent = max(RECENT_STEPS, new_steps) * max_num
+    X_new, y_new = np.asarray(X[-new_steps * max_num:]), np.asarray(y[-new_steps * max_num:])
+
+    rf_path = os.path.join(models_dir, "rf_pernum_mega.joblib")
+    if os.path.exists(rf_path):
+        rf = joblib.load(rf_path)
+        refresh_forest(rf, np.asarray(X), np.asarray(y), NEW_TREES_PER_DRAW * new_steps, recent=recent)
+        joblib.dump(rf, rf_path)
+    else:
+        rf_path = None
+
+    gb_path = os.path.join(models_dir, "gb_pernum_mega.joblib")
+    if os.path.exists(gb_path):
+        gb = joblib.load(gb_path)
+        continue_boosting(gb, X_new, y_new, BOOST_ROUNDS_PER_DRAW * new_steps)
+        joblib.dump(gb, gb_path)
+    else:
+        gb_path = None
+
+    save_state(models_dir, mega_df, power_df, window, max_num, full=False, prev=state)
+    log(f"    -> Cập nhật tăng dần {new_steps} kỳ mới (RF: {bool(rf_path)}, XGB: {bool(gb_path)})")
+    return rf_path, gb_path, metrics
+
+
+def update_multihot(path, df, new_draws, spec):
+    """Incrementally update a saved MultiHotModel on the last `new_draws` draws of `df`.
+
+    `spec` is the feature spec the model was trained on (see utils.feature_store).
+    """
+    if new_draws <= 0 or not spec or not os.path.exists(path):
+        return None
+    X, Y = model_features(spec, df)
+    if X is None:
+        return None
+    model = joblib.load(path)
+    model.update(np.asarray(X[-new_draws:]), np.asarray(Y[-new_draws:]), n_rounds=BOOST_ROUNDS_PER_DRAW * new_draws)
+    joblib.dump(model, path)
+    return model
+
+
+def update_or_retrain(mega_df, power_df, window=50, models_dir="models", full_every_days=FULL_RETRAIN_DAYS):
+    """Incremental update when possible, full rebuild otherwise; returns (model_path, boost_path, metrics).
+
+    The paths are RF / XGBoost, except after a chunked full rebuild (see train_models_and_save).
+    """
+    from utils.train_model import train_models_and_save
+    max_num = 45
+    state = load_state(models_dir)
+    mode, reason = plan_update(mega_df, power_df, state, window=window, max_num=max_num,
+                               full_every_days=full_every_days)
+    log(f"    -> Retrain mode: {mode} ({reason})")
+    if mode == "none":
+        return None, None, {"mode": "none", "reason": reason}
+    if mode == "incremental":
+        try:
+            new_mega = draws_after(sort_by_date(mega_df), state.get("last_mega"))
+            new_power = draws_after(sort_by_date(power_df), state.get("last_power"))
+            rf_p, gb_p, metrics = incremental_update(mega_df, power_df, state, models_dir=models_dir,
+                                                     new_steps=new_mega)
+            for game, df, new in (("mega", mega_df, new_mega), ("power", power_df, new_power)):
+                spec = load_feature_spec(os.path.join(models_dir, f"{game}_feature_spec.json"))
+                if update_multihot(os.path.join(models_dir, f"{game}_multihot.joblib"), df, new, spec) is not None:
+                    metrics[f"{game}_multihot"] = "updated"
+            return rf_p, gb_p, {**metrics, "reason": reason}
+        except Exception as e:
+            log(f"⚠ Incremental update failed, falling back to full retrain: {e}")
+            reason = f"incremental failed: {e}"
+
+    mega_s, power_s = sort_by_date(mega_df), sort_by_date(power_df)
+    model_p, boost_p, metrics = train_models_and_save(mega_s, power_s, window=window, save_dir=models_dir)
+    if model_p:
+        save_state(models_dir, mega_s, power_s, window, max_num, full=True)
+    return model_p, boost_p, {**(metrics or {}), "mode": "full", "reason": reason}
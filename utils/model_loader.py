@@ -0,0 +1,83 @@
+# utils/model_loader.py
+"""
+Loading saved ensemble models and their feature rows.
+
+Shared by main.py (daily report), service.py (long-lived service) and
+rank_combinations.py. Kept apart from main.py so importing it does not pull
+in utils.debug_wrapper, which dumps every fetched page to data/.
+"""
+import os
+import numpy as np
+from utils.logger import log
+from utils.feature_store import cached_features, load_feature_spec, next_features
+from utils.predict_advanced import load_model
+from utils.tf_export import load_numpy_model, matches_features
+from utils.tree_compiler import load_fresh_compiled
+from utils.model_registry import load_current, registry_is_newer
+
+# ensemble members in try_load_models order
+MODEL_KINDS = ["lgb", "cat", "mlp", "multihot"]
+
+
+def try_load_models(prefix):
+    """Per kind: compiled tree arrays, else the newer of the registry's current version (lazy)
+    and the loose joblib."""
+    models = []
+    for kind in MODEL_KINDS:
+        path = f"models/{prefix}_{kind}.joblib"
+        try:
+            # compiled tree arrays (mmap) when they are at least as new as the joblib
+            model = load_fresh_compiled(path) if os.path.exists(path) else None
+            # a joblib written after the last registered version (retrain / update) wins
+            if model is None and registry_is_newer(prefix, kind, path):
+                model = load_current(prefix, kind)
+            if model is None and os.path.exists(path):
+                model = load_model(path)
+            models.append(model)
+        except Exception as e:
+            log(f"⚠ Failed to load {prefix}/{kind}: {e}")
+            models.append(None)
+    return models
+
+
+def try_load_tf(prefix, feat_spec, feat):
+    """NumPy export of the Keras model (no TensorFlow import), if it was trained on the ensemble's features."""
+    path = f"models/{prefix}_tf_model.npz"
+    if not os.path.exists(path) or feat is None:
+        return None
+    try:
+        model = load_numpy_model(path)
+    except Exception as e:
+        log(f"⚠ Failed to load {path}: {e}")
+        return None
+    if not matches_features(model, feat_spec, len(feat)):
+        log(f"⚠ {path} was trained on other features; skipped in ensemble")
+        return None
+    return model
+
+
+def load_features(df, max_num, window=50):
+    try:
+        return cached_features("counts", df, window=window, max_num=max_num)
+    except Exception as e:
+        log(f"⚠ Build features failed (max_num={max_num}): {e}")
+        return None, None
+
+
+def ensemble_features(df, prefix, X_counts, window=50):
+    """Feature row for the next draw in the layout the saved ensemble was trained on.
+
+    Built from every draw in `df` (utils.feature_store.next_features): the last
+    training row ends one draw earlier. Without a saved spec the ensemble uses
+    window counts with the width of `X_counts`.
+    """
+    spec = load_feature_spec(f"models/{prefix}_feature_spec.json")
+    if spec is None:
+        if X_counts is None or len(X_counts) == 0:
+            return None
+        spec = {"feature_set": "counts", "params": {"window": window, "max_num": np.shape(X_counts)[-1]}}
+    try:
+        return next_features(spec, df)
+    except Exception as e:
+        log(f"⚠ Build {prefix} ensemble features failed: {e}")
+        return None
@@ -0,0 +1,221 @@
+# utils/model_registry.py
+"""
+Versioned model registry.
+
+Layout:
+
+    models/registry/<game>/<model>/<version>/model.joblib
+    models/registry/<game>/<model>/<version>/meta.json
+    models/registry/<game>/<model>/CURRENT                   (version name)
+    models/registry/manifest.json                            (index of all versions)
+
+Every version records the data fingerprint it was trained on, the feature
+spec, metrics, artifact size and (after the first load) load seconds.
+Artifacts are stored zlib-compressed so they are small to copy around, except
+models listed as array-heavy (RandomForest, compiled trees, ...): those are
+stored uncompressed (one copy only) and loaded with `mmap_mode="r"`. The
+CURRENT pointer is replaced atomically (tmp file +
+os.replace), so a reader never sees a half-written version.
+
+`load_current(..., lazy=True)` returns a `LazyModel` that only unpickles on
+first attribute access (predict / predict_proba / ...). `registry_is_newer`
+tells loaders whether the current version or a loose models/*.joblib written
+later (e.g. by an incremental update) should be served.
+"""
+import os
+import json
+import time
+import shutil
+import threading
+import joblib
+from datetime import datetime
+from utils.logger import log
+
+REGISTRY_DIR = "models/registry"
+COMPRESS = 3
+# estimators whose pickles are dominated by numpy arrays -> served via mmap
+MMAP_MODELS = ("RandomForestClassifier", "ExtraTreesClassifier", "CompiledModel", "MultiHotModel")
+KEEP_VERSIONS = 3
+_lock = threading.Lock()
+
+
+def _atomic_write(path, text):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _model_dir(game, name, registry_dir=REGISTRY_DIR):
+    return os.path.join(registry_dir, game, name)
+
+
+def _is_array_heavy(model):
+    ests = getattr(model, "estimators_", None)
+    if type(model).__name__ == "MultiOutputClassifier" and ests:
+        model = ests[0]
+    return type(model).__name__ in MMAP_MODELS
+
+
+def _read_json(path, default=None):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return default
+
+
+def _update_manifest(meta, registry_dir=REGISTRY_DIR):
+    path = os.path.join(registry_dir, "manifest.json")
+    with _lock:
+        manifest = _read_json(path, {"versions": []})
+        manifest["versions"] = [v for v in manifest["versions"]
+                                if (v["game"], v["model"], v["version"]) != (meta["game"], meta["model"], meta["version"])]
+        manifest["versions"].append(meta)
+        _atomic_write(path, json.dumps(manifest, indent=2, default=str))
+
+
+def load_manifest(registry_dir=REGISTRY_DIR):
+    return _read_json(os.path.join(registry_dir, "manifest.json"), {"versions": []})
+
+
+def register_model(model, game, name, fingerprint=None, feature_spec=None, metrics=None,
+                   registry_dir=REGISTRY_DIR, make_current=True):
+    """Store `model` as a new version of (game, name); returns the version name."""
+    version = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    if fingerprint:
+        version += f"-{fingerprint[:8]}"
+    base = _model_dir(game, name, registry_dir)
+    tmp = os.path.join(base, f".{version}.tmp-{os.getpid()}")
+    os.makedirs(tmp, exist_ok=True)
+    artifact = os.path.join(tmp, "model.joblib")
+    heavy = _is_array_heavy(model)
+    # array-heavy models stay uncompressed so they can be memory-mapped in place
+    joblib.dump(model, artifact, compress=0 if heavy else COMPRESS)
+    meta = {
+        "game": game, "model": name, "version": version, "class": type(model).__name__,
+        "fingerprint": fingerprint, "feature_spec": feature_spec, "metrics": metrics or {},
+        "size_bytes": os.path.getsize(artifact), "mmap": heavy,
+        "created": time.time(), "load_seconds": None,
+    }
+    _atomic_write(os.path.join(tmp, "meta.json"), json.dumps(meta, indent=2, default=str))
+    os.replace(tmp, os.path.join(base, version))
+    _update_manifest(meta, registry_dir)
+    if make_current:
+        set_current(game, name, version, registry_dir)
+    return version
+
+
+def set_current(game, name, version, registry_dir=REGISTRY_DIR):
+    base = _model_dir(game, name, registry_dir)
+    if not os.path.isdir(os.path.join(base, version)):
+        raise FileNotFoundError(f"No version {version} for {game}/{name}")
+    _atomic_write(os.path.join(base, "CURRENT"), version)
+
+
+def current_version(game, name, registry_dir=REGISTRY_DIR):
+    try:
+        with open(os.path.join(_model_dir(game, name, registry_dir), "CURRENT"), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def list_versions(game, name, registry_dir=REGISTRY_DIR):
+    base = _model_dir(game, name, registry_dir)
+    if not os.path.isdir(base):
+        return []
+    return sorted(v for v in os.listdir(base) if os.path.exists(os.path.join(base, v, "meta.json")))
+
+
+def version_meta(game, name, version, registry_dir=REGISTRY_DIR):
+    return _read_json(os.path.join(_model_dir(game, name, registry_dir), version, "meta.json"))
+
+
+def load_version(game, name, version, registry_dir=REGISTRY_DIR):
+    """Unpickle one version (mmap for array-heavy models) and record its load time."""
+    vdir = os.path.join(_model_dir(game, name, registry_dir), version)
+    meta = version_meta(game, name, version, registry_dir) or {}
+    t0 = time.perf_counter()
+    model = joblib.load(os.path.join(vdir, "model.joblib"), mmap_mode="r" if meta.get("mmap") else None)
+    if meta and meta.get("load_seconds") is None:
+        meta["load_seconds"] = round(time.perf_counter() - t0, 4)
+        try:
+            _atomic_write(os.path.join(vdir, "meta.json"), json.dumps(meta, indent=2, default=str))
+            _update_manifest(meta, registry_dir)
+        except OSError:
+            pass
+    return model
+
+
+class LazyModel:
+    """Proxy that loads a registry version on first attribute access."""
+
+    def __init__(self, game, name, version, registry_dir=REGISTRY_DIR):
+        self.game, self.name, self.version, self.registry_dir = game, name, version, registry_dir
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    self._model = load_version(self.game, self.name, self.version, self.registry_dir)
+        return self._model
+
+    @property
+    def meta(self):
+        return version_meta(self.game, self.name, self.version, self.registry_dir)
+
+    def __getattr__(self, attr):
+        # only called for attributes not found on the proxy itself
+        if attr.startswith("__") or attr in ("_model", "_load_lock"):
+            raise AttributeError(attr)
+        return getattr(self.model, attr)
+
+    def __repr__(self):
+        state = "loaded" if self._model is not None else "lazy"
+        return f"LazyModel({self.game}/{self.name}@{self.version}, {state})"
+
+
+def load_current(game, name, lazy=True, registry_dir=REGISTRY_DIR):
+    """Current version of (game, name), as a LazyModel by default; None if never registered."""
+    version = current_version(game, name, registry_dir)
+    if version is None:
+        return None
+    if lazy:
+        return LazyModel(game, name, version, registry_dir)
+    return load_version(game, name, version, registry_dir)
+
+
+def registry_is_newer(game, name, joblib_path, registry_dir=REGISTRY_DIR):
+    """True if (game, name) has a current version created no earlier than `joblib_path` was written
+    (or the file is missing); False if there is no version or the loose joblib is newer."""
+    version = current_version(game, name, registry_dir)
+    if version is None:
+        return False
+    created = (version_meta(game, name, version, registry_dir) or {}).get("created") or 0
+    try:
+        return created >= os.path.getmtime(joblib_path)
+    except OSError:
+        return True
+
+
+def prune(game, name, keep=KEEP_VERSIONS, registry_dir=REGISTRY_DIR):
+    """Delete all but the newest `keep` versions (the current one is always kept)."""
+    cur = current_version(game, name, registry_dir)
+    versions = list_versions(game, name, registry_dir)
+    removed = [v for v in versions[:-keep] if v != cur] if keep > 0 else [v for v in versions if v != cur]
+    for v in removed:
+        shutil.rmtree(os.path.join(_model_dir(game, name, registry_dir), v), ignore_errors=True)
+    if removed:
+        path = os.path.join(registry_dir, "manifest.json")
+        with _lock:
+            manifest = _read_json(path, {"versions": []})
+            manifest["versions"] = [m for m in manifest["versions"]
+                                    if not (m["game"] == game and m["model"] == name and m["version"] in removed)]
+            _atomic_write(path, json.dumps(manifest, indent=2, default=str))
+        log(f"    -> Registry {game}/{name}: removed {len(removed)} old version(s)")
+    return removed
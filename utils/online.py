@@ -0,0 +1,200 @@
+# utils/online.py
+"""
+Online predictors: per-draw updates, no refit.
+
+  markov     lag-l number-to-number transition counts C_l[i, j] = times j was
+             drawn l draws after i (l in LAGS). Score of j for the next draw:
+             mean over lags of (sum_{i in draw t-l} C_l[i, j] + a) /
+             (sum_{i in draw t-l} R_l[i] + a * max_num), R_l = row totals.
+  dirichlet  exponentially decayed counts (half-life HALF_LIFE draws) as a
+             Dirichlet posterior; score = posterior mean.
+
+One new draw costs O(lags * 6 * 6) for the Markov counts and O(max_num) for
+the decayed counts. State lives in models/online_{game}.npz together with the
+key of the last applied draw (date + numbers, utils.incremental.draw_key).
+update_online locates that draw in the date-sorted frame and applies only the
+rows after it, also when the fetch window slid and dropped old draws; the
+whole history is replayed only if the draw is not in the frame.
+
+Both expose `predict_scores` / `predict`, so they drop into ensemble_predict
+and the soft vote. Feature rows are ignored: the scores are always for the
+next draw after the state.
+"""
+import os
+import numpy as np
+from utils.logger import log
+from utils.feature_engine import draw_matrix
+from utils.incremental import sort_by_date, draw_key, draws_after
+
+LAGS = (1, 2, 3)
+HALF_LIFE = 30
+PRIOR = 1.0
+ONLINE_KINDS = ["markov", "dirichlet"]
+
+
+def _numbers(draw, max_num):
+    """0-based valid numbers of one draw row (NaN / out-of-range dropped)."""
+    d = np.asarray(draw, dtype=np.float64)
+    d = d[~np.isnan(d)].astype(np.int64)
+    return np.unique(d[(d >= 1) & (d <= max_num)]) - 1
+
+
+class _OnlineScorer:
+    """Common `predict` / `predict_scores` on top of `scores()` (one row, sums to 1)."""
+
+    def predict_scores(self, X=None):
+        n = 1 if X is None else len(np.asarray(X).reshape(-1, np.shape(X)[-1]))
+        return np.tile(self.scores(), (n, 1))
+
+    def predict(self, X=None, k=6):
+        scores = self.predict_scores(X)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k] + 1
+        return np.sort(top, axis=1)
+
+
+class MarkovScorer(_OnlineScorer):
+    def __init__(self, max_num=55, lags=LAGS, prior=PRIOR):
+        self.max_num = max_num
+        self.lags = tuple(int(l) for l in lags)
+        self.prior = prior
+        self.counts = np.zeros((len(self.lags), max_num, max_num))
+        self.history = []                       # last max(lags) draws, 0-based numbers
+
+    def update(self, draw):
+        nums = _numbers(draw, self.max_num)
+        for i, lag in enumerate(self.lags):
+            if len(self.history) >= lag:
+                prev = self.history[-lag]
+                self.counts[i][np.ix_(prev, nums)] += 1.0
+        self.history = (self.history + [nums])[-max(self.lags):]
+        return self
+
+    def scores(self):
+        out, used = np.zeros(self.max_num), 0
+        for i, lag in enumerate(self.lags):
+            if len(self.history) < lag:
+                continue
+            rows = self.counts[i][self.history[-lag]]
+            out += (rows.sum(axis=0) + self.prior) / (rows.sum() + self.prior * self.max_num)
+            used += 1
+        return out / used if used else np.full(self.max_num, 1.0 / self.max_num)
+
+    def state(self):
+        hist = np.full((max(self.lags), 6), -1, dtype=np.int16)
+        for r, nums in enumerate(self.history[::-1]):
+            hist[r, :len(nums)] = nums[:6]
+        return {"markov_counts": self.counts, "markov_lags": np.array(self.lags), "markov_history": hist}
+
+    @classmethod
+    def from_state(cls, st, max_num, prior=PRIOR):
+        m = cls(max_num, st["markov_lags"].tolist(), prior)
+        m.counts = np.array(st["markov_counts"], dtype=np.float64)
+        m.history = [row[row >= 0].astype(np.int64) for row in st["markov_history"][::-1] if (row >= 0).any()]
+        return m
+
+
+class DecayedDirichletScorer(_OnlineScorer):
+    def __init__(self, max_num=55, half_life=HALF_LIFE, prior=PRIOR):
+        self.max_num = max_num
+        self.half_life = float(half_life)
+        self.decay = 0.5 ** (1.0 / self.half_life)
+        self.prior = prior
+        self.counts = np.zeros(max_num)
+
+    def update(self, draw):
+        self.counts *= self.decay
+        self.counts[_numbers(draw, self.max_num)] += 1.0
+        return self
+
+    def scores(self):
+        alpha = self.counts + self.prior
+        return alpha / alpha.sum()
+
+    def state(self):
+        return {"dirichlet_counts": self.counts, "dirichlet_half_life": np.array(self.half_life)}
+
+    @classmethod
+    def from_state(cls, st, max_num, prior=PRIOR):
+        m = cls(max_num, float(st["dirichlet_half_life"]), prior)
+        m.counts = np.array(st["dirichlet_counts"], dtype=np.float64)
+        return m
+
+
+def online_path(game, models_dir="models"):
+    return os.path.join(models_dir, f"online_{game}.npz")
+
+
+def save_online(path, scorers, n_seen, last_key):
+    """Atomic write of every scorer's arrays plus the count and key of the last applied draw."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    arrays = {"n_seen": np.array(n_seen), "last_key": np.array(last_key), "max_num": np.array(scorers[0].max_num)}
+    for s in scorers:
+        arrays.update(s.state())
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+
+def load_online(path, max_num):
+    """(scorers in ONLINE_KINDS order, n_seen, last_key) or None if missing / unreadable / other game."""
+    try:
+        with np.load(path) as st:
+            if int(st["max_num"]) != max_num:
+                return None
+            scorers = [MarkovScorer.from_state(st, max_num), DecayedDirichletScorer.from_state(st, max_num)]
+            return scorers, int(st["n_seen"]), str(st["last_key"])
+    except Exception:
+        return None
+
+
+def update_online(game, df, max_num, models_dir="models", save=True):
+    """Bring the saved online scorers up to date with `df`; returns them in ONLINE_KINDS order.
+
+    Only draws after the saved last draw are applied; the whole history is
+    replayed when there is no state or that draw is not in `df`.
+    """
+    if df is None or len(df) == 0:
+        return [MarkovScorer(max_num), DecayedDirichletScorer(max_num)]
+    df = sort_by_date(df)
+    draws = draw_matrix(df, sort=False)
+    path = online_path(game, models_dir)
+    loaded = load_online(path, max_num)
+    n_new = None
+    if loaded is not None:
+        scorers, _, last_key = loaded
+        n_new = draws_after(df, last_key)
+    if n_new is None:
+        scorers, n_new = [MarkovScorer(max_num), DecayedDirichletScorer(max_num)], len(draws)
+    start = len(draws) - n_new
+    for draw in draws[start:]:
+        for s in scorers:
+            s.update(draw)
+    if n_new:
+        log(f"🔹 Online {game}: applied {n_new} draws ({'incremental' if start else 'full replay'})")
+        if save:
+            try:
+                save_online(path, scorers, len(draws), draw_key(df, len(draws) - 1))
+            except Exception as e:
+                log(f"⚠ Save online state for {game} failed: {e}")
+    return scorers
+
+
+def replay_scores(draws, start, max_num):
+    """Per ONLINE_KINDS, a (len(draws) - start) x max_num array: row j = scores for draw start + j
+    after seeing only the draws before it (held-out scores for learn_ensemble_weights)."""
+    scorers = [MarkovScorer(max_num), DecayedDirichletScorer(max_num)]
+    out = [np.empty((max(len(draws) - start, 0), max_num)) for _ in scorers]
+    for t, draw in enumerate(draws):
+        if t >= start:
+            for o, s in zip(out, scorers):
+                o[t - start] = s.scores()
+        for s in scorers:
+            s.update(draw)
+    return out
+
+
+def online_predict(scorers, k=6):
+    """Top-k of the mean online scores (sorted 1-based numbers)."""
+    scores = np.mean([s.scores() for s in scorers], axis=0)
+    return sorted(int(i) + 1 for i in np.argsort(-scores, kind="stable")[:k])
@@ -0,0 +1,283 @@
+# utils/out_of_core.py
+"""
+Out-of-core training for the per-number model.
+
+`utils.train_model.build_Xy` materialises max_num float64 rows per draw. With
+full history, several windows and both games that no longer fits comfortably
+in memory, so the chunked mode here:
+
+  1. streams the per-number rows block by block (float32) into a memory-mapped
+     feature store entry (same X.npy / Y.npy / meta.json layout and eviction as
+     utils.feature_store), only ever holding the O(draws x 55) prefix sums and
+     one block in RAM;
+  2. trains incremental learners over the blocks: SGD and MLP via
+     `partial_fit` (after a streaming StandardScaler pass), LightGBM by
+     chunked boosting (each block adds rounds on top of the previous booster)
+     and XGBoost from a DataIter in external-memory mode when installed (the
+     native Booster from xgb.train, wrapped by BoosterModel for predict_proba).
+
+The last VAL_FRACTION of the draws is held out (time order) and scored block
+by block, so peak memory is bounded by `block_steps` regardless of history
+length.
+"""
+import os
+import json
+import time
+import shutil
+import numpy as np
+from utils.logger import log
+from utils.feature_engine import draw_matrix, prefix_counts
+from utils.feature_store import STORE_DIR, feature_key, evict
+
+HAS_LGB = False
+try:
+    from lightgbm import LGBMClassifier
+    HAS_LGB = True
+except Exception:
+    HAS_LGB = False
+HAS_XGB = False
+try:
+    import xgboost as xgb
+    HAS_XGB = True
+except Exception:
+    HAS_XGB = False
+
+# draws per block; one block holds block_steps * max_num rows
+BLOCK_STEPS = 256
+VAL_FRACTION = 0.2
+EPOCHS = 3
+LGB_ROUNDS_PER_BLOCK = 20
+XGB_ROUNDS = 200
+# build_Xy above this many bytes (float64) switches train_models_and_save to chunked mode
+CHUNKED_THRESHOLD_BYTES = 256 * 1024 * 1024
+
+
+def pernum_nbytes(n_steps, max_num=45, windows=(50,)):
+    """Size of the in-memory float64 build_Xy matrix for `n_steps` draws."""
+    return n_steps * max_num * 4 * len(windows) * 8
+
+
+def _pernum_block(m_prefix, p_prefix, m_draws, steps, windows, max_num):
+    """Per-number rows (float32) and labels for draw indices `steps`."""
+    k = min(max_num, 55)
+    feats = []
+    for w in windows:
+        m_c = (m_prefix[steps] - m_prefix[steps - w]).astype(np.float32)
+        p_c = np.zeros_like(m_c)
+        p_c[:, :k] = (p_prefix[steps] - p_prefix[steps - w])[:, :k]
+        denom = w * 6
+        feats += [m_c, p_c, m_c / denom, p_c / denom]
+    X = np.stack(feats, axis=2).reshape(-1, 4 * len(windows))
+
+    nxt = m_draws[steps]
+    y = np.zeros((len(steps), max_num), dtype=np.int8)
+    complete = ~np.isnan(nxt).any(axis=1)
+    rows, cols = np.nonzero(complete[:, None] & ~np.isnan(nxt))
+    vals = nxt[rows, cols].astype(np.int64)
+    ok = (vals >= 1) & (vals <= max_num)
+    y[rows[ok], vals[ok] - 1] = 1
+    return X, y.reshape(-1)
+
+
+def pernum_memmap(mega_df, power_df, windows=(50,), max_num=45, store_dir=STORE_DIR, block_steps=BLOCK_STEPS):
+    """Per-number features for every window in `windows`, as read-only memmaps (X float32, y int8).
+
+    Row layout per window: [mega_count, power_count, mega_count/(w*6), power_count/(w*6)],
+    DataFrame order kept (as `build_pernum_features`); the first step is max(windows).
+    Returns (None, None) if there are not enough rows.
+    """
+    windows = tuple(int(w) for w in windows)
+    key, spec = feature_key("pernum_ooc", [mega_df, power_df], windows=list(windows), max_num=max_num)
+    path = os.path.join(store_dir, key)
+    if os.path.exists(os.path.join(path, "meta.json")):
+        os.utime(os.path.join(path, "meta.json"))
+        return (np.load(os.path.join(path, "X.npy"), mmap_mode="r"),
+                np.load(os.path.join(path, "Y.npy"), mmap_mode="r"))
+
+    minlen = min(len(mega_df), len(power_df))
+    start = max(windows)
+    if minlen <= start:
+        return None, None
+    m_draws = draw_matrix(mega_df, sort=False)[:minlen]
+    p_draws = draw_matrix(power_df, sort=False)[:minlen]
+    m_prefix, p_prefix = prefix_counts(m_draws, max_num), prefix_counts(p_draws, 55)
+    n_rows = (minlen - start) * max_num
+
+    tmp = f"{path}.tmp-{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+    X = np.lib.format.open_memmap(os.path.join(tmp, "X.npy"), mode="w+", dtype=np.float32,
+                                  shape=(n_rows, 4 * len(windows)))
+    y = np.lib.format.open_memmap(os.path.join(tmp, "Y.npy"), mode="w+", dtype=np.int8, shape=(n_rows,))
+    for lo in range(start, minlen, block_steps):
+        steps = np.arange(lo, min(lo + block_steps, minlen))
+        Xb, yb = _pernum_block(m_prefix, p_prefix, m_draws, steps, windows, max_num)
+        r0 = (lo - start) * max_num
+        X[r0:r0 + len(Xb)] = Xb
+        y[r0:r0 + len(yb)] = yb
+    X.flush()
+    y.flush()
+    del X, y
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({**spec, "created": time.time(), "X_shape": [n_rows, 4 * len(windows)]}, f, default=str)
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+    evict(store_dir)
+    return (np.load(os.path.join(path, "X.npy"), mmap_mode="r"),
+            np.load(os.path.join(path, "Y.npy"), mmap_mode="r"))
+
+
+def iter_blocks(X, y, block_rows, lo=0, hi=None, order=None):
+    """Yield (X_block float32, y_block) copies of rows [lo, hi) in blocks of `block_rows`."""
+    hi = len(X) if hi is None else hi
+    starts = np.arange(lo, hi, block_rows)
+    if order is not None:
+        starts = starts[order(len(starts))]
+    for s in starts:
+        e = min(s + block_rows, hi)
+        yield np.asarray(X[s:e], dtype=np.float32), np.asarray(y[s:e])
+
+
+def _scaler(X, y, block_rows, hi):
+    from sklearn.preprocessing import StandardScaler
+    sc = StandardScaler()
+    for Xb, _ in iter_blocks(X, y, block_rows, 0, hi):
+        sc.partial_fit(Xb)
+    return sc
+
+
+def train_partial_fit(kind, X, y, block_rows, hi, epochs=EPOCHS, random_state=42):
+    """SGD (log-loss) or MLP trained with `partial_fit` over shuffled blocks; returns a fitted Pipeline."""
+    from sklearn.pipeline import Pipeline
+    if kind == "sgd":
+        from sklearn.linear_model import SGDClassifier
+        est = SGDClassifier(loss="log_loss", alpha=1e-4, random_state=random_state)
+    elif kind == "mlp":
+        from sklearn.neural_network import MLPClassifier
+        est = MLPClassifier(hidden_layer_sizes=(32, 16), random_state=random_state)
+    else:
+        raise ValueError(f"Unknown partial_fit kind: {kind}")
+    sc = _scaler(X, y, block_rows, hi)
+    rng = np.random.default_rng(random_state)
+    for _ in range(epochs):
+        for Xb, yb in iter_blocks(X, y, block_rows, 0, hi, order=rng.permutation):
+            est.partial_fit(sc.transform(Xb), yb, classes=np.array([0, 1]))
+    return Pipeline([("scale", sc), (kind, est)])
+
+
+def train_lgb_chunked(X, y, block_rows, hi, rounds_per_block=LGB_ROUNDS_PER_BLOCK, random_state=42):
+    """Chunked boosting: each block adds `rounds_per_block` trees on top of the previous booster."""
+    if not HAS_LGB:
+        raise RuntimeError("LightGBM not available")
+    model = LGBMClassifier(n_estimators=rounds_per_block, random_state=random_state, verbose=-1)
+    booster = None
+    for Xb, yb in iter_blocks(X, y, block_rows, 0, hi):
+        if len(np.unique(yb)) < 2:
+            continue
+        model.fit(Xb, yb, init_model=booster)
+        booster = model.booster_
+    return model
+
+
+class BoosterModel:
+    """Binary native xgb.Booster behind the sklearn-style predict_proba / predict used here."""
+
+    classes_ = np.array([0, 1])
+
+    def __init__(self, booster):
+        self.booster = booster
+
+    def predict_proba(self, X):
+        p = self.booster.predict(xgb.DMatrix(np.asarray(X, dtype=np.float32)))
+        return np.column_stack([1.0 - p, p])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] >= 0.5).astype(np.int64)
+
+
+def train_xgb_external(X, y, block_rows, hi, cache_dir, n_rounds=XGB_ROUNDS, random_state=42):
+    """XGBoost on an external-memory DMatrix fed block by block from a DataIter; returns a BoosterModel."""
+    if not HAS_XGB:
+        raise RuntimeError("XGBoost not available")
+
+    class _BlockIter(xgb.DataIter):
+        def __init__(self):
+            self._blocks = None
+            super().__init__(cache_prefix=os.path.join(cache_dir, "xgb-cache"))
+
+        def next(self, input_data):
+            if self._blocks is None:
+                self._blocks = iter_blocks(X, y, block_rows, 0, hi)
+            try:
+                Xb, yb = next(self._blocks)
+            except StopIteration:
+                return 0
+            input_data(data=Xb, label=yb.astype(np.float32))
+            return 1
+
+        def reset(self):
+            self._blocks = None
+
+    os.makedirs(cache_dir, exist_ok=True)
+    dtrain = xgb.DMatrix(_BlockIter())
+    booster = xgb.train({"objective": "binary:logistic", "tree_method": "hist", "eval_metric": "logloss",
+                         "seed": random_state, "verbosity": 0}, dtrain, num_boost_round=n_rounds)
+    return BoosterModel(booster)
+
+
+def score_blocks(model, X, y, block_rows, lo, hi):
+    """Streaming accuracy and log-loss on rows [lo, hi)."""
+    n, correct, loss = 0, 0, 0.0
+    for Xb, yb in iter_blocks(X, y, block_rows, lo, hi):
+        p = np.clip(model.predict_proba(Xb)[:, 1], 1e-7, 1 - 1e-7)
+        correct += int(((p >= 0.5) == yb).sum())
+        loss -= float(np.sum(yb * np.log(p) + (1 - yb) * np.log(1 - p)))
+        n += len(yb)
+    return {"acc": correct / max(n, 1), "logloss": loss / max(n, 1)}
+
+
+def train_pernum_chunked(mega_df, power_df, window=50, save_dir="models", max_num=45, windows=None,
+                         kinds=("lgb", "sgd", "mlp", "xgb"), block_steps=BLOCK_STEPS, store_dir=STORE_DIR):
+    """Train the per-number learners out of core; returns ({kind: saved path}, metrics).
+
+    Draws must be oldest first; the last VAL_FRACTION of the steps is the
+    validation slice.
+    """
+    import joblib
+    windows = tuple(windows or (window,))
+    X, y = pernum_memmap(mega_df, power_df, windows=windows, max_num=max_num, store_dir=store_dir,
+                         block_steps=block_steps)
+    if X is None:
+        log(f"    -> Không đủ dữ liệu cho window={max(windows)}.")
+        return {}, {}
+    n_steps = len(X) // max_num
+    hi = int(n_steps * (1 - VAL_FRACTION)) * max_num
+    block_rows = block_steps * max_num
+    log(f"    -> Chunked per-number: X={X.shape} float32 (memmap), block={block_rows} rows")
+
+    trainers = {
+        "lgb": lambda: train_lgb_chunked(X, y, block_rows, hi),
+        "sgd": lambda: train_partial_fit("sgd", X, y, block_rows, hi),
+        "mlp": lambda: train_partial_fit("mlp", X, y, block_rows, hi),
+        "xgb": lambda: train_xgb_external(X, y, block_rows, hi, os.path.join(store_dir, "xgb_cache")),
+    }
+    paths, metrics = {}, {"rows": int(len(X)), "windows": list(windows)}
+    for kind in kinds:
+        if (kind == "lgb" and not HAS_LGB) or (kind == "xgb" and not HAS_XGB):
+            continue
+        try:
+            t0 = time.perf_counter()
+            model = trainers[kind]()
+            secs = time.perf_counter() - t0
+            val = score_blocks(model, X, y, block_rows, hi, len(X))
+            path = os.path.join(save_dir, f"{kind}_pernum_chunked_mega.joblib")
+            os.makedirs(save_dir, exist_ok=True)
+            joblib.dump(model, path)
+            paths[kind] = path
+            metrics[f"acc_{kind}"], metrics[f"logloss_{kind}"] = val["acc"], val["logloss"]
+            metrics[f"seconds_{kind}"] = round(secs, 3)
+            log(f"    -> {kind}: acc={val['acc']:.4f} logloss={val['logloss']:.4f} ({secs:.1f}s)")
+        except Exception as e:
+            log(f"⚠ Chunked {kind} failed: {e}")
+    return paths, metrics
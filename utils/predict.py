@@ -1,30 +1,81 @@
 # utils/predict.py
+import os
+import joblib
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.multioutput import MultiOutputClassifier
+from utils.feature_engine import build_window_features
 
 def build_features(df, window=50, max_num=55):
     """Return X (n_samples x max_num) and Y (n_samples x 6) or (None,None)."""
-    df = df.sort_values("draw_date").reset_index(drop=True)
-    if len(df) <= window:
-        return None, None
-    X, Y = [], []
-    for i in range(window, len(df)):
-        prev = df.iloc[i-window:i]
-        counts = np.zeros(max_num, dtype=int)
-        for c in range(1,7):
-            for v in prev[f"n{c}"].dropna().astype(int).tolist():
-                if 1 <= v <= max_num:
-                    counts[v-1] += 1
-        X.append(counts)
-        Y.append(df.loc[i, [f"n{j}" for j in range(1,7)]].astype(int).values)
-    return np.vstack(X), np.vstack(Y)
-
-def train_multioutput_rf(X, Y, n_estimators=200, random_state=42):
-    clf = MultiOutputClassifier(RandomForestClassifier(n_estimators=n_estimators, random_state=random_state, n_jobs=-1))
+    # compact uint16 counts; estimators convert to float32 themselves
+    return build_window_features(df, window=window, max_num=max_num)
+
+def train_multioutput_rf(X, Y, n_estimators=200, random_state=42, n_jobs=-1):
+    clf = MultiOutputClassifier(RandomForestClassifier(n_estimators=n_estimators, random_state=random_state, n_jobs=n_jobs))
     clf.fit(X, Y)
     return clf
 
+# on-the-fly RF cache: models/<name>_rf_onthefly.joblib
+ONTHEFLY_DIR = "models"
+# up to this many appended draws the cached forest is refreshed instead of refitted
+MAX_REFRESH_DRAWS = 10
+REFRESH_TREES_PER_DRAW = 5
+# feature rows before the appended ones that the refreshed trees also learn from
+RECENT_ROWS = 60
+
+def onthefly_rf(df, X, Y, name, window=50, n_estimators=200, random_state=42, models_dir=ONTHEFLY_DIR,
+                max_refresh_draws=MAX_REFRESH_DRAWS):
+    """On-the-fly MultiOutput RF, reused across runs.
+
+    The fitted model is stored with the fingerprint of the (date-sorted) draws,
+    the key of its last draw (utils.incremental.draw_key) and its training params:
+      - same fingerprint and params: the cached model is returned as is;
+      - the cached last draw is found in the new frame with only a few draws
+        after it (also when the fetch window slid and dropped old draws): each
+        position's forest gets REFRESH_TREES_PER_DRAW new trees per draw
+        (warm_start), fitted on the appended and RECENT_ROWS rows only, and
+        drops as many of its oldest ones, provided the class set is unchanged;
+      - anything else: cold fit.
+    Returns (model, mode) with mode in {"cached", "refreshed", "trained"}.
+    """
+    from utils.feature_store import data_fingerprint
+    from utils.incremental import sort_by_date, refresh_forest, draw_key, draws_after
+    path = os.path.join(models_dir, f"{name}_rf_onthefly.joblib")
+    df = sort_by_date(df)
+    params = {"window": window, "n_estimators": n_estimators, "random_state": random_state,
+              "n_features": int(X.shape[1])}
+    fp = data_fingerprint(df)
+    try:
+        cache = joblib.load(path)
+    except Exception:
+        cache = None
+
+    model, mode = None, "trained"
+    if cache and cache["params"] == params:
+        if cache["fingerprint"] == fp:
+            return cache["model"], "cached"
+        n_new = draws_after(df, cache.get("last_key"))
+        if n_new is not None and 0 < n_new <= max_refresh_draws:
+            model = cache["model"]
+            X, Y = np.asarray(X), np.asarray(Y)
+            if all(np.array_equal(np.unique(Y[:, i]), est.classes_) for i, est in enumerate(model.estimators_)):
+                recent = min(n_new + RECENT_ROWS, len(Y))
+                for i, est in enumerate(model.estimators_):
+                    refresh_forest(est, X, Y[:, i], REFRESH_TREES_PER_DRAW * n_new, recent=recent)
+                mode = "refreshed"
+            else:
+                model = None
+    if model is None:
+        model = train_multioutput_rf(X, Y, n_estimators=n_estimators, random_state=random_state)
+
+    os.makedirs(models_dir, exist_ok=True)
+    tmp = f"{path}.tmp-{os.getpid()}"
+    joblib.dump({"model": model, "fingerprint": fp, "n_draws": len(df), "params": params,
+                 "last_key": draw_key(df, len(df) - 1) if len(df) else None}, tmp)
+    os.replace(tmp, path)
+    return model, mode
+
 def predict_next(model, last_feat):
     pred = model.predict(last_feat.reshape(1,-1))[0].tolist()
     # remove duplicates while preserving order
@@ -1,10 +1,12 @@
 # utils/predict_advanced.py
 import os
+import time
 import joblib
 import numpy as np
 import pandas as pd
 from collections import Counter
 from sklearn.multioutput import MultiOutputClassifier
+from utils.feature_engine import build_window_features, multi_hot
 
 # optional libs
 HAS_LGB = False
@@ -21,47 +23,197 @@ except Exception:
     HAS_CAT = False
 
 def build_count_features(df, window=50, max_num=55):
-    df = df.sort_values("draw_date").reset_index(drop=True)
-    if len(df) <= window:
-        return None, None
-    X, Y = [], []
-    for i in range(window, len(df)):
-        prev = df.iloc[i-window:i]
-        counts = np.zeros(max_num, dtype=int)
-        for c in range(1,7):
-            for v in prev[f"n{c}"].dropna().astype(int).tolist():
-                if 1 <= v <= max_num:
-                    counts[v-1] += 1
-        X.append(counts)
-        Y.append(df.loc[i, [f"n{j}" for j in range(1,7)]].astype(int).values)
-    return np.vstack(X), np.vstack(Y)
-
-def train_lightgbm(X, Y, n_estimators=100, random_state=42):
-    if not HAS_LGB:
-        raise RuntimeError("LightGBM not available")
-    base = LGBMClassifier(n_estimators=n_estimators, random_state=random_state, n_jobs=-1)
+    # compact uint16 counts; estimators convert to float32 themselves
+    return build_window_features(df, window=window, max_num=max_num)
+
+# optional hyperparameters forwarded by make_estimator (e.g. from utils.tuning)
+EXTRA_PARAMS = {
+    "lgb": ("num_leaves", "learning_rate", "min_child_samples"),
+    "cat": ("depth", "learning_rate"),
+    "mlp": ("alpha", "learning_rate_init"),
+}
+
+def make_estimator(kind, threads=-1, random_state=42, **params):
+    """Single-output base estimator for `kind` in {"lgb", "cat", "mlp"}.
+
+    `threads` caps the estimator's own thread pool (LightGBM n_jobs, CatBoost
+    thread_count); the MLP runs on BLAS threads, which callers limit externally.
+    """
+    extra = {k: params[k] for k in EXTRA_PARAMS.get(kind, ()) if k in params}
+    if kind == "lgb":
+        if not HAS_LGB:
+            raise RuntimeError("LightGBM not available")
+        return LGBMClassifier(n_estimators=params.get("n_estimators", 100), random_state=random_state, n_jobs=threads, **extra)
+    if kind == "cat":
+        if not HAS_CAT:
+            raise RuntimeError("CatBoost not available")
+        return CatBoostClassifier(iterations=params.get("iterations", 100), random_state=random_state,
+                                  verbose=params.get("verbose", False), task_type="CPU", thread_count=threads,
+                                  allow_writing_files=False, **extra)
+    if kind == "mlp":
+        from sklearn.neural_network import MLPClassifier
+        return MLPClassifier(hidden_layer_sizes=params.get("hidden_layer_sizes", (128,64)),
+                             max_iter=params.get("max_iter", 200), random_state=random_state, **extra)
+    raise ValueError(f"Unknown model kind: {kind}")
+
+def assemble_multioutput(base, estimators, n_features):
+    """Wrap per-position estimators fitted elsewhere into a fitted MultiOutputClassifier."""
+    moc = MultiOutputClassifier(base)
+    moc.estimators_ = list(estimators)
+    moc.n_features_in_ = n_features
+    return moc
+
+def train_lightgbm(X, Y, n_estimators=100, random_state=42, **params):
+    base = make_estimator("lgb", n_estimators=n_estimators, random_state=random_state, **params)
     moc = MultiOutputClassifier(base, n_jobs=1)
     moc.fit(X, Y)
     return moc
 
-def train_catboost(X, Y, iterations=100, random_state=42, verbose=False):
-    if not HAS_CAT:
-        raise RuntimeError("CatBoost not available")
-    base = CatBoostClassifier(iterations=iterations, random_state=random_state, verbose=verbose, task_type="CPU")
+def train_catboost(X, Y, iterations=100, random_state=42, verbose=False, **params):
+    base = make_estimator("cat", iterations=iterations, random_state=random_state, verbose=verbose, **params)
     moc = MultiOutputClassifier(base)
     moc.fit(X, Y)
     return moc
 
-def train_mlp(X, Y, hidden_layer_sizes=(128,64), max_iter=200, random_state=42):
-    from sklearn.neural_network import MLPClassifier
-    base = MLPClassifier(hidden_layer_sizes=hidden_layer_sizes, max_iter=max_iter, random_state=random_state)
+def train_mlp(X, Y, hidden_layer_sizes=(128,64), max_iter=200, random_state=42, **params):
+    base = make_estimator("mlp", hidden_layer_sizes=hidden_layer_sizes, max_iter=max_iter, random_state=random_state, **params)
     moc = MultiOutputClassifier(base)
     moc.fit(X, Y)
     return moc
 
+def train_early_stopping(kind, X, Y, budget_s=None, patience=None, val_fraction=None, threads=-1,
+                         random_state=42, **params):
+    """Fit one `kind` estimator per output position with early stopping on the most
+    recent `val_fraction` of the (oldest-first) rows and a shared wall-clock budget.
+
+    Returns (MultiOutputClassifier, mean iterations used, max iterations).
+    """
+    from utils import early_stopping as es
+    budget_s = es.TIME_BUDGET_S if budget_s is None else budget_s
+    patience = es.PATIENCE if patience is None else patience
+    X, Y = np.asarray(X), np.asarray(Y)
+    X_fit, Y_fit, X_val, Y_val = es.time_split(X, Y, es.VAL_FRACTION if val_fraction is None else val_fraction)
+    deadline = time.monotonic() + budget_s
+    estimators, n_iters, max_iter = [], [], None
+    for pos in range(Y.shape[1]):
+        est = make_estimator(kind, threads=threads, random_state=random_state, **params)
+        # positions still to fit share what is left of the budget
+        share = max(deadline - time.monotonic(), 0) / (Y.shape[1] - pos)
+        est, n_iter, max_iter = es.FITTERS[kind](est, X_fit, Y_fit[:, pos], X_val, Y_val[:, pos],
+                                                 budget_s=share, patience=patience)
+        estimators.append(est)
+        n_iters.append(n_iter)
+    base = make_estimator(kind, threads=threads, random_state=random_state, **params)
+    return assemble_multioutput(base, estimators, X.shape[1]), float(np.mean(n_iters)), max_iter
+
+class MultiHotModel:
+    """One model for the whole "appears in next draw" multi-hot vector.
+
+    Replaces 6 x MultiOutputClassifier positions (each a 45/55-class problem)
+    with a single learner over per-number scores:
+      - "mlp": MLPClassifier fitted natively on the multi-hot target;
+      - "lgb" / "hgb": one binary booster on a long (draw x number) layout whose
+        rows are the number's own features, the draw-wide mean per feature
+        scale and the number itself.
+    `predict_scores` returns (n x max_num) probabilities; `predict` returns the
+    sorted top-6 numbers so the model drops into `ensemble_predict`.
+    """
+
+    def __init__(self, kind="lgb", max_num=55, random_state=42, **params):
+        self.kind = kind
+        self.max_num = max_num
+        self.random_state = random_state
+        self.params = params
+        self.model_ = None
+
+    def _long(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        n = len(X)
+        X3 = X.reshape(n, -1, self.max_num)
+        own = X3.transpose(0, 2, 1)                                   # n x max_num x scales
+        mean = np.broadcast_to(X3.mean(axis=2)[:, None, :], own.shape)
+        num = np.broadcast_to(np.arange(1, self.max_num + 1, dtype=np.float32)[None, :, None], (n, self.max_num, 1))
+        return np.concatenate([own, mean, num], axis=2).reshape(n * self.max_num, -1)
+
+    def fit(self, X, Y, budget_s=None, patience=None, val_fraction=None):
+        """Fit with early stopping on the most recent `val_fraction` of the draws and a
+        wall-clock budget (utils.early_stopping); sets n_iter_ / max_iter_."""
+        from utils import early_stopping as es
+        budget_s = es.TIME_BUDGET_S if budget_s is None else budget_s
+        patience = es.PATIENCE if patience is None else patience
+        X = np.asarray(X, dtype=np.float32)
+        target = multi_hot(Y, self.max_num)
+        X_fit, T_fit, X_val, T_val = es.time_split(X, target, es.VAL_FRACTION if val_fraction is None else val_fraction)
+        if self.kind == "mlp":
+            from sklearn.neural_network import MLPClassifier
+            est = MLPClassifier(hidden_layer_sizes=self.params.get("hidden_layer_sizes", (128,64)),
+                                max_iter=self.params.get("max_iter", 200), random_state=self.random_state)
+            self.model_, self.n_iter_, self.max_iter_ = es.fit_mlp(est, X_fit, T_fit, X_val, T_val,
+                                                                   budget_s=budget_s, patience=patience)
+            return self
+        if self.kind == "lgb":
+            params = {k: v for k, v in self.params.items() if k != "threads"}
+            est = make_estimator("lgb", threads=self.params.get("threads", -1),
+                                 random_state=self.random_state, **params)
+        elif self.kind == "hgb":
+            from sklearn.ensemble import HistGradientBoostingClassifier
+            est = HistGradientBoostingClassifier(max_iter=self.params.get("n_estimators", 100),
+                                                 learning_rate=self.params.get("learning_rate", 0.1),
+                                                 random_state=self.random_state)
+        else:
+            raise ValueError(f"Unknown multi-hot model kind: {self.kind}")
+        # the (draw x number) layout of both slices keeps the split time-ordered
+        self.model_, self.n_iter_, self.max_iter_ = es.FITTERS[self.kind](
+            est, self._long(X_fit), T_fit.reshape(-1), self._long(X_val), T_val.reshape(-1),
+            budget_s=budget_s, patience=patience)
+        return self
+
+    def update(self, X_new, Y_new, n_rounds=20):
+        """Incremental update on newly appended draws without a cold refit.
+
+        LightGBM continues boosting from the current booster, HGB adds
+        iterations via warm_start and the MLP takes `partial_fit` passes.
+        """
+        target = multi_hot(Y_new, self.max_num)
+        if self.kind == "mlp":
+            Xf = np.asarray(X_new, dtype=np.float32)
+            for _ in range(n_rounds):
+                self.model_.partial_fit(Xf, target)
+            return self
+        Xl, yl = self._long(X_new), target.reshape(-1)
+        if self.kind == "lgb":
+            booster = self.model_.booster_
+            self.model_.set_params(n_estimators=n_rounds)
+            self.model_.fit(Xl, yl, init_model=booster)
+        else:
+            self.model_.set_params(warm_start=True, max_iter=self.model_.max_iter + n_rounds)
+            self.model_.fit(Xl, yl)
+        return self
+
+    def predict_scores(self, X):
+        X = np.asarray(X).reshape(-1, np.shape(X)[-1])
+        if self.kind == "mlp":
+            return self.model_.predict_proba(np.asarray(X, dtype=np.float32))
+        return self.model_.predict_proba(self._long(X))[:, 1].reshape(len(X), self.max_num)
+
+    def predict(self, X, k=6):
+        scores = self.predict_scores(X)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k] + 1
+        return np.sort(top, axis=1)
+
+def train_multihot(X, Y, max_num=55, kind="lgb", budget_s=None, patience=None, **params):
+    """MultiHotModel fitted with early stopping and a wall-clock budget (see MultiHotModel.fit)."""
+    return MultiHotModel(kind=kind, max_num=max_num, **params).fit(X, Y, budget_s=budget_s, patience=patience)
+
 def ensemble_predict(models, X_last, max_num=55):
-    """Ensemble via majority vote per position, then fix duplicates."""
+    """Ensemble via majority vote per position, then fix duplicates.
+
+    Models exposing `predict_scores` (e.g. MultiHotModel) also vote with their
+    top-6, and their summed per-number scores rank the candidates used to fill
+    missing or duplicate positions.
+    """
     preds_per_model = []
+    scores = np.zeros(max_num)
     for m in models:
         if m is None:
             preds_per_model.append(None)
@@ -69,6 +221,8 @@ def ensemble_predict(models, X_last, max_num=55):
         try:
             p = m.predict(X_last.reshape(1,-1))[0].tolist()
             preds_per_model.append([int(x) for x in p])
+            if hasattr(m, "predict_scores"):
+                scores += np.asarray(m.predict_scores(X_last.reshape(1,-1))[0])[:max_num]
         except Exception:
             preds_per_model.append(None)
 
@@ -81,12 +235,14 @@ def ensemble_predict(models, X_last, max_num=55):
         c = Counter(votes)
         final.append(c.most_common(1)[0][0])
 
-    # fill None using overall vote frequency
+    # fill None using overall vote frequency, ties broken by model scores
     all_votes = []
     for p in preds_per_model:
         if p:
             all_votes.extend(p)
-    freq_order = [x for x,_ in Counter(all_votes).most_common()]
+    vote_count = Counter(all_votes)
+    freq_order = sorted(vote_count, key=lambda n: (-vote_count[n], -scores[n-1] if 1 <= n <= max_num else 0))
+    score_order = [int(n) + 1 for n in np.argsort(-scores, kind="stable")]
 
     used = set([v for v in final if v])
     for i,v in enumerate(final):
@@ -97,7 +253,7 @@ def ensemble_predict(models, X_last, max_num=55):
                     used.add(cand)
                     break
             else:
-                for cand in range(1, max_num+1):
+                for cand in score_order:
                     if cand not in used:
                         final[i] = cand
                         used.add(cand)
@@ -105,7 +261,7 @@ def ensemble_predict(models, X_last, max_num=55):
 
     # enforce uniqueness
     uniq = []
-    pool = [n for n in range(1, max_num+1) if n not in final]
+    pool = [n for n in score_order if n not in final]
     for i,v in enumerate(final):
         if v in uniq:
             final[i] = pool.pop(0)
@@ -113,6 +269,130 @@ def ensemble_predict(models, X_last, max_num=55):
 
     return sorted(final)
 
+def _position_classes(model):
+    """classes_ of every output position (MultiOutputClassifier or compiled trees), else None."""
+    for attr in ("estimators_", "forests"):
+        parts = getattr(model, attr, None)
+        if parts:
+            return [np.asarray(e.classes_) for e in parts]
+    return None
+
+def number_scores(model, X, max_num=55):
+    """(n x max_num) per-number scores of one model for N feature rows.
+
+    Multi-hot models return their own scores; per-position classifiers add the
+    probability of every number over the 6 positions (expected appearances);
+    models without probabilities count their predicted numbers.
+    """
+    X = np.asarray(X).reshape(-1, np.shape(X)[-1])
+    if hasattr(model, "predict_scores"):
+        return np.asarray(model.predict_scores(X), dtype=np.float64)[:, :max_num]
+    scores = np.zeros((len(X), max_num))
+    classes = _position_classes(model)
+    if classes is not None and hasattr(model, "predict_proba"):
+        for cls, proba in zip(classes, model.predict_proba(X)):
+            proba = np.asarray(proba).reshape(len(X), -1)
+            ok = (cls >= 1) & (cls <= max_num)
+            scores[:, cls[ok].astype(int) - 1] += proba[:, ok]
+        return scores
+    preds = np.asarray(model.predict(X)).reshape(len(X), -1).astype(int)
+    rows = np.repeat(np.arange(len(X)), preds.shape[1])
+    ok = (preds.ravel() >= 1) & (preds.ravel() <= max_num)
+    np.add.at(scores, (rows[ok], preds.ravel()[ok] - 1), 1.0)
+    return scores
+
+def ensemble_scores(models, X, max_num=55, weights=None, k=6):
+    """Soft vote: weighted mean of every model's per-number scores for N rows at once.
+
+    Each model's row is rescaled to sum to `k` so multi-hot and per-position
+    models weigh the same; models that are None or fail are skipped (their
+    weight is renormalised away). Returns (n x max_num).
+    """
+    X = np.asarray(X).reshape(-1, np.shape(X)[-1])
+    weights = [1.0] * len(models) if weights is None else list(weights)
+    total, wsum = np.zeros((len(X), max_num)), 0.0
+    for m, w in zip(models, weights):
+        if m is None or w <= 0:
+            continue
+        try:
+            s = number_scores(m, X, max_num)
+        except Exception:
+            continue
+        norm = s.sum(axis=1, keepdims=True)
+        total += w * k * s / np.where(norm > 0, norm, 1.0)
+        wsum += w
+    return total / wsum if wsum else total
+
+def topk_from_scores(scores, k=6):
+    """(n x k) sorted 1-based numbers with the largest scores per row."""
+    scores = np.atleast_2d(scores)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k] + 1
+    return np.sort(top, axis=1)
+
+def soft_vote_predict(models, X_last, max_num=55, weights=None):
+    """Ticket for one feature row from `ensemble_scores` (drop-in for `ensemble_predict`)."""
+    return topk_from_scores(ensemble_scores(models, X_last, max_num=max_num, weights=weights))[0].tolist()
+
+def learn_ensemble_weights(models, X, Y, max_num=55, n_iter=100, tol=1e-6):
+    """Mixture weights maximising the likelihood of the drawn numbers (EM on held-out rows).
+
+    An entry may also be a precomputed (n x max_num) score array for the rows
+    of X (e.g. online scorers replayed draw by draw). Models that are None or
+    fail get weight 0. Returns a list aligned with `models`.
+    """
+    X = np.asarray(X).reshape(-1, np.shape(X)[-1])
+    target = multi_hot(Y, max_num).astype(bool)
+    probs, idx = [], []
+    for i, m in enumerate(models):
+        if m is None:
+            continue
+        try:
+            s = np.asarray(m, dtype=np.float64) if isinstance(m, np.ndarray) else number_scores(m, X, max_num)
+        except Exception:
+            continue
+        # each model as a distribution over numbers; likelihood of every drawn number
+        s = s / np.where(s.sum(axis=1, keepdims=True) > 0, s.sum(axis=1, keepdims=True), 1.0)
+        probs.append(np.clip(s[target], 1e-12, None))
+        idx.append(i)
+    weights = [0.0] * len(models)
+    if not probs:
+        return weights
+    P = np.stack(probs, axis=1)                                  # drawn numbers x models
+    w = np.full(P.shape[1], 1.0 / P.shape[1])
+    for _ in range(n_iter):
+        resp = P * w
+        resp /= resp.sum(axis=1, keepdims=True)
+        new = resp.mean(axis=0)
+        if np.abs(new - w).max() < tol:
+            w = new
+            break
+        w = new
+    for i, v in zip(idx, w):
+        weights[i] = float(v)
+    return weights
+
+def save_ensemble_weights(path, names, weights):
+    import json
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(dict(zip(names, weights)), f, indent=2)
+
+def load_ensemble_weights(path, names):
+    """Weights for `names` from `save_ensemble_weights`, or None (equal weights) if missing.
+
+    Names without a learned weight (e.g. a model added later) get the mean weight.
+    """
+    import json
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+    except Exception:
+        return None
+    if not saved:
+        return None
+    mean = float(np.mean(list(saved.values())))
+    return [float(saved.get(n, mean)) for n in names]
+
 def save_model(obj, path):
     os.makedirs(os.path.dirname(path), exist_ok=True)
     joblib.dump(obj, path)
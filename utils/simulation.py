@@ -0,0 +1,151 @@
+# utils/simulation.py
+"""
+Monte Carlo chance baseline.
+
+Plays millions of uniformly random tickets against uniformly random draws to
+get the null distribution every predictor should be compared with:
+
+  - hits per ticket (0..6 numbers in common; AND + popcount of masks),
+  - per-position accuracy and exact match of sorted tickets (the metrics that
+    train_and_save_models reports). An exact match (1 / C(max_num, 6)) is
+    far rarer than 1 / n_sims, so its baseline is the exact rate.
+
+A random ticket is a weak baseline for acc_pos*: sorted positions are far from
+uniform (position 1 is almost always small), so a model that only learned the
+marginal beats it. majority_null swaps in the (smoothed) training frequency
+of each position's most frequent value, the rate a model has to beat to show
+it learned anything beyond the marginals.
+
+Simulation runs in batches; batch i always uses stream i of
+SeedSequence(seed).spawn(...), so the result is the same whatever the number
+of workers. compare_hits / compare_rate turn an observed history into a
+one-sided Monte Carlo p-value (resampling n steps from the null) and an
+effect size (Cohen's d for mean hits, Cohen's h for rates).
+"""
+import os
+import time
+from math import comb
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from utils.logger import log
+from utils.bitsets import to_masks, popcount
+from utils.tickets import _gumbel_topk
+
+N_SIMS = 2_000_000
+BATCH = 1 << 18
+# null replicates of a whole history for the p-values
+N_REPLICATES = 100_000
+SEED = 2024
+_CACHE = {}
+
+
+def _simulate_batch(args):
+    """(hit histogram (7,), position matches (k,), exact matches) of `n` random ticket/draw pairs."""
+    seed_seq, n, max_num, k = args
+    rng = np.random.default_rng(seed_seq)
+    w = np.ones(max_num)
+    T = _gumbel_topk(w, n, k, rng)
+    D = _gumbel_topk(w, n, k, rng)
+    hits = popcount(to_masks(T) & to_masks(D))
+    eq = T == D
+    return np.bincount(hits, minlength=7)[:7], eq.sum(axis=0), int(eq.all(axis=1).sum())
+
+
+def null_distribution(max_num, n_sims=N_SIMS, k=6, seed=SEED, workers=None, batch=BATCH):
+    """Null hit / position statistics of uniformly random tickets (cached per arguments).
+
+    Returns {"hits_p": (7,), "mean_hits", "sd_hits", "pos_acc": (k,), "exact_match", "n_sims"}.
+    """
+    key = (max_num, n_sims, k, seed, batch)
+    if key in _CACHE:
+        return _CACHE[key]
+    sizes = [min(batch, n_sims - s) for s in range(0, n_sims, batch)]
+    streams = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(ss, n, max_num, k) for ss, n in zip(streams, sizes)]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    t0 = time.perf_counter()
+    if workers == 1:
+        parts = [_simulate_batch(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+            parts = list(pool.map(_simulate_batch, tasks))
+    hist = np.sum([p[0] for p in parts], axis=0)
+    pos = np.sum([p[1] for p in parts], axis=0)
+    exact = sum(p[2] for p in parts)
+    p = hist / n_sims
+    mean = float((p * np.arange(7)).sum())
+    null = {"hits_p": p, "mean_hits": mean, "sd_hits": float(np.sqrt((p * (np.arange(7) - mean) ** 2).sum())),
+            "pos_acc": pos / n_sims, "exact_match": 1.0 / comb(max_num, k), "exact_sim": exact / n_sims,
+            "n_sims": n_sims}
+    log(f"🔹 Null 6/{max_num}: {n_sims:,} random tickets in {time.perf_counter() - t0:.1f}s, "
+        f"mean hits {mean:.4f}, P(>=3) {p[3:].sum():.5f}")
+    _CACHE[key] = null
+    return null
+
+
+def majority_null(null, Y_train, max_num):
+    """Copy of `null` whose pos_acc is the smoothed training frequency of each position's mode.
+
+    (count + 1) / (n + max_num): the rate at which always guessing the mode is
+    expected to hit. Its accuracy on a small test split is often exactly 0,
+    which would make a single hit look significant.
+    """
+    Y_train = np.asarray(Y_train).astype(np.int64)
+    counts = [np.bincount(Y_train[:, i], minlength=max_num + 1).max() for i in range(Y_train.shape[1])]
+    return {**null, "pos_acc": (np.array(counts) + 1.0) / (len(Y_train) + max_num)}
+
+
+def _stream(seed, tag):
+    """Replicate RNG for one comparison: independent of the simulation streams."""
+    return np.random.default_rng(np.random.SeedSequence([seed, tag]))
+
+
+def compare_hits(hits, null, reps=N_REPLICATES, seed=SEED):
+    """Observed hits per step vs the null: mean, effect size, p-values (mean hits, count of >= 3 hits)."""
+    hits = np.asarray(hits, dtype=np.int64)
+    n = len(hits)
+    if not n:
+        return {}
+    rng = _stream(seed, n)
+    sim = rng.multinomial(n, null["hits_p"], size=reps)
+    sim_mean = sim @ np.arange(7) / n
+    sim_3 = sim[:, 3:].sum(axis=1)
+    mean, n3 = float(hits.mean()), int((hits >= 3).sum())
+    return {
+        "null_mean_hits": round(null["mean_hits"], 4),
+        "effect_d": round((mean - null["mean_hits"]) / null["sd_hits"], 4),
+        "p_mean_hits": round((int((sim_mean >= mean - 1e-12).sum()) + 1) / (reps + 1), 6),
+        "null_hits_3plus": round(float(null["hits_p"][3:].sum()) * n, 3),
+        "p_hits_3plus": round((int((sim_3 >= n3).sum()) + 1) / (reps + 1), 6),
+    }
+
+
+def compare_rate(rate, n, p0, reps=N_REPLICATES, seed=SEED):
+    """Observed success rate over n trials vs null rate p0: (Cohen's h, one-sided Monte Carlo p-value)."""
+    if not n:
+        return float("nan"), float("nan")
+    sim = _stream(seed, n).binomial(n, p0, size=reps)
+    h = 2 * np.arcsin(np.sqrt(rate)) - 2 * np.arcsin(np.sqrt(p0))
+    return round(float(h), 4), (int((sim >= round(rate * n)).sum()) + 1) / (reps + 1)
+
+
+def baseline_columns(row, n_test, null, reps=N_REPLICATES, seed=SEED):
+    """Baseline, effect size and p-value next to each acc_pos* / exact_match of a metrics row."""
+    out = dict(row)
+    metrics = [(f"acc_pos{i + 1}", null["pos_acc"][i]) for i in range(len(null["pos_acc"]))]
+    for name, p0 in metrics + [("exact_match", null["exact_match"])]:
+        if name not in row:
+            continue
+        h, p = compare_rate(row[name], n_test, p0, reps, seed)
+        out.update({f"{name}_baseline": float(f"{p0:.4g}"), f"{name}_effect_h": h, f"{name}_p": round(p, 6)})
+    return out
+
+
+def baseline_summary(records, max_num, n_sims=N_SIMS, reps=N_REPLICATES, seed=SEED, workers=None):
+    """Per predictor of a walk-forward backtest: hits vs the random-ticket null."""
+    null = null_distribution(max_num, n_sims=n_sims, seed=seed, workers=workers)
+    rows = [{"predictor": name, **compare_hits(g["hits"].to_numpy(), null, reps, seed)}
+            for name, g in records.groupby("predictor")]
+    return pd.DataFrame(rows)
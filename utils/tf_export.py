@@ -0,0 +1,100 @@
+# utils/tf_export.py
+"""
+Dependency-free inference for the Keras multi-hot model.
+
+`export_keras` writes the Dense weights of a trained Sequential model (Dropout
+is a no-op at inference) to a compact .npz together with the feature spec it
+was trained on. `NumpyDense` loads that file and runs the batched forward pass
+with plain NumPy, so predictions need no TensorFlow import. It exposes
+`predict_scores` / `predict` like `utils.predict_advanced.MultiHotModel` and
+drops into `ensemble_predict`. Only Dense, Dropout and InputLayer layers are
+exported; anything else raises instead of being silently dropped. The model
+ends in a linear layer trained with MSE on 0/1 targets, so scores are clipped
+to >= 0 before they are summed with other models' probabilities.
+"""
+import json
+import numpy as np
+
+ACTIVATIONS = {
+    "linear": lambda z: z,
+    "relu": lambda z: np.maximum(z, 0),
+    "sigmoid": lambda z: 1.0 / (1.0 + np.exp(-z)),
+    "tanh": np.tanh,
+    "softmax": lambda z: (lambda e: e / e.sum(axis=1, keepdims=True))(np.exp(z - z.max(axis=1, keepdims=True))),
+}
+# no-ops at inference
+PASSTHROUGH_LAYERS = {"Dropout", "InputLayer"}
+
+
+def export_keras(model, path, feature_spec=None):
+    """Save the Dense layers of `model` to `path` (.npz); returns the number of layers exported.
+
+    Raises ValueError on layers other than Dense / Dropout / InputLayer or an unknown activation.
+    """
+    arrays, acts = {}, []
+    for layer in model.layers:
+        kind = type(layer).__name__
+        if kind in PASSTHROUGH_LAYERS:
+            continue
+        if kind != "Dense":
+            raise ValueError(f"Unsupported layer for NumPy export: {layer.name} ({kind})")
+        weights = layer.get_weights()
+        act = layer.get_config().get("activation", "linear")
+        if act not in ACTIVATIONS:
+            raise ValueError(f"Unsupported activation for NumPy export: {act}")
+        i = len(acts)
+        arrays[f"W{i}"] = np.asarray(weights[0], dtype=np.float32)
+        arrays[f"b{i}"] = (np.asarray(weights[1], dtype=np.float32) if len(weights) > 1
+                           else np.zeros(weights[0].shape[1], dtype=np.float32))
+        acts.append(act)
+    meta = {"activations": acts, "feature_spec": feature_spec}
+    np.savez_compressed(path, meta=np.array(json.dumps(meta)), **arrays)
+    return len(acts)
+
+
+class NumpyDense:
+    """Stack of dense layers loaded from an `export_keras` file."""
+
+    def __init__(self, weights, biases, activations, feature_spec=None):
+        self.weights = weights
+        self.biases = biases
+        self.activations = activations
+        self.feature_spec = feature_spec
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            meta = json.loads(str(z["meta"]))
+            n = len(meta["activations"])
+            return cls([z[f"W{i}"] for i in range(n)], [z[f"b{i}"] for i in range(n)],
+                       meta["activations"], meta.get("feature_spec"))
+
+    @property
+    def n_features_in_(self):
+        return self.weights[0].shape[0]
+
+    def predict_scores(self, X, batch_size=4096):
+        X = np.asarray(X, dtype=np.float32).reshape(-1, self.n_features_in_)
+        out = np.empty((len(X), self.weights[-1].shape[1]), dtype=np.float32)
+        for s in range(0, len(X), batch_size):
+            h = X[s:s + batch_size]
+            for W, b, act in zip(self.weights, self.biases, self.activations):
+                h = ACTIVATIONS[act](h @ W + b)
+            out[s:s + batch_size] = h
+        # linear output layer: negative scores would cancel other models' votes
+        return np.maximum(out, 0, out=out)
+
+    def predict(self, X, k=6):
+        scores = self.predict_scores(X)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k] + 1
+        return np.sort(top, axis=1)
+
+
+def load_numpy_model(path):
+    return NumpyDense.load(path)
+
+
+def matches_features(model, feature_spec, n_features):
+    """True if `model` was exported for `feature_spec` (counts / window 50 when unrecorded) and n_features inputs."""
+    default = {"feature_set": "counts", "params": {"window": 50, "max_num": model.weights[-1].shape[1]}}
+    return (model.feature_spec or default) == (feature_spec or default) and model.n_features_in_ == n_features
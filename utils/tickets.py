@@ -0,0 +1,155 @@
+# utils/tickets.py
+"""
+Bulk ticket generation from per-number scores.
+
+`sample_tickets` turns any predictor's scores (max_num,) into N distinct
+tickets with Gumbel-top-k sampling: adding Gumbel noise to log-scores and
+taking the top k is the same as drawing k numbers without replacement with
+probability proportional to the scores, and it vectorizes over all tickets at
+once. Constraints (sum range, odd count, longest run of consecutive numbers,
+past draws excluded) are checked on the whole batch; failing and duplicate
+rows are dropped and only the shortfall is re-sampled. Constraints that no
+ticket can meet are rejected up front (check_feasible); rounds are capped at
+MAX_ROUND_ROWS rows and sampling stops after ZERO_ROUNDS full-size rounds in
+a row without a new ticket, so tight constraints cannot blow up time or memory.
+"""
+import numpy as np
+from utils.logger import log
+from utils.bitsets import to_masks, contains
+
+# None = no constraint; ranges are inclusive (lo, hi)
+DEFAULT_CONSTRAINTS = {"sum_range": None, "odd_range": None, "max_consecutive": None}
+MAX_ROUNDS = 50
+# hard cap of candidates per round (MAX_ROUND_ROWS x 6 uint8 + masks ~ 20 MB)
+MAX_ROUND_ROWS = 1 << 20
+# consecutive full-size rounds without a new ticket before giving up
+ZERO_ROUNDS = 3
+# rows per noise block (n x max_num float32); small blocks stay in cache
+CHUNK_ROWS = 1 << 12
+
+
+def scores_from_freq(freq_df, max_num):
+    """Per-number scores from a `frequency_stats` table (unseen numbers get a small floor)."""
+    scores = np.zeros(max_num)
+    if freq_df is not None and not freq_df.empty:
+        nums = freq_df["number"].astype(int).to_numpy()
+        ok = (nums >= 1) & (nums <= max_num)
+        scores[nums[ok] - 1] = freq_df["frequency"].to_numpy(dtype=float)[ok]
+    return scores + max(scores.max(), 1.0) * 1e-3
+
+
+def _gumbel_topk(weights, n, k, rng):
+    """(n x k) sorted 1-based numbers, k distinct per row, drawn without replacement ~ weights.
+
+    Gumbel-top-k in its exponential-race form: the k smallest E_i / w_i with
+    E_i ~ Exp(1) are the k largest log(w_i) + Gumbel_i, without the two logs.
+    """
+    inv = np.where(weights > 0, 1.0 / np.where(weights > 0, weights, 1.0), np.inf).astype(np.float32)
+    out = np.empty((n, k), dtype=np.uint8)
+    for s in range(0, n, CHUNK_ROWS):
+        m = min(CHUNK_ROWS, n - s)
+        key = rng.standard_exponential((m, len(weights)), dtype=np.float32)
+        key *= inv
+        top = np.argpartition(key, k - 1, axis=1)[:, :k]
+        top.sort(axis=1)
+        out[s:s + m] = top + 1
+    return out
+
+
+def max_run(tickets):
+    """Longest run of consecutive numbers in every sorted ticket."""
+    T = np.asarray(tickets, dtype=np.int16)
+    run = best = np.ones(len(T), dtype=np.int16)
+    for j in range(1, T.shape[1]):
+        run = np.where(T[:, j] - T[:, j - 1] == 1, run + 1, 1)
+        best = np.maximum(best, run)
+    return best
+
+
+def check_constraints(tickets, sum_range=None, odd_range=None, max_consecutive=None, exclude_masks=None):
+    """Boolean (n,): which sorted tickets satisfy every given constraint."""
+    T = np.asarray(tickets)
+    ok = np.ones(len(T), dtype=bool)
+    if sum_range is not None:
+        s = T.sum(axis=1, dtype=np.int32)
+        ok &= (s >= sum_range[0]) & (s <= sum_range[1])
+    if odd_range is not None:
+        odd = (T & 1).sum(axis=1)
+        ok &= (odd >= odd_range[0]) & (odd <= odd_range[1])
+    if max_consecutive is not None:
+        ok &= max_run(T) <= max_consecutive
+    if exclude_masks is not None and len(exclude_masks):
+        ok &= ~contains(to_masks(T), exclude_masks)
+    return ok
+
+
+def check_feasible(scores, k=6, sum_range=None, odd_range=None, max_consecutive=None, **_):
+    """Raise ValueError when no ticket of k numbers with positive score can meet the constraints."""
+    nums = np.flatnonzero(np.asarray(scores) > 0) + 1
+    if sum_range is not None:
+        lo, hi = int(nums[:k].sum()), int(nums[-k:].sum())
+        if sum_range[0] > sum_range[1] or sum_range[1] < lo or sum_range[0] > hi:
+            raise ValueError(f"sum_range {tuple(sum_range)} is outside the achievable sums {lo}..{hi}")
+    if odd_range is not None:
+        n_odd = int((nums & 1).sum())
+        lo, hi = max(0, k - (len(nums) - n_odd)), min(k, n_odd)
+        if odd_range[0] > odd_range[1] or odd_range[1] < lo or odd_range[0] > hi:
+            raise ValueError(f"odd_range {tuple(odd_range)} is outside the achievable odd counts {lo}..{hi}")
+    if max_consecutive is not None and max_consecutive < 1:
+        raise ValueError("max_consecutive must be >= 1")
+
+
+def sample_tickets(scores, n, k=6, temperature=1.0, exclude_draws=None, seed=None, max_rounds=MAX_ROUNDS,
+                   unique=True, **constraints):
+    """Draw `n` tickets from per-number `scores` (length max_num, higher = likelier).
+
+    temperature < 1 sharpens towards the top scores, > 1 flattens to uniform.
+    exclude_draws: past draws (m x 6) that must not be reproduced.
+    constraints: sum_range, odd_range, max_consecutive (see DEFAULT_CONSTRAINTS).
+    Every round samples only the missing rows (scaled by the observed
+    acceptance rate, at most MAX_ROUND_ROWS); rejected and duplicate rows
+    are dropped. Infeasible constraints raise ValueError. Returns (n' x k)
+    uint8, n' == n unless the constraints are too tight to fill in
+    `max_rounds` rounds or ZERO_ROUNDS full-size rounds in a row accept nothing.
+    """
+    cons = {**DEFAULT_CONSTRAINTS, **constraints}
+    unknown = set(cons) - set(DEFAULT_CONSTRAINTS)
+    if unknown:
+        raise ValueError(f"Unknown constraints: {sorted(unknown)}")
+    scores = np.asarray(scores, dtype=np.float64)
+    if (scores < 0).any() or (scores > 0).sum() < k:
+        raise ValueError(f"scores must be >= 0 with at least {k} positive entries")
+    if temperature <= 0:
+        raise ValueError("temperature must be > 0")
+    check_feasible(scores, k, **cons)
+    rng = np.random.default_rng(seed)
+    weights = (scores / scores.max()) ** (1.0 / temperature)
+    exclude = to_masks(exclude_draws) if exclude_draws is not None and len(exclude_draws) else None
+
+    parts, seen, need, rate, empty = [], np.empty(0, dtype=np.uint64), n, 1.0, 0
+    for _ in range(max_rounds):
+        if need <= 0 or empty >= ZERO_ROUNDS:
+            break
+        m = min(int(need / max(rate, 1e-6) * 1.05) + 16, MAX_ROUND_ROWS)
+        cand = _gumbel_topk(weights, m, k, rng)
+        ok = check_constraints(cand, **cons)
+        masks = to_masks(cand) if unique or exclude is not None else None
+        if exclude is not None:
+            ok &= ~contains(masks, exclude)
+        idx = np.nonzero(ok)[0]
+        if unique:
+            # first occurrence in sampling order, then drop tickets accepted in earlier rounds
+            _, first = np.unique(masks[idx], return_index=True)
+            idx = idx[np.sort(first)]
+            idx = idx[~contains(masks[idx], seen)]
+        rate = max(len(idx) / m, 0.5 * rate) if len(idx) else 0.125 * rate
+        empty = 0 if len(idx) else empty + (m == MAX_ROUND_ROWS)
+        idx = idx[:need]
+        parts.append(cand[idx])
+        if unique:
+            seen = np.concatenate([seen, masks[idx]])
+        need -= len(idx)
+    out = np.concatenate(parts) if parts else np.empty((0, k), dtype=np.uint8)
+    if len(out) < n:
+        log(f"⚠ sample_tickets: {n - len(out)} of {n} tickets could not satisfy the constraints")
+    return out
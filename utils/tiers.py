@@ -0,0 +1,263 @@
+# utils/tiers.py
+"""
+Deadline-aware predictor selection for the report path.
+
+Tiers, from cheapest / weakest to slowest / strongest:
+  heuristic  top-6 of the online scorers (utils.online) or of all-time
+             frequency (always available, ~free)
+  fast       HistGradientBoosting multi-hot model fitted on the spot
+  rf         on-the-fly RandomForest (utils.predict.onthefly_rf, cached across runs)
+  cached     saved LGB/Cat/MLP/multi-hot ensemble (soft vote), prediction only
+  retrain    full ensemble retrain (opt-in: tier_context(allow_retrain=True) or
+             env PREDICT_RETRAIN=1); fitted on the older 80% of rows, evaluated
+             on the newest 20%, then saved, compiled and registered like
+             train_and_save_models does
+
+Measured fit and predict seconds per (game, tier) are kept in
+models/tier_costs.json as an exponential moving average. Given a budget the
+selector runs the strongest tier whose estimated cost fits; if it overruns the
+deadline the best finished result is used and the tier keeps running in the
+background. Otherwise slower tiers that own a cache (rf, and retrain when
+allowed) are refreshed on a background daemon thread so the next run can pick
+them; callers may wait for it with a timeout but need not.
+"""
+import os
+import json
+import time
+import threading
+import numpy as np
+from utils.logger import log
+from utils.model_loader import MODEL_KINDS
+
+TIERS = ["heuristic", "fast", "rf", "cached", "retrain"]
+# tiers whose run refreshes an on-disk cache for later runs
+REFRESH_TIERS = ["rf", "retrain"]
+COST_PATH = "models/tier_costs.json"
+# seconds (fit + predict) assumed before a tier has been measured
+DEFAULT_COSTS = {"heuristic": 0.01, "fast": 2.0, "rf": 10.0, "cached": 2.0, "retrain": 300.0}
+EMA_ALPHA = 0.3
+RETRAIN_BUDGET_S = 120
+HOLDOUT_FRACTION = 0.2
+_lock = threading.Lock()
+
+
+def load_costs(path=COST_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def record_cost(game, tier, fit_s, predict_s, path=COST_PATH):
+    """Fold one measurement into the EMA for (game, tier) and persist it."""
+    with _lock:
+        costs = load_costs(path)
+        cur = costs.setdefault(game, {}).get(tier)
+        if cur is None:
+            cur = {"fit": fit_s, "predict": predict_s, "runs": 0}
+        else:
+            cur["fit"] = (1 - EMA_ALPHA) * cur["fit"] + EMA_ALPHA * fit_s
+            cur["predict"] = (1 - EMA_ALPHA) * cur["predict"] + EMA_ALPHA * predict_s
+        cur["runs"] += 1
+        costs[game][tier] = cur
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp-{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(costs, f, indent=2)
+        os.replace(tmp, path)
+
+
+def estimate_cost(costs, game, tier):
+    cur = costs.get(game, {}).get(tier)
+    if cur is None:
+        return DEFAULT_COSTS[tier]
+    return cur["fit"] + cur["predict"]
+
+
+def tier_context(game, df, max_num, X, Y, models=None, feat=None, freq=None, models_dir="models", weights=None,
+                 online=None, allow_retrain=None, window=50):
+    """Everything the tiers need for one game (X/Y: counts features over `window` draws,
+    feat: ensemble feature row for the next draw, models: trained models in MODEL_KINDS
+    order (+ tf), online: utils.online scorers, weights: soft-vote weight per model then
+    per online scorer, or None for equal weights, allow_retrain: enable the retrain tier;
+    None = env PREDICT_RETRAIN)."""
+    if allow_retrain is None:
+        allow_retrain = os.getenv("PREDICT_RETRAIN", "") not in ("", "0")
+    return {"game": game, "df": df, "max_num": max_num, "X": X, "Y": Y, "models": models or [],
+            "feat": feat, "freq": freq, "models_dir": models_dir, "weights": weights, "online": online,
+            "allow_retrain": bool(allow_retrain), "window": window}
+
+
+def available_tiers(ctx):
+    has_X = ctx["X"] is not None and len(ctx["X"]) > 0
+    ok = {
+        "heuristic": True,
+        "fast": has_X,
+        "rf": has_X,
+        # online scorers alone are the heuristic tier, not a cached ensemble
+        "cached": ctx["feat"] is not None and any(m is not None for m in ctx["models"][:len(MODEL_KINDS)]),
+        "retrain": has_X and ctx.get("allow_retrain", False),
+    }
+    return [t for t in TIERS if ok[t]]
+
+
+def _next_counts(ctx):
+    """Window-counts row for the next draw (ctx["X"][-1] ends one draw earlier)."""
+    from utils.feature_engine import draw_matrix, last_window_counts
+    return last_window_counts(draw_matrix(ctx["df"]), ctx.get("window", 50), ctx["max_num"],
+                              dtype=np.asarray(ctx["X"]).dtype)
+
+
+def _retrain(ctx):
+    """Refit the LGB/Cat/MLP ensemble with holdout metrics; saved, compiled and registered as new versions."""
+    from utils.feature_store import (
+        load_feature_spec, save_feature_spec, model_features, next_features, data_fingerprint,
+    )
+    from utils.predict_advanced import HAS_LGB, HAS_CAT, train_early_stopping, save_model
+    from utils.tree_compiler import compile_and_save
+    from utils.model_registry import register_model, prune
+    from utils.tuning import load_best_config, tuned_params
+    from train_and_save_models import evaluate_model
+    game, models_dir = ctx["game"], ctx["models_dir"]
+    spec_path = os.path.join(models_dir, f"{game}_feature_spec.json")
+    spec = load_feature_spec(spec_path) or {"feature_set": "counts",
+                                            "params": {"window": 50, "max_num": ctx["max_num"]}}
+    X, Y = model_features(spec, ctx["df"])
+    # time-ordered holdout: the newest rows are never seen by the refitted models
+    n_test = max(int(len(X) * HOLDOUT_FRACTION), 1)
+    X_tr, X_te, Y_tr, Y_te = X[:-n_test], X[-n_test:], Y[:-n_test], Y[-n_test:]
+    kinds = [k for k, ok in (("lgb", HAS_LGB), ("cat", HAS_CAT), ("mlp", True)) if ok]
+    best = load_best_config(game)
+    registry_dir = os.path.join(models_dir, "registry")
+    models = []
+    for kind in kinds:
+        params = tuned_params(best, kind)
+        m, n_iter, max_iter = train_early_stopping(kind, X_tr, Y_tr, budget_s=RETRAIN_BUDGET_S / len(kinds), **params)
+        path = os.path.join(models_dir, f"{game}_{kind}.joblib")
+        save_model(m, path)
+        try:
+            compile_and_save(m, path)
+        except Exception as e:
+            log(f"⚠ Compile {game}/{kind} failed: {e}")
+        metrics = {**evaluate_model(m, X_te, Y_te), "n_iter": round(n_iter, 1), "max_iter": max_iter,
+                   "source": "retrain_tier"}
+        register_model(m, game, kind, fingerprint=data_fingerprint(ctx["df"]),
+                       feature_spec={"feature_set": spec["feature_set"], "params": spec["params"]},
+                       metrics=metrics, registry_dir=registry_dir)
+        prune(game, kind, registry_dir=registry_dir)
+        log(f"    -> Retrain {game}/{kind}: exact_match {metrics['exact_match']:.3f} on {n_test} holdout rows")
+        models.append(m)
+    save_feature_spec(spec_path, spec["feature_set"], **spec["params"])
+    return models, next_features(spec, ctx["df"])
+
+
+def run_tier(tier, ctx, path=COST_PATH):
+    """Run one tier; returns its ticket and records the measured fit / predict seconds."""
+    from utils.heuristic import heuristic_predict
+    from utils.predict import onthefly_rf, predict_next
+    from utils.predict_advanced import MultiHotModel, soft_vote_predict
+    from utils.online import online_predict
+    max_num = ctx["max_num"]
+    t0 = time.perf_counter()
+    if tier == "heuristic":
+        fit_s = 0.0
+        if ctx.get("online"):
+            ticket = online_predict(ctx["online"], k=6)
+        else:
+            ticket = heuristic_predict(ctx["freq"], k=6, max_num=max_num)
+    elif tier == "fast":
+        model = MultiHotModel(kind="hgb", max_num=max_num, n_estimators=50).fit(ctx["X"], ctx["Y"])
+        fit_s = time.perf_counter() - t0
+        ticket = model.predict(_next_counts(ctx).reshape(1, -1))[0].tolist()
+    elif tier == "rf":
+        model, _ = onthefly_rf(ctx["df"], ctx["X"], ctx["Y"], ctx["game"], models_dir=ctx["models_dir"])
+        fit_s = time.perf_counter() - t0
+        ticket = predict_next(model, _next_counts(ctx))
+    elif tier == "cached":
+        fit_s = 0.0
+        # weights are aligned with the trained models followed by the online scorers
+        models = list(ctx["models"]) + list(ctx.get("online") or [])
+        ticket = soft_vote_predict(models, ctx["feat"], max_num=max_num, weights=ctx.get("weights"))
+    elif tier == "retrain":
+        models, feat = _retrain(ctx)
+        fit_s = time.perf_counter() - t0
+        ticket = soft_vote_predict(models, feat, max_num=max_num)
+    else:
+        raise ValueError(f"Unknown tier: {tier}")
+    record_cost(ctx["game"], tier, fit_s, time.perf_counter() - t0 - fit_s, path=path)
+    return [int(v) for v in ticket]
+
+
+def select_tier(ctx, budget_s, costs=None):
+    """Strongest available tier whose estimated cost fits in `budget_s` (heuristic otherwise)."""
+    costs = load_costs() if costs is None else costs
+    best = "heuristic"
+    for tier in available_tiers(ctx):
+        if estimate_cost(costs, ctx["game"], tier) <= budget_s:
+            best = tier
+    return best
+
+
+def refresh_in_background(ctx, tiers):
+    """Run cache-owning tiers sequentially on a daemon thread; returns the thread."""
+    def _work():
+        for tier in tiers:
+            try:
+                run_tier(tier, ctx)
+                log(f"    -> Background refresh {ctx['game']}/{tier} done")
+            except Exception as e:
+                log(f"⚠ Background refresh {ctx['game']}/{tier} failed: {e}")
+
+    th = threading.Thread(target=_work, name=f"refresh-{ctx['game']}", daemon=True)
+    th.start()
+    return th
+
+
+def predict_with_deadline(ctx, budget_s, background=True):
+    """Pick and run a tier within `budget_s` seconds.
+
+    Returns (ticket, tier, results, thread): `results` maps every tier that
+    finished in time to its ticket; `thread` is the background refresh thread
+    (or None). The heuristic always runs first, so a ticket is always returned.
+    """
+    deadline = time.monotonic() + budget_s
+    results = {"heuristic": run_tier("heuristic", ctx)}
+    costs = load_costs()
+    tier = select_tier(ctx, budget_s, costs)
+    log(f"🔹 {ctx['game']}: tier '{tier}' (est. {estimate_cost(costs, ctx['game'], tier):.1f}s, budget {budget_s:.0f}s)")
+
+    # fall back to weaker tiers on failure; the running tier is abandoned (not killed) on overrun
+    candidates = [t for t in available_tiers(ctx) if t != "heuristic"]
+    candidates = candidates[:candidates.index(tier) + 1][::-1] if tier in candidates else []
+    running = set()
+    for t in candidates:
+        box = {}
+
+        def _target(t=t, box=box):
+            try:
+                box["ticket"] = run_tier(t, ctx)
+            except Exception as e:
+                box["error"] = e
+
+        worker = threading.Thread(target=_target, name=f"tier-{ctx['game']}-{t}", daemon=True)
+        worker.start()
+        worker.join(timeout=max(deadline - time.monotonic(), 0))
+        if "ticket" in box:
+            results[t] = box["ticket"]
+            break
+        if worker.is_alive():
+            log(f"⚠ {ctx['game']}/{t} missed the deadline; continuing in background")
+            running.add(t)
+            break
+        log(f"⚠ {ctx['game']}/{t} failed: {box.get('error')}")
+
+    final = next(t for t in TIERS[::-1] if t in results)
+    thread = None
+    # an abandoned tier is still refreshing its own cache; don't start a second job next to it
+    if background and not running:
+        slower = [t for t in REFRESH_TIERS if t in available_tiers(ctx) and t not in running
+                  and TIERS.index(t) > TIERS.index(final)]
+        if slower:
+            thread = refresh_in_background(ctx, slower)
+    return results[final], final, results, thread
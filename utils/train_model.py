@@ -4,6 +4,11 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
 import pandas as pd
 from utils.logger import log
+from utils.feature_engine import build_pernum_features
+from utils.early_stopping import time_split, fit_xgb
+from utils.out_of_core import train_pernum_chunked, pernum_nbytes, CHUNKED_THRESHOLD_BYTES
+from utils.feature_store import data_fingerprint
+from utils.model_registry import register_model, prune
 
 try:
     from xgboost import XGBClassifier
@@ -22,61 +27,45 @@ def build_Xy(mega_df, power_df, window=50, max_num=45):
     if minlen <= window:
         log(f"    -> Không đủ dữ liệu (chỉ có {minlen} dòng) cho window={window}.")
         return None, None
-        
-    X = []
-    y = []
-    
-    # Lặp qua lịch sử từ điểm bắt đầu của cửa sổ
-    for end in range(window, minlen):
-        # Lấy cửa sổ lịch sử
-        mw = mega_df.iloc[end-window:end]
-        pw = power_df.iloc[end-window:end]
-        
-        # Tính tần suất của từng số trong cửa sổ
-        m_counts = [0] * max_num  # Tần suất Mega (1-45)
-        p_counts = [0] * 55      # Tần suất Power (1-55)
-        
-        for i in range(1, 7):
-            # Tính tần suất Mega
-            if f"n{i}" in mw.columns:
-                for v in mw[f"n{i}"].dropna().astype(int).tolist():
-                    if 1 <= v <= max_num:
-                        m_counts[v-1] += 1
-            # Tính tần suất Power (full 55)
-            if f"n{i}" in pw.columns:
-                for v in pw[f"n{i}"].dropna().astype(int).tolist():
-                    if 1 <= v <= 55:
-                        p_counts[v-1] += 1
-
-        # Xây dựng ma trận X (Feature Matrix)
-        for n in range(1, max_num + 1):
-            # Tần suất Power, chỉ lấy 45 số đầu cho Mega model
-            power_count_mapped = p_counts[n-1] if n-1 < len(p_counts) else 0
-
-            feat = [
-                m_counts[n-1],                           # 1. Tần suất tuyệt đối Mega
-                power_count_mapped,                      # 2. Tần suất tuyệt đối Power (cho số n)
-                m_counts[n-1] / (window * 6),            # 3. Tần suất chuẩn hóa Mega
-                power_count_mapped / (window * 6)        # 4. Tần suất chuẩn hóa Power
-            ]
-            X.append(feat)
-
-        # Xây dựng vector y (Target Labels) - Lượt quay tiếp theo
-        try:
-            next_draw = {int(mega_df.iloc[end][f"n{i}"]) for i in range(1, 7)}
-        except Exception:
-            next_draw = set()
-
-        for n in range(1, max_num + 1):
-            # Nhãn là 1 nếu số n xuất hiện trong lượt quay tiếp theo, 0 nếu không
-            y.append(1 if n in next_draw else 0)
-            
-    return np.array(X), np.array(y)
-
-def train_models_and_save(mega_df, power_df, window=50, save_dir="models"):
+
+    # Mỗi lượt quay sinh max_num dòng: [tần suất Mega, tần suất Power,
+    # tần suất chuẩn hóa Mega, tần suất chuẩn hóa Power]; nhãn là 1 nếu số n
+    # xuất hiện trong lượt quay tiếp theo. Tính bằng prefix-sum (utils.feature_engine).
+    return build_pernum_features(mega_df, power_df, window=window, max_num=max_num)
+
+def _register(name, model, mega_df, power_df, window, metrics, save_dir):
+    """Ghi thêm một phiên bản vào registry (models/registry); lỗi không làm hỏng huấn luyện."""
+    try:
+        fp = f"{data_fingerprint(mega_df)[:8]}{data_fingerprint(power_df)[:8]}"
+        registry_dir = os.path.join(save_dir, "registry")
+        register_model(model, "mega", name, fingerprint=fp,
+                       feature_spec={"feature_set": "pernum", "params": {"window": window, "max_num": 45}},
+                       metrics=dict(metrics), registry_dir=registry_dir)
+        prune("mega", name, registry_dir=registry_dir)
+    except Exception as e:
+        log(f"⚠ Không ghi được {name} vào registry: {e}")
+
+def train_models_and_save(mega_df, power_df, window=50, save_dir="models", chunked=None):
     """
     Huấn luyện Random Forest và (nếu có) XGBoost, sau đó lưu mô hình và trả về metrics.
+
+    chunked: True để huấn luyện out-of-core từ memmap (utils.out_of_core);
+    None = tự chọn khi ma trận build_Xy vượt CHUNKED_THRESHOLD_BYTES.
+
+    Trả về (model_path, boost_path, metrics):
+      - thường: RF và XGBoost (rf_pernum_mega / gb_pernum_mega);
+      - chunked: mô hình chính (lgb > sgd > mlp) và XGBoost external-memory
+        ({kind}_pernum_chunked_mega); metrics["paths"] liệt kê mọi file đã lưu.
     """
+    minlen = min(len(mega_df), len(power_df))
+    if chunked is None:
+        chunked = pernum_nbytes(max(minlen - window, 0)) > CHUNKED_THRESHOLD_BYTES
+    if chunked:
+        log("    -> Huấn luyện theo khối (out-of-core)...")
+        paths, metrics = train_pernum_chunked(mega_df, power_df, window=window, save_dir=save_dir)
+        model_path = paths.get("lgb") or paths.get("sgd") or paths.get("mlp")
+        return model_path, paths.get("xgb"), {**metrics, "chunked": True, "paths": paths}
+
     log("    -> Xây dựng X và y...")
     X, y = build_Xy(mega_df, power_df, window=window)
     
@@ -85,7 +74,8 @@ def train_models_and_save(mega_df, power_df, window=50, save_dir="models"):
         return None, None, {}
         
     log(f"    -> Kích thước tập huấn luyện: X={X.shape}, y={y.shape}")
-    Xtr, Xval, ytr, yval = train_test_split(X, y, test_size=0.2, random_state=42)
+    # Chia theo thời gian (dữ liệu đã sắp xếp cũ -> mới): tập kiểm tra là các kỳ gần nhất
+    Xtr, Xval, ytr, yval = train_test_split(X, y, test_size=0.2, shuffle=False)
     
     metrics = {}
     
@@ -96,6 +86,7 @@ def train_models_and_save(mega_df, power_df, window=50, save_dir="models"):
     rf_path = os.path.join(save_dir, "rf_pernum_mega.joblib")
     joblib.dump(rf, rf_path)
     metrics["acc_rf"] = accuracy_score(yval, rf.predict(Xval))
+    _register("rf_pernum", rf, mega_df, power_df, window, metrics, save_dir)
 
     # 2. XGBoost (GB)
     gb_path = None
@@ -104,10 +95,14 @@ def train_models_and_save(mega_df, power_df, window=50, save_dir="models"):
         gb = XGBClassifier(n_estimators=200, use_label_encoder=False, 
                            eval_metric="logloss", verbosity=0, random_state=42, 
                            n_jobs=-1)
-        gb.fit(Xtr, ytr)
+        # early stopping trên phần cuối (gần nhất) của tập huấn luyện + giới hạn thời gian
+        Xfit, yfit, Xes, yes = time_split(Xtr, ytr)
+        gb, n_iter, max_iter = fit_xgb(gb, Xfit, yfit, Xes, yes)
+        metrics["gb_n_iter"], metrics["gb_max_iter"] = n_iter, max_iter
         gb_path = os.path.join(save_dir, "gb_pernum_mega.joblib")
         joblib.dump(gb, gb_path)
         metrics["acc_gb"] = accuracy_score(yval, gb.predict(Xval))
+        _register("gb_pernum", gb, mega_df, power_df, window, metrics, save_dir)
     
     log(f"    -> Huấn luyện hoàn tất. RF Accuracy: {metrics.get('acc_rf'):.4f}")
     
@@ -0,0 +1,159 @@
+# utils/train_scheduler.py
+"""
+Parallel training scheduler.
+
+Splits training into (game x model x output position) jobs and runs them on a
+process pool under one global thread budget:
+
+- feature matrices are placed in shared memory once and attached by every
+  worker, so jobs only pickle a few names instead of the arrays;
+- each worker caps BLAS/OpenMP threads (threadpoolctl + env vars) and passes
+  the same cap to LightGBM `n_jobs` / CatBoost `thread_count`, so
+  workers x threads_per_job never exceeds the budget;
+- the fitted per-position estimators are reassembled into the same
+  MultiOutputClassifier objects the serial trainers produce.
+
+With `early_stopping` each job validates on the most recent rows and stops on
+patience or on its share of the per-model budget (utils.early_stopping).
+Every job's wall time and iterations used are reported.
+"""
+import os
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+from utils.logger import log
+
+THREAD_ENV_VARS = ["OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                   "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS"]
+
+# rough relative cost per job, used to start the longest jobs first
+JOB_COST = {"cat": 3.0, "lgb": 2.0, "mlp": 1.0}
+
+# worker-side state: name -> (SharedMemory, ndarray)
+_ATTACHED = {}
+_THREADS = 1
+
+
+def limit_threads(threads):
+    """Cap BLAS/OpenMP pools in this process to `threads`."""
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads)
+    except Exception:
+        pass
+
+
+def share_array(arr):
+    """Copy `arr` into a new shared memory block; returns (shm, descriptor)."""
+    arr = np.ascontiguousarray(arr)
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+
+def _attach(desc):
+    name, shape, dtype = desc
+    if name not in _ATTACHED:
+        shm = shared_memory.SharedMemory(name=name)
+        _ATTACHED[name] = (shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf))
+    return _ATTACHED[name][1]
+
+
+def _init_worker(threads):
+    global _THREADS
+    _THREADS = threads
+    limit_threads(threads)
+
+
+def _fit_job(job):
+    from utils.predict_advanced import make_estimator
+    from utils import early_stopping as es
+    game, kind, pos, x_desc, y_desc, params, early = job
+    X = _attach(x_desc)
+    y = _attach(y_desc)[:, pos]
+    t0 = time.perf_counter()
+    est = make_estimator(kind, threads=_THREADS, **params)
+    if early is None:
+        est.fit(X, y)
+        n_iter = max_iter = None
+    else:
+        X_fit, y_fit, X_val, y_val = es.time_split(X, y, early.get("val_fraction", es.VAL_FRACTION))
+        est, n_iter, max_iter = es.FITTERS[kind](est, X_fit, y_fit, X_val, y_val, budget_s=early["job_budget_s"],
+                                                 patience=early.get("patience", es.PATIENCE))
+    return game, kind, pos, est, time.perf_counter() - t0, n_iter, max_iter
+
+
+def _params(model_params, game, kind):
+    return model_params.get((game, kind), model_params.get(kind, {}))
+
+
+def run_training_jobs(datasets, kinds, model_params=None, threads_total=None, threads_per_job=1, early_stopping=None):
+    """Train every (game, kind, position) job in parallel.
+
+    datasets: {game: (X_train, Y_train)} with Y_train of shape (n, n_outputs)
+    kinds: model kinds understood by `utils.predict_advanced.make_estimator`
+    model_params: {kind: kwargs for make_estimator}, optionally overridden per
+        game with {(game, kind): kwargs}
+    early_stopping: None, or {"budget_s": seconds per model, "patience", "val_fraction"};
+        each position job gets budget_s / n_outputs
+
+    Returns ({(game, kind): MultiOutputClassifier}, [timing dict per job]).
+    Jobs that fail are logged and their (game, kind) model is left out.
+    """
+    from utils.predict_advanced import make_estimator, assemble_multioutput
+    model_params = model_params or {}
+    threads_total = threads_total or os.cpu_count() or 1
+    threads_per_job = max(1, min(threads_per_job, threads_total))
+    workers = max(1, threads_total // threads_per_job)
+
+    shms, jobs, n_outputs = [], [], {}
+    try:
+        for game, (X, Y) in datasets.items():
+            x_shm, x_desc = share_array(X)
+            y_shm, y_desc = share_array(Y)
+            shms += [x_shm, y_shm]
+            n_outputs[game] = (Y.shape[1], X.shape[1])
+            early = None
+            if early_stopping is not None:
+                early = {**early_stopping, "job_budget_s": early_stopping["budget_s"] / Y.shape[1]}
+            for kind in kinds:
+                for pos in range(Y.shape[1]):
+                    jobs.append((game, kind, pos, x_desc, y_desc, _params(model_params, game, kind), early))
+        jobs.sort(key=lambda j: -JOB_COST.get(j[1], 1.0))
+        log(f"🔹 Scheduler: {len(jobs)} jobs, {workers} workers x {threads_per_job} threads")
+
+        fitted, timings, failed = {}, [], set()
+        ctx = mp.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=_init_worker, initargs=(threads_per_job,)) as pool:
+            futures = {pool.submit(_fit_job, job): job for job in jobs}
+            for fut in as_completed(futures):
+                game, kind, pos = futures[fut][:3]
+                try:
+                    _, _, _, est, secs, n_iter, max_iter = fut.result()
+                except Exception as e:
+                    log(f"⚠ Job {game}/{kind}/n{pos+1} failed: {e}")
+                    failed.add((game, kind))
+                    continue
+                fitted.setdefault((game, kind), {})[pos] = est
+                timings.append({"game": game, "model": kind, "output": f"n{pos+1}",
+                                "threads": threads_per_job, "seconds": round(secs, 3),
+                                "n_iter": n_iter, "max_iter": max_iter})
+                log(f"    -> {game}/{kind}/n{pos+1}: {secs:.2f}s")
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+    models = {}
+    for (game, kind), per_pos in fitted.items():
+        n_out, n_feat = n_outputs[game]
+        if (game, kind) in failed or len(per_pos) != n_out:
+            continue
+        base = make_estimator(kind, threads=threads_per_job, **_params(model_params, game, kind))
+        models[(game, kind)] = assemble_multioutput(base, [per_pos[p] for p in range(n_out)], n_feat)
+    return models, timings
@@ -0,0 +1,406 @@
+# utils/tree_compiler.py
+"""
+Tree-ensemble compiler.
+
+Flattens trained RandomForest, LightGBM, XGBoost and CatBoost classifiers
+(single models or MultiOutputClassifier positions) into contiguous NumPy node
+arrays:
+
+    feature (int32, -1 for leaves), threshold (float64), left / right (int32),
+    default_left (bool, NaN direction), missing (int8, LightGBM missing type),
+    value (n_nodes x width leaf values), roots (first node of every tree),
+    tree_class (output column every tree adds to)
+
+CatBoost oblivious trees are expanded into ordinary binary trees with the same
+split per level. `CompiledForest` walks every (row, tree) pair at once, one
+tree level per step, so thousands of rows are scored per call. Saved forests are
+plain .npy files loaded with mmap_mode="r", and predictions reproduce the
+originals (same comparisons and float precision, trees summed in model order).
+"""
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+
+# leaf aggregation: RF averages class fractions, boosters sum raw scores
+LINKS = ("mean", "softmax", "sigmoid")
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+ARRAYS = ("feature", "threshold", "left", "right", "default_left", "missing", "value", "roots", "tree_class")
+BATCH_ROWS = 1024
+
+
+class _Builder:
+    def __init__(self, width):
+        self.width = width
+        self.feature, self.threshold, self.left, self.right = [], [], [], []
+        self.default_left, self.missing, self.value = [], [], []
+        self.roots, self.tree_class = [], []
+
+    def node(self, feature=-1, threshold=0.0, default_left=True, missing=MISSING_NONE, value=None):
+        self.feature.append(feature)
+        self.threshold.append(threshold)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.default_left.append(default_left)
+        self.missing.append(missing)
+        self.value.append(np.zeros(self.width) if value is None else np.asarray(value, dtype=np.float64))
+        return len(self.feature) - 1
+
+    def link(self, parent, left, right):
+        self.left[parent], self.right[parent] = left, right
+
+    def arrays(self):
+        return {
+            "feature": np.asarray(self.feature, dtype=np.int32),
+            "threshold": np.asarray(self.threshold, dtype=np.float64),
+            "left": np.asarray(self.left, dtype=np.int32),
+            "right": np.asarray(self.right, dtype=np.int32),
+            "default_left": np.asarray(self.default_left, dtype=bool),
+            "missing": np.asarray(self.missing, dtype=np.int8),
+            "value": np.asarray(self.value, dtype=np.float64).reshape(len(self.value), self.width),
+            "roots": np.asarray(self.roots, dtype=np.int32),
+            "tree_class": np.asarray(self.tree_class, dtype=np.int32),
+        }
+
+
+class CompiledForest:
+    """One single-output classifier as flat node arrays.
+
+    meta: link ("mean" | "softmax" | "sigmoid"), classes, n_outputs (raw score
+    columns), base (initial raw score per column), strict (x < thr instead of
+    x <= thr, XGBoost), float32 (compare in float32 like sklearn / XGBoost /
+    CatBoost), scale (raw score multiplier), sigmoid (LightGBM binary slope).
+    """
+
+    def __init__(self, arrays, meta):
+        self.arrays = arrays
+        self.meta = meta
+        self.classes_ = np.asarray(meta["classes"])
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+
+    def _leaves(self, X):
+        """Leaf node of every (row, tree): (n_rows x n_trees).
+
+        Works on the flat list of (row, tree) pairs still inside a tree and
+        drops pairs as they reach a leaf, one level per iteration.
+        """
+        n, n_trees = len(X), len(self.roots)
+        n_feat = X.shape[1]
+        nodes = np.tile(self.roots, n).astype(np.int64)
+        base = np.repeat(np.arange(n, dtype=np.int64) * n_feat, n_trees)
+        Xf = X.ravel()
+        has_nan = bool(np.isnan(Xf).any())
+        lgb = self.meta.get("lgb_missing")
+        strict = self.meta.get("strict")
+        active = np.arange(len(nodes))
+        while len(active):
+            cur = nodes[active]
+            feat = self.feature[cur]
+            inner = feat >= 0
+            active, cur, feat = active[inner], cur[inner], feat[inner]
+            if not len(active):
+                break
+            x = Xf[base[active] + feat]
+            thr = self.threshold[cur]
+            go_left = (x < thr) if strict else (x <= thr)
+            if lgb:
+                # LightGBM: NaN -> 0 unless missing type is NaN; Zero type sends 0/NaN the default way
+                miss = self.missing[cur]
+                nan = np.isnan(x)
+                x0 = np.where(nan & (miss != MISSING_NAN), 0.0, x)
+                go_left = np.where(nan, (x0 < thr) if strict else (x0 <= thr), go_left)
+                use_default = ((miss == MISSING_NAN) & nan) | ((miss == MISSING_ZERO) & (np.abs(x0) <= 1e-35))
+                go_left = np.where(use_default, self.default_left[cur], go_left)
+            elif has_nan:
+                go_left = np.where(np.isnan(x), self.default_left[cur], go_left)
+            nodes[active] = np.where(go_left, self.left[cur], self.right[cur])
+        return nodes.reshape(n, n_trees)
+
+    def raw_scores(self, X):
+        X = np.asarray(X, dtype=np.float64).reshape(-1, np.shape(X)[-1])
+        if self.meta.get("float32"):
+            X = X.astype(np.float32).astype(np.float64)
+        width = self.value.shape[1]
+        out = np.empty((len(X), self.meta["n_outputs"]))
+        for s in range(0, len(X), BATCH_ROWS):
+            leaves = self._leaves(X[s:s + BATCH_ROWS])
+            acc = np.tile(np.asarray(self.meta["base"], dtype=np.float64), (len(leaves), 1))
+            # trees summed in model order, like the original predictors
+            if width == 1:
+                # boosters: iteration i holds one tree per class (tree_class = i % n_outputs)
+                vals = self.value[leaves, 0].reshape(len(leaves), -1, self.meta["n_outputs"])
+                for it in range(vals.shape[1]):
+                    acc += vals[:, it]
+            else:
+                for t in range(leaves.shape[1]):
+                    acc += self.value[leaves[:, t]]
+            out[s:s + BATCH_ROWS] = acc
+        return out * self.meta.get("scale", 1.0)
+
+    def predict_proba(self, X):
+        raw = self.raw_scores(X)
+        link = self.meta["link"]
+        if link == "mean":
+            return raw / len(self.roots)
+        if link == "sigmoid":
+            p = 1.0 / (1.0 + np.exp(-self.meta.get("sigmoid", 1.0) * raw[:, 0]))
+            return np.column_stack([1 - p, p])
+        e = np.exp(raw - raw.max(axis=1, keepdims=True))
+        return e / e.sum(axis=1, keepdims=True)
+
+    def predict(self, X):
+        raw = self.raw_scores(X)
+        if self.meta["link"] == "sigmoid":
+            return self.classes_[(raw[:, 0] > 0).astype(int)]
+        return self.classes_[np.argmax(raw, axis=1)]
+
+
+class CompiledModel:
+    """Compiled positions of a MultiOutputClassifier (or a single classifier)."""
+
+    def __init__(self, forests, multioutput=True):
+        self.forests = forests
+        self.multioutput = multioutput
+
+    @property
+    def n_features_in_(self):
+        return self.forests[0].meta["n_features"]
+
+    def predict(self, X):
+        if not self.multioutput:
+            return self.forests[0].predict(X)
+        return np.column_stack([f.predict(X) for f in self.forests])
+
+    def predict_proba(self, X):
+        if not self.multioutput:
+            return self.forests[0].predict_proba(X)
+        return [f.predict_proba(X) for f in self.forests]
+
+
+# --- compilers -------------------------------------------------------------
+
+def _compile_sklearn(est):
+    b = _Builder(len(est.classes_))
+    for tree in est.estimators_:
+        t = tree.tree_
+        offset = len(b.feature)
+        b.roots.append(offset)
+        b.tree_class.append(-1)
+        values = t.value[:, 0, :]
+        for i in range(t.node_count):
+            leaf = t.children_left[i] == -1
+            v = values[i] / values[i].sum() if leaf else None
+            b.node(feature=-1 if leaf else int(t.feature[i]), threshold=float(t.threshold[i]), value=v)
+        for i in range(t.node_count):
+            if t.children_left[i] != -1:
+                b.link(offset + i, offset + int(t.children_left[i]), offset + int(t.children_right[i]))
+    meta = {"link": "mean", "classes": est.classes_.tolist(), "n_outputs": len(est.classes_),
+            "base": [0.0] * len(est.classes_), "float32": True, "n_features": int(est.n_features_in_)}
+    return CompiledForest(b.arrays(), meta)
+
+
+def _compile_lgb(est):
+    booster = est.booster_
+    dump = booster.dump_model()
+    per_iter = dump["num_tree_per_iteration"]
+    binary = len(est.classes_) == 2
+    b = _Builder(1)
+    missing_codes = {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+
+    def walk(node):
+        if "leaf_value" in node:
+            return b.node(value=[node["leaf_value"]])
+        if node.get("decision_type", "<=") != "<=":
+            raise ValueError("categorical LightGBM splits are not supported")
+        idx = b.node(feature=node["split_feature"], threshold=float(node["threshold"]),
+                     default_left=bool(node.get("default_left", True)),
+                     missing=missing_codes.get(node.get("missing_type", "None"), MISSING_NONE))
+        left = walk(node["left_child"])
+        right = walk(node["right_child"])
+        b.link(idx, left, right)
+        return idx
+
+    for i, info in enumerate(dump["tree_info"]):
+        b.roots.append(len(b.feature))
+        b.tree_class.append(i % per_iter)
+        walk(info["tree_structure"])
+    sigmoid = 1.0
+    for part in dump.get("objective", "").split():
+        if part.startswith("sigmoid:"):
+            sigmoid = float(part.split(":")[1])
+    n_out = 1 if binary else per_iter
+    meta = {"link": "sigmoid" if binary else "softmax", "classes": est.classes_.tolist(), "n_outputs": n_out,
+            "base": [0.0] * n_out, "sigmoid": sigmoid, "lgb_missing": True,
+            "n_features": int(dump["max_feature_idx"]) + 1}
+    return CompiledForest(b.arrays(), meta)
+
+
+def _parse_float(v):
+    if isinstance(v, str):
+        v = v.strip("[]").split(",")[0]
+    return float(v)
+
+
+def _compile_xgb(est):
+    booster = est.get_booster()
+    config = json.loads(booster.save_config())
+    lmp = config["learner"]["learner_model_param"]
+    n_class = max(int(lmp.get("num_class", 0)), 1)
+    base = _parse_float(lmp["base_score"])
+    names = booster.feature_names
+    fidx = {n: i for i, n in enumerate(names)} if names else None
+    dumps = booster.get_dump(dump_format="json")
+    best = getattr(est, "best_iteration", None)
+    if best is not None:
+        dumps = dumps[:(best + 1) * n_class]
+    binary = n_class == 1
+    b = _Builder(1)
+
+    def walk(node):
+        if "leaf" in node:
+            return b.node(value=[node["leaf"]])
+        f = node["split"]
+        feature = fidx[f] if fidx else int(f.lstrip("f"))
+        idx = b.node(feature=feature, threshold=float(np.float32(node["split_condition"])),
+                     default_left=node["missing"] == node["yes"])
+        kids = {c["nodeid"]: c for c in node["children"]}
+        b.link(idx, walk(kids[node["yes"]]), walk(kids[node["no"]]))
+        return idx
+
+    for i, text in enumerate(dumps):
+        b.roots.append(len(b.feature))
+        b.tree_class.append(i % n_class)
+        walk(json.loads(text))
+    if binary:
+        # logistic base_score is a probability; the margin starts at its logit
+        base_margin = [float(np.log(base / (1 - base)))]
+    else:
+        base_margin = [base] * n_class
+    meta = {"link": "sigmoid" if binary else "softmax", "classes": est.classes_.tolist(), "n_outputs": n_class,
+            "base": base_margin, "strict": True, "float32": True, "n_features": int(booster.num_features())}
+    return CompiledForest(b.arrays(), meta)
+
+
+def _compile_catboost(est):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.json")
+        est.save_model(path, format="json")
+        with open(path, "r", encoding="utf-8") as f:
+            dump = json.load(f)
+    float_map = {ff["feature_index"]: ff["flat_feature_index"] for ff in dump["features_info"]["float_features"]}
+    scale, bias = dump.get("scale_and_bias", [1.0, [0.0]])
+    bias = list(bias) if isinstance(bias, list) else [bias]
+    width = len(bias)
+    b = _Builder(width)
+    for tree in dump["oblivious_trees"]:
+        splits = tree["splits"]
+        if any(s.get("split_type", "FloatFeature") != "FloatFeature" for s in splits):
+            raise ValueError("only float CatBoost splits are supported")
+        leaf_values = np.asarray(tree["leaf_values"], dtype=np.float64).reshape(-1, width)
+        b.roots.append(len(b.feature))
+        b.tree_class.append(-1)
+
+        def expand(depth, idx):
+            if depth == len(splits):
+                return b.node(value=leaf_values[idx])
+            s = splits[depth]
+            # CatBoost: bit = x > border, bit `depth` of the leaf index
+            node = b.node(feature=float_map[s["float_feature_index"]], threshold=float(np.float32(s["border"])))
+            left = expand(depth + 1, idx)
+            right = expand(depth + 1, idx | (1 << depth))
+            b.link(node, left, right)
+            return node
+
+        expand(0, 0)
+    binary = len(est.classes_) == 2 and width == 1
+    # raw = scale * sum(trees) + bias, evaluated as scale * (bias / scale + sum(trees))
+    meta = {"link": "sigmoid" if binary else "softmax", "classes": est.classes_.tolist(), "n_outputs": width,
+            "base": [v / scale for v in bias] if scale else bias, "scale": float(scale), "float32": True,
+            "n_features": len(float_map)}
+    return CompiledForest(b.arrays(), meta)
+
+
+def compile_estimator(est):
+    name = type(est).__name__
+    if name in ("RandomForestClassifier", "ExtraTreesClassifier"):
+        return _compile_sklearn(est)
+    if name == "LGBMClassifier":
+        return _compile_lgb(est)
+    if name == "XGBClassifier":
+        return _compile_xgb(est)
+    if name == "CatBoostClassifier":
+        return _compile_catboost(est)
+    raise ValueError(f"Cannot compile {name}")
+
+
+def compile_model(model):
+    """Compile a tree classifier or a MultiOutputClassifier of tree classifiers."""
+    if hasattr(model, "estimators_") and type(model).__name__ == "MultiOutputClassifier":
+        return CompiledModel([compile_estimator(e) for e in model.estimators_], multioutput=True)
+    return CompiledModel([compile_estimator(model)], multioutput=False)
+
+
+def is_compilable(model):
+    try:
+        ests = model.estimators_ if type(model).__name__ == "MultiOutputClassifier" else [model]
+    except AttributeError:
+        return False
+    ok = ("RandomForestClassifier", "ExtraTreesClassifier", "LGBMClassifier", "XGBClassifier", "CatBoostClassifier")
+    return all(type(e).__name__ in ok for e in ests)
+
+
+def save_compiled(cm, path):
+    """Write every forest's arrays as .npy plus meta.json into directory `path` (atomic swap)."""
+    tmp = f"{path}.tmp-{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+    metas = []
+    for i, forest in enumerate(cm.forests):
+        for name in ARRAYS:
+            np.save(os.path.join(tmp, f"f{i}_{name}.npy"), forest.arrays[name])
+        metas.append(forest.meta)
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"multioutput": cm.multioutput, "forests": metas}, f)
+    if os.path.isdir(path):
+        old = f"{path}.old-{os.getpid()}"
+        os.replace(path, old)
+        os.replace(tmp, path)
+        shutil.rmtree(old, ignore_errors=True)
+    else:
+        os.replace(tmp, path)
+    return path
+
+
+def load_compiled(path, mmap=True):
+    with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    forests = []
+    for i, m in enumerate(meta["forests"]):
+        arrays = {name: np.load(os.path.join(path, f"f{i}_{name}.npy"), mmap_mode="r" if mmap else None)
+                  for name in ARRAYS}
+        forests.append(CompiledForest(arrays, m))
+    return CompiledModel(forests, multioutput=meta["multioutput"])
+
+
+def compiled_path(joblib_path):
+    """models/x_lgb.joblib -> models/x_lgb_compiled"""
+    return os.path.splitext(joblib_path)[0] + "_compiled"
+
+
+def compile_and_save(model, joblib_path):
+    """Compile `model` next to its joblib artifact; returns the directory or None if not a tree model."""
+    if not is_compilable(model):
+        return None
+    return save_compiled(compile_model(model), compiled_path(joblib_path))
+
+
+def load_fresh_compiled(joblib_path, mmap=True):
+    """Compiled artifact for `joblib_path` if it exists and is not older than the joblib, else None."""
+    path = compiled_path(joblib_path)
+    meta = os.path.join(path, "meta.json")
+    if not os.path.exists(meta):
+        return None
+    if os.path.exists(joblib_path) and os.path.getmtime(meta) < os.path.getmtime(joblib_path):
+        return None
+    return load_compiled(path, mmap=mmap)
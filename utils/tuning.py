@@ -0,0 +1,210 @@
+# utils/tuning.py
+"""
+Budgeted hyperparameter search (successive halving).
+
+Candidates are (model kind x window x key hyperparameters). Each rung trains
+every surviving candidate on a growing, most-recent fraction of the
+time-ordered training draws, scores it on the same held-out final draws and
+keeps the best 1/eta. Rungs are evaluated in parallel on a process pool and
+features come from the feature store, so each (window, game) is built once.
+The budget is hard: every job gets the absolute deadline and fits with early
+stopping on what is left of it (jobs that start late return at once), and
+pending jobs are cancelled when it passes. The best configuration is written
+to models/best_config.json for train_and_save_models.py; all kinds there share
+one feature window, so per-model params are taken from that window only.
+"""
+import os
+import json
+import time
+import itertools
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from utils.logger import log
+
+BEST_CONFIG_PATH = "models/best_config.json"
+
+WINDOWS = [25, 50, 100]
+SEARCH_SPACE = {
+    "lgb": {"n_estimators": [50, 100, 200], "num_leaves": [7, 15, 31], "learning_rate": [0.05, 0.1]},
+    "cat": {"iterations": [50, 100, 200], "depth": [4, 6]},
+    "mlp": {"hidden_layer_sizes": [(64,), (128, 64), (256, 128)], "alpha": [1e-4, 1e-3], "max_iter": [100, 200]},
+    "multihot": {"n_estimators": [50, 100, 200], "learning_rate": [0.05, 0.1]},
+}
+VAL_FRACTION = 0.2
+
+
+def sample_candidates(n, kinds=None, windows=WINDOWS, seed=42):
+    """Draw `n` distinct candidates uniformly from the grid."""
+    kinds = kinds or list(SEARCH_SPACE)
+    grid = []
+    for kind in kinds:
+        space = SEARCH_SPACE[kind]
+        keys = sorted(space)
+        for window in windows:
+            for values in itertools.product(*(space[k] for k in keys)):
+                grid.append({"model": kind, "window": window, "params": dict(zip(keys, values))})
+    rng = np.random.default_rng(seed)
+    idx = rng.choice(len(grid), size=min(n, len(grid)), replace=False)
+    return [grid[i] for i in idx]
+
+
+def hit_score(pred, Y):
+    """Mean number of true numbers among each predicted ticket."""
+    pred = np.asarray(pred, dtype=np.int64)
+    Y = np.asarray(Y, dtype=np.int64)
+    return float(np.mean([len(set(p) & set(t)) for p, t in zip(pred, Y)]))
+
+
+def _fit_candidate(cand, X, Y, max_num, budget_s):
+    from utils.predict_advanced import train_early_stopping, MultiHotModel, HAS_LGB
+    if cand["model"] == "multihot":
+        return MultiHotModel(kind="lgb" if HAS_LGB else "hgb", max_num=max_num, threads=1,
+                             **cand["params"]).fit(X, Y, budget_s=budget_s)
+    return train_early_stopping(cand["model"], X, Y, budget_s=budget_s, threads=1, **cand["params"])[0]
+
+
+def evaluate_candidate(cand, df, max_num, fraction, val_draws, store_dir=None, deadline=None):
+    """Train `cand` on the most recent `fraction` of the training draws; return its validation hit score.
+
+    deadline: time.time() after which the job must not run; the fit gets what is left of it.
+    """
+    from utils.feature_store import cached_features, STORE_DIR
+    budget_s = None if deadline is None else deadline - time.time()
+    if budget_s is not None and budget_s <= 0:
+        raise TimeoutError("tuning budget reached before the job started")
+    X, Y = cached_features("counts", df, store_dir=store_dir or STORE_DIR, window=cand["window"], max_num=max_num)
+    X, Y = np.asarray(X), np.asarray(Y)
+    X_tr, Y_tr, X_val, Y_val = X[:-val_draws], Y[:-val_draws], X[-val_draws:], Y[-val_draws:]
+    n_tr = max(int(len(X_tr) * fraction), 20)
+    t0 = time.perf_counter()
+    model = _fit_candidate(cand, X_tr[-n_tr:], Y_tr[-n_tr:], max_num, budget_s)
+    score = hit_score(model.predict(X_val), Y_val)
+    return score, time.perf_counter() - t0
+
+
+def _init_worker():
+    from utils.train_scheduler import limit_threads
+    limit_threads(1)
+
+
+def successive_halving(df, max_num, n_candidates=27, eta=3, min_fraction=1/9, budget_s=600,
+                       workers=None, kinds=None, windows=WINDOWS, seed=42, store_dir=None):
+    """Run successive halving; returns a list of result dicts (one per evaluation), best last rung first."""
+    from utils.feature_store import cached_features, STORE_DIR
+    deadline = time.monotonic() + budget_s
+    # wall clock for the workers (monotonic clocks are per process)
+    wall_deadline = time.time() + budget_s
+    store_dir = store_dir or STORE_DIR
+    # build each window once up front; workers then hit the store
+    sizes = []
+    for w in windows:
+        X, _ = cached_features("counts", df, store_dir=store_dir, window=w, max_num=max_num)
+        if X is not None:
+            sizes.append(len(X))
+    if not sizes:
+        return []
+    windows = [w for w in windows if len(df) > w]
+    val_draws = max(int(min(sizes) * VAL_FRACTION), 1)
+
+    survivors = sample_candidates(n_candidates, kinds=kinds, windows=windows, seed=seed)
+    fraction = min_fraction
+    results = []
+    workers = workers or os.cpu_count() or 1
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker) as pool:
+        rung = 0
+        while survivors and time.monotonic() < deadline:
+            log(f"🔹 Rung {rung}: {len(survivors)} candidates, fraction={fraction:.3f}")
+            futures = {pool.submit(evaluate_candidate, c, df, max_num, fraction, val_draws, store_dir,
+                                   wall_deadline): c for c in survivors}
+            pending = set(futures)
+            scored = []
+            while pending:
+                done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    cand = futures[fut]
+                    try:
+                        score, secs = fut.result()
+                    except Exception as e:
+                        log(f"⚠ Candidate {cand} failed: {e}")
+                        continue
+                    row = {**cand, "rung": rung, "fraction": fraction, "score": score, "seconds": round(secs, 3)}
+                    results.append(row)
+                    scored.append(row)
+                if time.monotonic() >= deadline:
+                    # running jobs stop on their own deadline; queued ones never start
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    log("⚠ Tuning budget reached, stopping.")
+                    break
+            if fraction >= 1.0 or len(scored) <= 1 or time.monotonic() >= deadline:
+                break
+            scored.sort(key=lambda r: -r["score"])
+            keep = max(len(scored) // eta, 1)
+            survivors = [{"model": r["model"], "window": r["window"], "params": r["params"]} for r in scored[:keep]]
+            fraction = min(fraction * eta, 1.0)
+            rung += 1
+
+    results.sort(key=lambda r: (-r["fraction"], -r["score"]))
+    return results
+
+
+def _best_per_model(results):
+    per_model = {}
+    for r in results:
+        cur = per_model.get(r["model"])
+        if cur is None or (r["fraction"], r["score"]) > (cur["fraction"], cur["score"]):
+            per_model[r["model"]] = r
+    return per_model
+
+
+def best_configs(results):
+    """Best overall candidate and, at its window, the best per model kind (largest training fraction first).
+
+    Kinds never evaluated at the best window are left out (they train with defaults).
+    """
+    if not results:
+        return None
+    best = max(_best_per_model(results).values(), key=lambda r: (r["fraction"], r["score"]))
+    per_model = _best_per_model([r for r in results if r["window"] == best["window"]])
+    return {"best": best, "per_model": per_model}
+
+
+def tuned_params(conf, kind):
+    """Tuned params of `kind` if they were tuned at the shared best window, else {}."""
+    row = (conf or {}).get("per_model", {}).get(kind)
+    if row is None or row.get("window") != conf["best"]["window"]:
+        return {}
+    return dict(row["params"])
+
+
+def save_best_config(game, results, path=BEST_CONFIG_PATH):
+    conf = best_configs(results)
+    if conf is None:
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        data = {}
+    data[game] = conf
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, default=list)
+    os.replace(tmp, path)
+    return conf
+
+
+def load_best_config(game, path=BEST_CONFIG_PATH):
+    """Tuned config for `game` or None; tuple-valued params (MLP layers) are restored."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            conf = json.load(f).get(game)
+    except Exception:
+        return None
+    if conf:
+        for r in [conf["best"], *conf["per_model"].values()]:
+            if "hidden_layer_sizes" in r["params"]:
+                r["params"]["hidden_layer_sizes"] = tuple(r["params"]["hidden_layer_sizes"])
+    return conf
@@ -0,0 +1,219 @@
+# utils/wheeling.py
+"""
+Covering-design ("wheel") optimizer.
+
+Given a pool of v numbers, find few k-number tickets such that whenever any m
+numbers of the pool are drawn, at least one ticket matches t of them
+(e.g. v=15, k=6, "3 if 4"). Tickets and m-subsets of the pool are bitmasks
+over pool positions:
+
+  - cover matrix: candidate ticket i covers target j iff popcount(i & j) >= t,
+    stored as packed uint64 rows (n_candidates x ceil(n_targets / 64));
+  - greedy set cover: the gain of every candidate is popcount(row & uncovered)
+    summed over words, one vectorized pass per chosen ticket (random
+    tie-breaking per restart);
+  - local search: drop redundant tickets, then repeatedly remove one ticket
+    and anneal single-ticket swaps (tracking how often each target is
+    covered) until the smaller wheel covers everything again.
+
+Restarts run in parallel on a process pool; the smallest wheel wins.
+"""
+import os
+import time
+import multiprocessing as mp
+from itertools import combinations
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from utils.logger import log
+from utils.bitsets import popcount
+
+RESTARTS = 8
+LOCAL_SEARCH_S = 5.0
+# candidate rows per block when building the cover matrix
+BLOCK_ROWS = 2048
+_W = {}
+
+
+def _subset_masks(v, size):
+    """All `size`-subsets of range(v) as uint64 masks (lexicographic order)."""
+    combos = np.array(list(combinations(range(v), size)), dtype=np.uint64)
+    return np.bitwise_or.reduce(np.uint64(1) << combos, axis=1)
+
+
+def cover_matrix(v, k=6, t=3, m=4):
+    """(candidate masks, target masks, packed cover rows uint64)."""
+    cand = _subset_masks(v, k)
+    targets = _subset_masks(v, m)
+    n_words = (len(targets) + 63) // 64
+    packed = np.zeros((len(cand), n_words * 8), dtype=np.uint8)
+    for s in range(0, len(cand), BLOCK_ROWS):
+        hit = popcount(cand[s:s + BLOCK_ROWS, None] & targets[None, :]) >= t
+        packed[s:s + BLOCK_ROWS, :(len(targets) + 7) // 8] = np.packbits(hit, axis=1, bitorder="little")
+    return cand, targets, packed.view(np.uint64)
+
+
+def _gains(rows, uncovered):
+    """Newly covered targets per candidate; only the words that still have uncovered bits are read."""
+    cols = np.flatnonzero(uncovered)
+    if len(cols) < len(uncovered):
+        return popcount(rows[:, cols] & uncovered[cols]).sum(axis=1, dtype=np.int64)
+    return popcount(rows & uncovered).sum(axis=1, dtype=np.int64)
+
+
+def _drop_redundant(cover, chosen, rng):
+    chosen = list(chosen)
+    for i in rng.permutation(chosen):
+        rest = [c for c in chosen if c != i]
+        if rest and not (cover[i] & ~np.bitwise_or.reduce(cover[rest], axis=0)).any():
+            chosen = rest
+    return chosen
+
+
+def _repair(cover, chosen, full, rng):
+    """Greedily add tickets until every target is covered again."""
+    uncovered = full & ~np.bitwise_or.reduce(cover[chosen], axis=0) if chosen else full.copy()
+    chosen = list(chosen)
+    while uncovered.any():
+        g = _gains(cover, uncovered)
+        best = np.flatnonzero(g == g.max())
+        i = int(best[rng.integers(len(best))])
+        chosen.append(i)
+        uncovered &= ~cover[i]
+    return chosen
+
+
+def _cover_lists(cand, targets, t):
+    """(n_candidates x c) indices of the targets each candidate covers (c is the same for all by symmetry)."""
+    out = []
+    for s in range(0, len(cand), BLOCK_ROWS):
+        hit = popcount(cand[s:s + BLOCK_ROWS, None] & targets[None, :]) >= t
+        out.append(np.nonzero(hit)[1].reshape(len(hit), -1).astype(np.int32))
+    return np.concatenate(out)
+
+
+def _random_cover_of(target, v, k, t, rng):
+    """Mask of a random k-subset sharing at least t positions with `target`."""
+    inside = [i for i in range(v) if (target >> i) & 1]
+    keep = rng.choice(inside, t, replace=False)
+    others = np.setdiff1d(np.arange(v), keep)
+    pick = np.concatenate([keep, rng.choice(others, k - t, replace=False)])
+    return int(np.bitwise_or.reduce(np.uint64(1) << pick.astype(np.uint64)))
+
+
+def _anneal(chosen, deadline, rng, temp=0.3):
+    """Swap single tickets to cover every target with len(chosen) tickets; None if out of time.
+
+    A move adds a random candidate covering a random uncovered target and
+    removes the chosen ticket that leaves the fewest targets uncovered; worse
+    moves are accepted with probability exp(-delta / T) (T cools linearly).
+    """
+    W = _W
+    cov, targets, v, k, t = W["cov"], W["targets"], W["v"], W["k"], W["t"]
+    chosen = np.asarray(chosen, dtype=np.int64)
+    cnt = np.zeros(len(targets), dtype=np.int32)
+    np.add.at(cnt, cov[chosen].ravel(), 1)
+    cost = int((cnt == 0).sum())
+    start = time.monotonic()
+    while cost:
+        now = time.monotonic()
+        if now >= deadline:
+            return None
+        T = temp * max(1.0 - (now - start) / max(deadline - start, 1e-9), 0.05)
+        j = rng.choice(np.flatnonzero(cnt == 0))
+        c = int(W["order"][np.searchsorted(W["sorted"], np.uint64(_random_cover_of(int(targets[j]), v, k, t, rng)))])
+        cc = cov[c]
+        gain = int((cnt[cc] == 0).sum())
+        cnt[cc] += 1
+        # targets each chosen ticket covers alone (after adding c)
+        loss = (cnt[cov[chosen]] == 1).sum(axis=1)
+        best = np.flatnonzero(loss == loss.min())
+        r = int(best[rng.integers(len(best))])
+        delta = int(loss[r]) - gain
+        if delta <= 0 or rng.random() < np.exp(-delta / T):
+            cnt[cov[chosen[r]]] -= 1
+            chosen[r] = c
+            cost += delta
+        else:
+            cnt[cc] -= 1
+    return [int(c) for c in chosen]
+
+
+def _local_search(cover, chosen, full, rng, budget_s):
+    """Shrink the wheel one ticket at a time: drop the ticket covering fewest targets
+    alone, then anneal single-ticket swaps until everything is covered again."""
+    deadline = time.monotonic() + budget_s
+    best = list(chosen)
+    cov = _W["cov"]
+    while len(best) > 1 and time.monotonic() < deadline:
+        cnt = np.zeros(len(_W["targets"]), dtype=np.int32)
+        np.add.at(cnt, cov[best].ravel(), 1)
+        alone = [(cnt[cov[c]] == 1).sum() for c in best]
+        drop = int(np.argmin(alone))
+        res = _anneal(best[:drop] + best[drop + 1:], deadline, rng)
+        if res is None:
+            break
+        best = res
+    return best
+
+
+def _init_worker(v, k, t, m):
+    cand, targets, cover = cover_matrix(v, k, t, m)
+    full = np.bitwise_or.reduce(cover, axis=0)
+    order = np.argsort(cand)
+    _W.update(cand=cand, targets=targets, cover=cover, full=full, cov=_cover_lists(cand, targets, t),
+              order=order, sorted=cand[order], v=v, k=k, t=t)
+
+
+def _restart(args):
+    seed, budget_s = args
+    rng = np.random.default_rng(seed)
+    cover, full = _W["cover"], _W["full"]
+    chosen = _drop_redundant(cover, _repair(cover, [], full, rng), rng)
+    greedy_size = len(chosen)
+    chosen = _local_search(cover, chosen, full, rng, budget_s)
+    return seed, greedy_size, [int(_W["cand"][c]) for c in chosen]
+
+
+def _decode(mask, pool):
+    return [pool[i] for i in range(len(pool)) if (mask >> i) & 1]
+
+
+def verify_wheel(tickets, pool, t=3, m=4):
+    """Number of m-subsets of `pool` not matched in >= t numbers by any ticket (0 = guarantee holds)."""
+    pos = {n: i for i, n in enumerate(pool)}
+    masks = np.array([sum(1 << pos[n] for n in tk) for tk in tickets], dtype=np.uint64)
+    targets = _subset_masks(len(pool), m)
+    missed = 0
+    for s in range(0, len(targets), BLOCK_ROWS):
+        hit = popcount(targets[s:s + BLOCK_ROWS, None] & masks[None, :]) >= t
+        missed += int((~hit.any(axis=1)).sum())
+    return missed
+
+
+def build_wheel(pool, k=6, t=3, m=4, restarts=RESTARTS, workers=None, budget_s=LOCAL_SEARCH_S, seed=0):
+    """Smallest wheel found over `restarts` randomized greedy + local-search runs.
+
+    pool: distinct numbers (v <= 63); guarantee: t matched if m of the pool are drawn.
+    Returns (tickets as sorted number lists, info dict).
+    """
+    pool = sorted(int(n) for n in pool)
+    v = len(pool)
+    if len(set(pool)) != v or not (k <= v <= 63) or not (1 <= t <= min(k, m) and m <= v):
+        raise ValueError(f"invalid wheel: v={v}, k={k}, t={t}, m={m}")
+    workers = min(workers or os.cpu_count() or 1, restarts)
+    tasks = [(seed + r, budget_s) for r in range(restarts)]
+    t0 = time.perf_counter()
+    if workers == 1:
+        _init_worker(v, k, t, m)
+        results = [_restart(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(v, k, t, m)) as pool_exec:
+            results = list(pool_exec.map(_restart, tasks))
+    best_seed, greedy_size, best = min(results, key=lambda r: (len(r[2]), r[0]))
+    tickets = sorted(_decode(mask, pool) for mask in best)
+    info = {"v": v, "k": k, "t": t, "m": m, "tickets": len(tickets), "greedy_tickets": greedy_size,
+            "sizes": sorted(len(r[2]) for r in results), "seed": best_seed,
+            "seconds": round(time.perf_counter() - t0, 2)}
+    log(f"🔹 Wheel v={v} k={k} '{t} if {m}': {len(tickets)} tickets (greedy {greedy_size}) in {info['seconds']}s")
+    return tickets, info
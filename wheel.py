@@ -0,0 +1,56 @@
+# wheel.py
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from utils.fetch_data import fetch_all_sources
+from utils.wheeling import build_wheel, verify_wheel, RESTARTS, LOCAL_SEARCH_S
+from rank_combinations import number_scores
+
+METRICS_DIR = Path("metrics")
+METRICS_DIR.mkdir(parents=True, exist_ok=True)
+
+MEGA_URLS = [
+    "https://www.ketquadientoan.com/tat-ca-ky-xo-so-mega-6-45.html",
+    "https://www.minhngoc.net.vn/ket-qua-xo-so/dien-toan-vietlott/mega-6x45.html",
+    "https://www.lotto-8.com/Vietnam/listltoVM45.asp",
+]
+POWER_URLS = [
+    "https://www.ketquadientoan.com/tat-ca-ky-xo-so-power-655.html",
+    "https://www.minhngoc.net.vn/ket-qua-xo-so/dien-toan-vietlott/power-6x55.html",
+    "https://www.lotto-8.com/Vietnam/listltoVM55.asp",
+]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Smallest set of tickets guaranteeing 't if m' over a number pool")
+    parser.add_argument("--game", choices=["mega", "power"], default="mega")
+    parser.add_argument("--pool", type=int, nargs="+", default=None, help="explicit pool of numbers")
+    parser.add_argument("--pool-size", type=int, default=15, help="top-N numbers by score when --pool is not given")
+    parser.add_argument("--scores", choices=["ensemble", "freq"], default="ensemble")
+    parser.add_argument("--match", type=int, default=3, help="t: numbers guaranteed to match")
+    parser.add_argument("--if-drawn", type=int, default=4, help="m: pool numbers among the drawn ones")
+    parser.add_argument("--restarts", type=int, default=RESTARTS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--budget", type=float, default=LOCAL_SEARCH_S, help="local-search seconds per restart")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--limit", type=int, default=400, help="draws to fetch when scoring numbers")
+    args = parser.parse_args()
+
+    games = {"mega": (MEGA_URLS, 45), "power": (POWER_URLS, 55)}
+    urls, max_num = games[args.game]
+    pool = args.pool
+    if pool is None:
+        df = fetch_all_sources(urls, limit=args.limit)
+        if df is None or df.empty:
+            raise SystemExit(f"No data for {args.game}; pass --pool explicitly")
+        scores = number_scores(args.game, df, max_num, args.scores)
+        pool = sorted(int(i) + 1 for i in np.argsort(-scores, kind="stable")[:args.pool_size])
+    print(f"🔹 Pool ({len(pool)}): {pool}")
+
+    tickets, info = build_wheel(pool, t=args.match, m=args.if_drawn, restarts=args.restarts,
+                                workers=args.workers, budget_s=args.budget, seed=args.seed)
+    missed = verify_wheel(tickets, sorted(pool), t=args.match, m=args.if_drawn)
+    out = METRICS_DIR / f"{args.game}_wheel.csv"
+    pd.DataFrame(tickets, columns=[f"n{i + 1}" for i in range(6)]).to_csv(out, index=False)
+    print(f"✅ {args.game}: {info['tickets']} tickets (greedy {info['greedy_tickets']}), "
+          f"'{args.match} if {args.if_drawn}' {'verified' if missed == 0 else f'MISSES {missed}'}, saved at {out}")